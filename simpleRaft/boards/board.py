@@ -11,3 +11,9 @@ class Board:
         Boards act like queues, and allow multiple clients
         to write to them.
         """
+
+    async def get_messages(self, max_n):
+        """This will wait for messages and take up to max_n of them
+        off the board at once.
+
+        """
@@ -1,18 +1,119 @@
 import asyncio
+from collections import Counter, deque
 
+from ..messages.base import BaseMessage
+from ..states.config import BOARD_HIGH_WATERMARK, BOARD_LOW_WATERMARK
 from .board import Board
 
+# Elections and heart beats go in the first lane, entries and snapshots in
+# the second one, so that a large backlog of replication traffic never
+# delays a vote or makes a follower miss its leader.
+CONTROL, REPLICATION = range(2)
+
 
 class MemoryBoard(Board):
-    def __init__(self):
+    """Delivers messages first in first out within each lane, the
+    control lane first.
+
+    Once high_watermark messages are waiting the board is overloaded
+    until it is drained down to low_watermark. Meanwhile messages from a
+    past term and heart beats from a sender that already has one waiting
+    are dropped, and drops counts them.
+    """
+
+    def __init__(
+        self, high_watermark=BOARD_HIGH_WATERMARK, low_watermark=BOARD_LOW_WATERMARK
+    ):
         Board.__init__(self)
-        self._board = asyncio.PriorityQueue()
+        self._lanes = (deque(), deque())
+        self._ready = asyncio.Event()
+        self._high_watermark = high_watermark
+        self._low_watermark = low_watermark
+        self._heart_beats = Counter()  # heart beats waiting, by sender
+        self.overloaded = False
+        self.drops = Counter()  # dropped messages, by reason
+
+    def __len__(self):
+        return len(self._lanes[CONTROL]) + len(self._lanes[REPLICATION])
+
+    def qsize(self):
+        return len(self)
+
+    def empty(self):
+        return len(self) == 0
+
+    @property
+    def depth(self):
+        return len(self)
+
+    def __iter__(self):
+        """Iterates over the messages in the order they will be delivered,
+        without taking them off the board.
+
+        """
+        for lane in self._lanes:
+            yield from lane
+
+    @staticmethod
+    def _lane(message):
+        _type = getattr(message, "_type", None)
+        if _type == BaseMessage.MessageType.InstallSnapshot or (
+            _type == BaseMessage.MessageType.AppendEntries and message.data.entries
+        ):
+            return REPLICATION
+        return CONTROL
+
+    @staticmethod
+    def _is_heart_beat(message):
+        return (
+            getattr(message, "_type", None) == BaseMessage.MessageType.AppendEntries
+            and not message.data.entries
+        )
+
+    def _drop_reason(self, message):
+        owner = getattr(self, "_owner", None)
+        if owner is not None and message.term < owner._currentTerm:
+            return "stale"
+        if self._is_heart_beat(message) and self._heart_beats[message.sender]:
+            return "heartbeat"
+        return None
 
     async def post_message(self, message):
-        self._board.put_nowait((message.timestamp, message))
+        if len(self) >= self._high_watermark:
+            self.overloaded = True
+        if self.overloaded:
+            reason = self._drop_reason(message)
+            if reason is not None:
+                self.drops[reason] += 1
+                return
+
+        if self._is_heart_beat(message):
+            self._heart_beats[message.sender] += 1
+        self._lanes[self._lane(message)].append(message)
+        self._ready.set()
+
+    def _pop(self, lane):
+        message = lane.popleft()
+        if self._is_heart_beat(message):
+            self._heart_beats[message.sender] -= 1
+        if self.overloaded and len(self) <= self._low_watermark:
+            self.overloaded = False
+        return message
 
     async def get_message(self):
-        try:
-            return (await self._board.get())[1]
-        except IndexError:
-            return None
+        while self.empty():
+            self._ready.clear()
+            await self._ready.wait()
+        for lane in self._lanes:
+            if lane:
+                return self._pop(lane)
+
+    async def get_messages(self, max_n):
+        while self.empty():
+            self._ready.clear()
+            await self._ready.wait()
+        messages = []
+        for lane in self._lanes:
+            while lane and len(messages) < max_n:
+                messages.append(self._pop(lane))
+        return messages
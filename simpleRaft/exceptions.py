@@ -0,0 +1,37 @@
+class RaftError(Exception):
+    """Base class of the errors raised by simpleRaft."""
+
+
+class NotLeaderError(RaftError):
+    """Raised when a request only the leader can serve reaches another
+    node. leader is the node currently believed to be the leader, if any.
+
+    """
+
+    def __init__(self, leader=None):
+        if leader is None:
+            super().__init__("not the leader")
+        else:
+            super().__init__(f"not the leader, try {leader}")
+        self.leader = leader
+
+
+class MembershipChangeError(RaftError):
+    """Raised when the membership of a cluster is asked to change while
+    a previous change is still under way.
+
+    """
+
+
+class LeadershipTransferError(RaftError):
+    """Raised when the leadership could not be handed over in time. The
+    leader carries on leading.
+
+    """
+
+
+class OverloadedError(RaftError):
+    """Raised when a server is too busy to take a request. The request
+    was not carried out and can be retried later.
+
+    """
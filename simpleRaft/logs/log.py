@@ -0,0 +1,126 @@
+class Log:
+    """A Raft log. It is indexed like a list of entries, each entry
+    being a dict with at least a "term" key.
+
+    Logs only grow at the end and are only truncated from some index
+    up to the end, which is all Raft needs. Entries up to the latest
+    snapshot can be compacted away: indexes don't change, but reading
+    a compacted entry raises IndexError.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._hardState = (0, None)
+
+    def __len__(self):
+        """Returns the index following the last entry of the log."""
+        raise NotImplementedError
+
+    def __getitem__(self, index):
+        """Returns the entry at index, or a list of entries for a slice."""
+        raise NotImplementedError
+
+    def __delitem__(self, index):
+        """Truncates the log. Only slices that reach the end of the log,
+        like log[index:], are supported.
+
+        """
+        raise NotImplementedError
+
+    def append(self, entry):
+        """Appends an entry to the end of the log."""
+        raise NotImplementedError
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def clear(self):
+        del self[self.first_index :]
+
+    def term(self, index):
+        """Returns the term of the entry at index, which may be the last
+        entry covered by the snapshot.
+
+        """
+        if index < 0:
+            index += len(self)
+        if self._snapshot is not None and index == self._snapshot.index:
+            return self._snapshot.term
+        return self[index]["term"]
+
+    def entry_size(self, index):
+        """Returns the size the entry at index is stored in, or None if
+        the log doesn't keep it.
+
+        """
+        return None
+
+    @property
+    def hard_state(self):
+        """The (currentTerm, votedFor) last saved."""
+        return self._hardState
+
+    def save_hard_state(self, term, votedFor):
+        """Saves the current term and whom we voted for in it. Like
+        appends, they are durable once sync() returns.
+
+        """
+        self._hardState = (term, votedFor)
+
+    @property
+    def snapshot(self):
+        """The latest snapshot, or None."""
+        return self._snapshot
+
+    @property
+    def first_index(self):
+        """The index of the first entry that has not been compacted."""
+        return 0 if self._snapshot is None else self._snapshot.index + 1
+
+    def compact(self, snapshot):
+        """Saves snapshot and discards the entries it covers.
+
+        Entries following the snapshot are kept if the log has the
+        snapshot's last entry, otherwise the whole log is discarded
+        and continues right after the snapshot.
+        """
+        raise NotImplementedError
+
+    async def compact_async(self, snapshot):
+        """Like compact(), but without blocking the event loop on the
+        disk while the snapshot is saved.
+
+        """
+        self.compact(snapshot)
+
+    async def sync(self):
+        """Waits until every appended entry is durable."""
+
+    def __iter__(self):
+        return iter(self[self.first_index :])
+
+    def __eq__(self, other):
+        if not isinstance(other, (Log, list)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def _follows(self, snapshot):
+        """Whether the log holds the last entry covered by snapshot."""
+        return (
+            self.first_index <= snapshot.index < len(self)
+            and self.term(snapshot.index) == snapshot.term
+        )
+
+    @staticmethod
+    def _truncation_start(key, length):
+        if not isinstance(key, slice) or key.stop is not None or key.step is not None:
+            raise TypeError("a log can only be truncated up to its end")
+        return key.indices(length)[0]
+
+    @staticmethod
+    def _compacted(index):
+        return IndexError(f"log index {index} has been compacted")
@@ -0,0 +1,50 @@
+from .log import Log
+
+
+class MemoryLog(Log):
+    def __init__(self, entries=None):
+        Log.__init__(self)
+        self._entries = [] if entries is None else entries
+        self._start = 0  # index of self._entries[0]
+
+    def __len__(self):
+        return self._start + len(self._entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if start < self._start and start < stop:
+                raise self._compacted(start)
+            return self._entries[start - self._start : stop - self._start : step]
+
+        if index < 0:
+            index += len(self)
+        if index < self._start:
+            raise self._compacted(index)
+        return self._entries[index - self._start]
+
+    def __delitem__(self, index):
+        start = self._truncation_start(index, len(self))
+        if start < self._start:
+            raise self._compacted(start)
+        del self._entries[start - self._start :]
+
+    def append(self, entry):
+        self._entries.append(entry)
+
+    def extend(self, entries):
+        self._entries.extend(entries)
+
+    def compact(self, snapshot):
+        if snapshot.index < self.first_index:
+            return
+
+        if self._follows(snapshot):
+            del self._entries[: snapshot.index + 1 - self._start]
+        else:
+            self._entries.clear()
+        self._start = snapshot.index + 1
+        self._snapshot = snapshot
+
+    def __iter__(self):
+        return iter(self._entries)
@@ -0,0 +1,547 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from functools import partial
+
+from .log import Log
+from .snapshot import Snapshot
+
+logger = logging.getLogger("raft")
+
+# Every record is the length of the encoded entry, its term and a crc32 of
+# both followed by the encoded entry itself.
+HEADER = struct.Struct("<IqI")
+SEGMENT_SUFFIX = ".log"
+
+# The snapshot file is its index, term, a crc32 of what follows and the size
+# of the encoded configuration, then the configuration and the data
+SNAPSHOT_HEADER = struct.Struct("<qqII")
+SNAPSHOT_NAME = "snapshot"
+
+# The current term and vote are appended to the state file as records
+# laid out like those of the segments, the vote being the payload. The
+# last intact record is in force.
+STATE_NAME = "state"
+
+
+def _encode_json(entry):
+    return json.dumps(entry, separators=(",", ":")).encode()
+
+
+def _decode_json(payload):
+    return json.loads(bytes(payload))
+
+
+def _checksum(size, term, payload):
+    return zlib.crc32(payload, zlib.crc32(struct.pack("<Iq", size, term)))
+
+
+def _fsync(fds, directory):
+    """Fsyncs and closes fds, then fsyncs directory unless it is None.
+    Runs in an executor thread.
+
+    """
+    try:
+        for fd in fds:
+            os.fsync(fd)
+    finally:
+        for fd in fds:
+            os.close(fd)
+    if directory is not None:
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class _Segment:
+    def __init__(self, path, first_index):
+        self.path = path
+        self.first_index = first_index
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.size = os.fstat(self.fd).st_size
+
+
+class SegmentedLog(Log):
+    """An append-only log kept in a directory of segment files.
+
+    Segments are named after the index of their first entry and a new
+    one is started once the current one grows past segment_size. Only
+    the offset, size and term of every entry are kept in memory.
+
+    Appends are buffered and written out with a single write at the end
+    of the event loop iteration they were made in, then fsynced in an
+    executor thread, so every append of that iteration shares the same
+    fsync (group commit) and the loop never waits for the disk. Awaiting
+    sync() waits for it.
+
+    The current term and vote are kept in a state file next to the
+    segments, and made durable along with the appends.
+
+    The latest snapshot is kept next to the segments, and segments only
+    holding compacted entries are deleted. compact_async() writes it in
+    an executor thread like the fsyncs.
+    """
+
+    def __init__(self, path, segment_size=64 << 20, encode=None, decode=None):
+        Log.__init__(self)
+        self._path = path
+        self._segment_size = segment_size
+        self._encode = encode or _encode_json
+        self._decode = decode or _decode_json
+
+        self._segments = []
+        self._firsts = []  # first index of every segment, for bisecting
+        self._start = 0  # index of the entries below
+        self._offsets = array("Q")  # where each entry's payload starts
+        self._sizes = array("I")
+        self._terms = array("q")
+
+        self._buffer = bytearray()  # appended to the last segment, not written
+        self._dirty = set()  # segments written or truncated since the last fsync
+        self._dirty_directory = False
+        self._waiters = []
+        self._flush_handle = None
+        self._flushing = None  # waiters of the fsync in flight, if any
+        self._state_file = None
+        self._snapshot_lock = threading.Lock()  # snapshots may be saved off the loop
+        self._saved_index = -1  # index of the snapshot on disk
+
+        os.makedirs(path, exist_ok=True)
+        self._recover()
+
+    def __len__(self):
+        return self._start + len(self._terms)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if start < self._start and start < stop:
+                raise self._compacted(start)
+            if step != 1:
+                return [self._read_range(i, i + 1)[0] for i in range(start, stop, step)]
+            return self._read_range(start, stop)
+
+        if index < 0:
+            index += len(self)
+        if index < self._start:
+            raise self._compacted(index)
+        if index >= len(self):
+            raise IndexError("log index out of range")
+        return self._read_range(index, index + 1)[0]
+
+    def __delitem__(self, index):
+        start = self._truncation_start(index, len(self))
+        if start < self._start:
+            raise self._compacted(start)
+        if start >= len(self):
+            return
+
+        self._write()
+        s = bisect_right(self._firsts, start) - 1
+        for segment in self._segments[s + 1 :]:
+            self._dirty.discard(segment)
+            os.close(segment.fd)
+            os.remove(segment.path)
+            self._dirty_directory = True
+        del self._segments[s + 1 :]
+        del self._firsts[s + 1 :]
+
+        segment = self._segments[s]
+        position = start - self._start
+        segment.size = self._offsets[position] - HEADER.size
+        os.ftruncate(segment.fd, segment.size)
+        self._dirty.add(segment)
+
+        del self._offsets[position:]
+        del self._sizes[position:]
+        del self._terms[position:]
+        self._schedule_flush()
+
+    def append(self, entry):
+        segment = self._segments[-1]
+        if (
+            segment.size + len(self._buffer) >= self._segment_size
+            and len(self) > segment.first_index
+        ):
+            segment = self._roll()
+
+        payload = self._encode(entry)
+        term = entry["term"]
+        size = len(payload)
+        self._buffer += HEADER.pack(size, term, _checksum(size, term, payload))
+        self._offsets.append(segment.size + len(self._buffer))
+        self._sizes.append(size)
+        self._terms.append(term)
+        self._buffer += payload
+        self._schedule_flush()
+
+    def term(self, index):
+        if index < 0:
+            index += len(self)
+        if index < self._start:
+            if self._snapshot is not None and index == self._snapshot.index:
+                return self._snapshot.term
+            raise self._compacted(index)
+        return self._terms[index - self._start]
+
+    def entry_size(self, index):
+        if index < 0:
+            index += len(self)
+        if index < self._start:
+            raise self._compacted(index)
+        return self._sizes[index - self._start]
+
+    def compact(self, snapshot):
+        if snapshot.index < self.first_index:
+            return
+        self._save_snapshot(snapshot)
+        self._compact(snapshot)
+
+    async def compact_async(self, snapshot):
+        if snapshot.index < self.first_index:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._save_snapshot, snapshot)
+        # The log may have been compacted further meanwhile
+        if snapshot.index >= self.first_index:
+            self._compact(snapshot)
+
+    def save_hard_state(self, term, votedFor):
+        if (term, votedFor) == self._hardState:
+            return
+        if self._state_file is None:
+            self._state_file = _Segment(os.path.join(self._path, STATE_NAME), 0)
+            self._dirty_directory = True
+        record = self._state_record(term, votedFor)
+        os.pwrite(self._state_file.fd, record, self._state_file.size)
+        self._state_file.size += len(record)
+        self._dirty.add(self._state_file)
+        self._hardState = (term, votedFor)
+        self._schedule_flush()
+
+    async def sync(self):
+        waiters = self._waiters
+        if not self._buffer and not self._dirty and not self._dirty_directory:
+            # What is written may still be on its way to the disk
+            if self._flushing is None:
+                return
+            waiters = self._flushing
+        waiter = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        self._schedule_flush()
+        await waiter
+
+    def flush(self):
+        """Writes and fsyncs everything appended so far, blocking."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        self._write()
+        for segment in self._dirty:
+            os.fsync(segment.fd)
+        self._dirty.clear()
+        if self._dirty_directory:
+            self._sync_directory()
+
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def close(self):
+        self.flush()
+        for segment in self._segments:
+            os.close(segment.fd)
+        if self._state_file is not None:
+            os.close(self._state_file.fd)
+            self._state_file = None
+        self._segments = []
+        self._firsts = []
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside of an event loop every change is made durable right away
+            self.flush()
+            return
+        if self._flushing is None:
+            self._flush_handle = loop.call_soon(self._start_flush)
+
+    def _start_flush(self):
+        """Writes everything appended so far and fsyncs it in an executor.
+        The files are dup'ed so that those deleted meanwhile stay open.
+
+        """
+        self._flush_handle = None
+        self._write()
+        fds = [os.dup(segment.fd) for segment in self._dirty]
+        self._dirty.clear()
+        directory = self._path if self._dirty_directory else None
+        self._dirty_directory = False
+
+        self._flushing, self._waiters = self._waiters, []
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, _fsync, fds, directory)
+        future.add_done_callback(partial(self._flushed, self._flushing))
+
+    def _flushed(self, waiters, future):
+        self._flushing = None
+        error = None if future.cancelled() else future.exception()
+        for waiter in waiters:
+            if waiter.done():
+                continue
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(error)
+        # What changed meanwhile goes out with the next fsync
+        if self._buffer or self._dirty or self._dirty_directory or self._waiters:
+            self._schedule_flush()
+
+    def _write(self):
+        if not self._buffer:
+            return
+        segment = self._segments[-1]
+        os.pwrite(segment.fd, self._buffer, segment.size)
+        segment.size += len(self._buffer)
+        self._buffer.clear()
+        self._dirty.add(segment)
+
+    def _roll(self):
+        self._write()
+        first_index = len(self)
+        segment = _Segment(self._segment_path(first_index), first_index)
+        self._segments.append(segment)
+        self._firsts.append(first_index)
+        self._dirty_directory = True
+        return segment
+
+    def _read_range(self, start, stop):
+        """Reads log[start:stop] with a single read per segment."""
+        entries = []
+        while start < stop:
+            s = bisect_right(self._firsts, start) - 1
+            segment = self._segments[s]
+            end = stop
+            if s + 1 < len(self._segments):
+                end = min(stop, self._firsts[s + 1])
+
+            first = self._offsets[start - self._start] - HEADER.size
+            last = (
+                self._offsets[end - 1 - self._start]
+                + self._sizes[end - 1 - self._start]
+            )
+            if first >= segment.size:
+                data = self._buffer[first - segment.size : last - segment.size]
+            elif last > segment.size:
+                data = os.pread(segment.fd, segment.size - first, first)
+                data += self._buffer[: last - segment.size]
+            else:
+                data = os.pread(segment.fd, last - first, first)
+
+            view = memoryview(data)
+            for i in range(start - self._start, end - self._start):
+                offset = self._offsets[i] - first
+                entries.append(self._decode(view[offset : offset + self._sizes[i]]))
+            start = end
+        return entries
+
+    def _recover(self):
+        self._snapshot = self._load_snapshot()
+        if self._snapshot is not None:
+            self._saved_index = self._snapshot.index
+        self._load_hard_state()
+        self._start = self.first_index
+
+        names = sorted(n for n in os.listdir(self._path) if n.endswith(SEGMENT_SUFFIX))
+        expected = None  # where the next segment has to start
+        for n, name in enumerate(names):
+            first_index = int(name[: -len(SEGMENT_SUFFIX)])
+            path = os.path.join(self._path, name)
+            if first_index != expected and (
+                expected is not None or first_index > self._start
+            ):
+                logger.warning(f"{path}: segment does not follow the log, dropping it")
+                self._drop_segments(names[n:])
+                break
+
+            segment = _Segment(path, first_index)
+            self._segments.append(segment)
+            self._firsts.append(first_index)
+            expected, intact = self._load(segment)
+            if not intact:
+                self._drop_segments(names[n + 1 :])
+                break
+
+        self._drop_compacted_segments()
+        if not self._segments or expected != len(self):
+            self._roll()
+        if self._dirty_directory:
+            self._sync_directory()
+
+    def _load(self, segment):
+        """Indexes the records of a segment, skipping compacted ones. A torn
+        or corrupt record, and everything after it, is cut off.
+
+        Returns the index following the last record and whether the
+        segment was intact.
+        """
+        data = os.pread(segment.fd, segment.size, 0)
+        index = segment.first_index
+        pos = 0
+        while pos + HEADER.size <= len(data):
+            size, term, crc = HEADER.unpack_from(data, pos)
+            start = pos + HEADER.size
+            payload = data[start : start + size]
+            if len(payload) < size or _checksum(size, term, payload) != crc:
+                break
+            if index >= self._start:
+                self._offsets.append(start)
+                self._sizes.append(size)
+                self._terms.append(term)
+            index += 1
+            pos = start + size
+
+        if pos == len(data):
+            return index, True
+
+        logger.warning(f"{segment.path}: cutting off a torn record at {pos}")
+        os.ftruncate(segment.fd, pos)
+        os.fsync(segment.fd)
+        segment.size = pos
+        return index, False
+
+    def _compact(self, snapshot):
+        """Discards the entries covered by snapshot, which is saved."""
+        if self._follows(snapshot):
+            covered = snapshot.index + 1 - self._start
+            del self._offsets[:covered]
+            del self._sizes[:covered]
+            del self._terms[:covered]
+            self._snapshot = snapshot
+            self._start = snapshot.index + 1
+            self._drop_compacted_segments()
+        else:
+            self._buffer.clear()
+            for segment in self._segments:
+                self._dirty.discard(segment)
+                os.close(segment.fd)
+                os.remove(segment.path)
+            self._segments = []
+            self._firsts = []
+            del self._offsets[:]
+            del self._sizes[:]
+            del self._terms[:]
+            self._snapshot = snapshot
+            self._start = snapshot.index + 1
+            self._roll()
+        self._dirty_directory = True
+        self._schedule_flush()
+
+    def _drop_compacted_segments(self):
+        """Deletes the segments that only hold compacted entries."""
+        while len(self._segments) > 1 and self._firsts[1] <= self._start:
+            segment = self._segments.pop(0)
+            self._firsts.pop(0)
+            self._dirty.discard(segment)
+            os.close(segment.fd)
+            os.remove(segment.path)
+            self._dirty_directory = True
+
+    def _save_snapshot(self, snapshot):
+        """Writes snapshot next to the segments unless a later one
+        already is. Blocks, and may run in an executor thread.
+
+        """
+        path = os.path.join(self._path, SNAPSHOT_NAME)
+        config = b"" if snapshot.config is None else self._encode(snapshot.config)
+        crc = zlib.crc32(snapshot.data, zlib.crc32(config))
+        with self._snapshot_lock:
+            if snapshot.index < self._saved_index:
+                return
+            with open(path + ".tmp", "wb") as f:
+                f.write(
+                    SNAPSHOT_HEADER.pack(
+                        snapshot.index, snapshot.term, crc, len(config)
+                    )
+                )
+                f.write(config)
+                f.write(snapshot.data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            _fsync([], self._path)
+            self._saved_index = snapshot.index
+
+    def _load_snapshot(self):
+        path = os.path.join(self._path, SNAPSHOT_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        index, term, crc, size = SNAPSHOT_HEADER.unpack_from(data)
+        data = data[SNAPSHOT_HEADER.size :]
+        if zlib.crc32(data) != crc:
+            raise ValueError(f"{path}: corrupt snapshot")
+        config = self._decode(data[:size]) if size else None
+        return Snapshot(index, term, data[size:], config)
+
+    def _load_hard_state(self):
+        path = os.path.join(self._path, STATE_NAME)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        pos = records = 0
+        while pos + HEADER.size <= len(data):
+            size, term, crc = HEADER.unpack_from(data, pos)
+            payload = data[pos + HEADER.size : pos + HEADER.size + size]
+            if len(payload) < size or _checksum(size, term, payload) != crc:
+                break
+            self._hardState = (term, self._decode(payload))
+            pos += HEADER.size + size
+            records += 1
+
+        # Only the last record is kept, which also cuts off a torn one
+        if pos != len(data) or records > 1:
+            with open(path + ".tmp", "wb") as f:
+                f.write(self._state_record(*self._hardState))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            self._sync_directory()
+        self._state_file = _Segment(path, 0)
+
+    def _state_record(self, term, votedFor):
+        payload = self._encode(votedFor)
+        size = len(payload)
+        return HEADER.pack(size, term, _checksum(size, term, payload)) + payload
+
+    def _drop_segments(self, names):
+        for name in names:
+            os.remove(os.path.join(self._path, name))
+        if names:
+            self._sync_directory()
+
+    def _segment_path(self, first_index):
+        return os.path.join(self._path, "%020d%s" % (first_index, SEGMENT_SUFFIX))
+
+    def _sync_directory(self):
+        fd = os.open(self._path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._dirty_directory = False
@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class Snapshot:
+    """The state of the state machine once the entry at index, of the
+    given term, has been applied. config is the cluster configuration
+    in force at index, if one was ever set.
+
+    """
+
+    index: int
+    term: int
+    data: bytes
+    config: Optional[dict] = None
@@ -1,12 +1,32 @@
 from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 
 from serde import deserialize, serialize
 
 from .base import BaseMessage
 
 
+@deserialize
+@serialize
+@dataclass(slots=True)
+class AppendEntriesData:
+    """entries follow the entry at prevLogIndex, whose term is
+    prevLogTerm. seq numbers the leader's heart beat rounds.
+
+    """
+
+    prevLogIndex: int
+    prevLogTerm: Optional[int]
+    entries: List[Dict[str, Any]]
+    leaderCommit: int
+    leaderId: Any = None
+    seq: Optional[int] = None
+
+
 @deserialize
 @serialize
 @dataclass
 class AppendEntriesMessage(BaseMessage):
     _type = BaseMessage.MessageType.AppendEntries
+
+    data: AppendEntriesData
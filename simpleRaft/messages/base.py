@@ -16,18 +16,36 @@ class BaseMessage:
         RequestVote = 1
         RequestVoteResponse = 2
         Response = 3
+        InstallSnapshot = 4
+        HeartBeat = 5
+        HeartBeatResponse = 6
+        TimeoutNow = 7
+        PreVote = 8
+        PreVoteResponse = 9
 
     EXT_DICT = {}
+    # The type of data, set by the subclasses declaring it
+    _payload = None
 
     sender: Union[int, uuid.UUID]  # int used only on tests
     receiver: Union[int, uuid.UUID, None]
     term: int
     data: Union[int, str, Dict]
     timestamp: int = int(time.time())
+    # The Raft group the message belongs to, when a host runs several
+    group: Union[int, str, None] = None
 
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
         cls.EXT_DICT[cls._type] = cls  # type: ignore
+        cls._payload = cls.__dict__.get("__annotations__", {}).get(
+            "data", cls._payload
+        )
+
+    def __post_init__(self):
+        # A plain dict is turned into the payload, handy in tests
+        if isinstance(self.data, dict) and self._payload is not None:
+            self.data = self._payload(**self.data)
 
     @property
     def type(self):
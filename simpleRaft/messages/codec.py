@@ -0,0 +1,168 @@
+"""Binary wire format of the messages.
+
+A message is sent as three frames:
+
+- a fixed header with the message type and term, followed by the
+  msgpack encoded sender and receiver, and group if there is one,
+- the fields of the payload as a msgpack array, without the entries,
+- the msgpack encoded entries of an AppendEntries, empty otherwise.
+
+Keeping the entries in a frame of their own lets the transport hand them
+over without copying them into a bigger buffer, and lets a broadcast be
+encoded once: only the header is encoded again for every receiver.
+Stream transports prefix the frames with their sizes.
+"""
+
+import struct
+import uuid
+
+import msgpack
+
+# The message classes are imported for them to register in
+#   BaseMessage.EXT_DICT, which decode() looks them up in.
+from .append_entries import AppendEntriesData, AppendEntriesMessage  # noqa: F401
+from .base import BaseMessage
+from .heart_beat import HeartBeatMessage, HeartBeatResponseMessage  # noqa: F401
+from .install_snapshot import InstallSnapshotMessage  # noqa: F401
+from .request_vote import (  # noqa: F401
+    PreVoteMessage,
+    PreVoteResponseMessage,
+    RequestVoteMessage,
+    RequestVoteResponseMessage,
+)
+from .response import ResponseMessage  # noqa: F401
+from .timeout_now import TimeoutNowMessage  # noqa: F401
+
+HEADER = struct.Struct("<Bq")
+PREFIX = struct.Struct("<III")
+
+ENTRIES = AppendEntriesData.__slots__.index("entries")
+
+# msgpack extension type of the uuid.UUID server names
+UUID_EXT = 1
+
+
+def _default(obj):
+    if isinstance(obj, uuid.UUID):
+        return msgpack.ExtType(UUID_EXT, obj.bytes)
+    raise TypeError(f"can't encode {type(obj).__name__}")
+
+
+def _ext_hook(code, data):
+    if code == UUID_EXT:
+        return uuid.UUID(bytes=bytes(data))
+    return msgpack.ExtType(code, data)
+
+
+def _pack(obj):
+    return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+def _unpack(data):
+    return msgpack.unpackb(data, ext_hook=_ext_hook, raw=False)
+
+
+class EntryBatch(list):
+    """Entries that keep their encoding once they have been encoded, so
+    that a batch sent to several followers is only encoded once.
+
+    """
+
+    __slots__ = ("encoded",)
+
+    def __init__(self, entries=()):
+        super().__init__(entries)
+        self.encoded = None
+
+
+def pack_entry(entry):
+    """Returns entry encoded as it is in the entries frame."""
+    return _pack(entry)
+
+
+def entry_batch(entries, packed):
+    """Returns an EntryBatch of entries, packed being what pack_entry()
+    returned for each of them.
+
+    """
+    batch = EntryBatch(entries)
+    batch.encoded = msgpack.Packer().pack_array_header(len(packed)) + b"".join(packed)
+    return batch
+
+
+def _encode_entries(entries):
+    encoded = getattr(entries, "encoded", None)
+    if encoded is None:
+        encoded = _pack(entries)
+        if isinstance(entries, EntryBatch):
+            entries.encoded = encoded
+    return encoded
+
+
+def _encode_header(message, receiver):
+    names = [message.sender, receiver]
+    if message.group is not None:
+        names.append(message.group)
+    return HEADER.pack(message.type, message.term) + _pack(names)
+
+
+def encode(message):
+    """Returns the frames message is sent as."""
+    data = message.data
+    entries = b""
+    if message._payload is not None:
+        data = [getattr(data, name) for name in data.__slots__]
+        if message.type == BaseMessage.MessageType.AppendEntries:
+            entries = _encode_entries(data[ENTRIES])
+            data[ENTRIES] = None
+    return [_encode_header(message, message.receiver), _pack(data), entries]
+
+
+def readdress(frames, message, receiver):
+    """Returns the frames of message sent to receiver, given the frames
+    encode() returned for it.
+
+    """
+    return [_encode_header(message, receiver)] + frames[1:]
+
+
+def prefix(frames):
+    """Returns the frames preceded by their sizes, for stream transports."""
+    return [PREFIX.pack(*map(len, frames))] + frames
+
+
+def split(buffer):
+    """Returns the frames of a message preceded by their sizes, as
+    memoryview slices of buffer.
+
+    """
+    view = memoryview(buffer)
+    sizes = PREFIX.unpack_from(view)
+    frames = []
+    start = PREFIX.size
+    for size in sizes:
+        frames.append(view[start : start + size])
+        start += size
+    return frames
+
+
+def decode(frames):
+    """Returns the message sent as frames. Any bytes-like object, such
+    as the buffer of a zmq.Frame, will do as a frame.
+
+    """
+    header, data, entries = frames
+    header = memoryview(header)
+    _type, term = HEADER.unpack_from(header)
+    sender, receiver, *group = _unpack(header[HEADER.size :])
+
+    cls = BaseMessage.EXT_DICT[_type]
+    data = _unpack(data)
+    if cls._payload is not None:
+        data = cls._payload(*data)
+        if len(entries) > 0:
+            data.entries = _unpack(entries)
+    message = cls(sender, receiver, term, data)
+    if group:
+        message.group = group[0]
+    return message
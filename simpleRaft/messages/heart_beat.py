@@ -0,0 +1,49 @@
+from dataclasses import dataclass
+from typing import List
+
+from serde import deserialize, serialize
+
+from .base import BaseMessage
+
+
+@deserialize
+@serialize
+@dataclass(slots=True)
+class HeartBeatData:
+    """A [group, term, commitIndex] beat for every group the sender leads
+    and the receiver follows closely enough to only need to know that
+    the leader is alive and how far it committed.
+
+    """
+
+    beats: List
+
+
+@deserialize
+@serialize
+@dataclass(slots=True)
+class HeartBeatResponseData:
+    """A [group, currentTerm, accepted] answer to every beat."""
+
+    acks: List
+
+
+@deserialize
+@serialize
+@dataclass
+class HeartBeatMessage(BaseMessage):
+    """The heart beats of all the groups a host leads, to one peer host."""
+
+    _type = BaseMessage.MessageType.HeartBeat
+
+    data: HeartBeatData
+
+
+@deserialize
+@serialize
+@dataclass
+class HeartBeatResponseMessage(BaseMessage):
+
+    _type = BaseMessage.MessageType.HeartBeatResponse
+
+    data: HeartBeatResponseData
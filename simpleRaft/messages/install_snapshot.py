@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from serde import deserialize, serialize
+
+from .base import BaseMessage
+
+
+@deserialize
+@serialize
+@dataclass(slots=True)
+class InstallSnapshotData:
+    """One chunk of the snapshot up to lastIncludedIndex: data holds the
+    bytes at offset and done is set on the last chunk, along with the
+    cluster configuration of the snapshot.
+
+    """
+
+    leaderId: Any
+    lastIncludedIndex: int
+    lastIncludedTerm: int
+    offset: int
+    data: bytes
+    done: bool
+    config: Optional[dict] = None
+
+
+@deserialize
+@serialize
+@dataclass
+class InstallSnapshotMessage(BaseMessage):
+    """Carries one chunk of the leader's snapshot."""
+
+    _type = BaseMessage.MessageType.InstallSnapshot
+
+    data: InstallSnapshotData
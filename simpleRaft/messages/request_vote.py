@@ -1,10 +1,32 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from serde import deserialize, serialize
 
 from .base import BaseMessage
 
 
+@deserialize
+@serialize
+@dataclass(slots=True)
+class RequestVoteData:
+    """transfer is set when the leader handed over to the candidate, the
+    voters grant it their vote even if they heard from the leader lately.
+
+    """
+
+    lastLogIndex: int
+    lastLogTerm: Optional[int]
+    transfer: bool = False
+
+
+@deserialize
+@serialize
+@dataclass(slots=True)
+class RequestVoteResponseData:
+    response: bool
+
+
 @deserialize
 @serialize
 @dataclass
@@ -12,6 +34,8 @@ class RequestVoteMessage(BaseMessage):
 
     _type = BaseMessage.MessageType.RequestVote
 
+    data: RequestVoteData
+
 
 @deserialize
 @serialize
@@ -19,3 +43,29 @@ class RequestVoteMessage(BaseMessage):
 class RequestVoteResponseMessage(BaseMessage):
 
     _type = BaseMessage.MessageType.RequestVoteResponse
+
+    data: RequestVoteResponseData
+
+
+@deserialize
+@serialize
+@dataclass
+class PreVoteMessage(BaseMessage):
+    """Asks whether the receiver would vote for the sender in term, the
+    term after the sender's, without either of them moving to it.
+
+    """
+
+    _type = BaseMessage.MessageType.PreVote
+
+    data: RequestVoteData
+
+
+@deserialize
+@serialize
+@dataclass
+class PreVoteResponseMessage(BaseMessage):
+
+    _type = BaseMessage.MessageType.PreVoteResponse
+
+    data: RequestVoteResponseData
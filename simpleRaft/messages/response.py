@@ -1,13 +1,52 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from serde import deserialize, serialize
 
 from .base import BaseMessage
 
 
+@deserialize
+@serialize
+@dataclass(slots=True)
+class ResponseData:
+    """currentTerm is the term of the responding server. matchIndex is the
+    last index known to match the leader's log once it was accepted, seq
+    the heart beat round answered, if any.
+
+    A rejection caused by a log mismatch carries hints for the leader:
+    conflictTerm is the term of the follower's entry at prevLogIndex (None if
+    the follower's log is too short) and conflictIndex is the first index of
+    that term, or the length of the follower's log. Answers to a snapshot
+    carry its lastIncludedIndex, and those to a chunk but the last one
+    the offset the next chunk starts at.
+
+    """
+
+    response: bool
+    currentTerm: int
+    matchIndex: Optional[int] = None
+    conflictTerm: Optional[int] = None
+    conflictIndex: Optional[int] = None
+    lastIncludedIndex: Optional[int] = None
+    seq: Optional[int] = None
+    offset: Optional[int] = None
+
+
 @deserialize
 @serialize
 @dataclass
 class ResponseMessage(BaseMessage):
+    """Answers an AppendEntries or an InstallSnapshot."""
 
     _type = BaseMessage.MessageType.Response
+
+    data: ResponseData
+
+    @property
+    def conflict_term(self) -> Optional[int]:
+        return self.data.conflictTerm
+
+    @property
+    def conflict_index(self) -> Optional[int]:
+        return self.data.conflictIndex
@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+from typing import Any
+
+from serde import deserialize, serialize
+
+from .base import BaseMessage
+
+
+@deserialize
+@serialize
+@dataclass(slots=True)
+class TimeoutNowData:
+    """Sent by a leader handing its leadership over to a follower that
+    holds its whole log: the follower starts an election right away.
+
+    """
+
+    leaderId: Any
+
+
+@deserialize
+@serialize
+@dataclass
+class TimeoutNowMessage(BaseMessage):
+
+    _type = BaseMessage.MessageType.TimeoutNow
+
+    data: TimeoutNowData
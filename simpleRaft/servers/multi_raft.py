@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from collections import defaultdict, deque
+
+from ..messages import codec
+from ..messages.base import BaseMessage
+from ..messages.heart_beat import (
+    HeartBeatData,
+    HeartBeatMessage,
+    HeartBeatResponseData,
+    HeartBeatResponseMessage,
+)
+from ..states.config import HEART_BEAT_INTERVAL, MAX_BOARD_BATCH
+from ..states.state import State
+from ..timer_wheel import get_wheel
+from .server import Server
+from .tcp_server import _Connections, _Inbound
+
+logger = logging.getLogger("raft")
+
+
+class GroupServer(Server):
+    """The member of one Raft group a RaftHost runs. It goes by the name
+    of its host, and so do its neighbors: the hosts running the other
+    members of the group.
+
+    """
+
+    _coalescesHeartBeats = True
+
+    def __init__(
+        self,
+        group,
+        node,
+        state: State,
+        log=None,
+        messageBoard=None,
+        neighbors=None,
+        stateMachine=None,
+    ):
+        self._group = group
+        self._node = node
+        self._runnable = False  # waiting for the host to handle its messages
+        super().__init__(
+            node._name, state, log, messageBoard, neighbors, _stateMachine=stateMachine
+        )
+
+    async def send_message(self, message):
+        message.group = self._group
+        await self._node.send_message(message, self._neighbors)
+
+    async def receive_message(self, message):
+        await self.post_message(message)
+
+    async def post_message(self, message):
+        await self._messageBoard.post_message(message)
+        self._node._schedule(self)
+
+
+class RaftHost:
+    """Runs the members of many Raft groups in one process, over one TCP
+    connection per peer host whatever the number of groups.
+
+    Messages carry the id of their group, which routes them to the
+    board of the member of that group. A single task takes turns
+    handling the messages of every group that has some waiting, up to
+    MAX_BOARD_BATCH of them at a time, so that a busy group doesn't
+    starve the others.
+
+    Every HEART_BEAT_INTERVAL the host sends each peer a single message
+    with the heart beats of all the groups it leads there, which the
+    peer answers with a single message as well.
+    """
+
+    def __init__(self, name, host="127.0.0.1", port=0):
+        self._name = name
+        self._host = host
+        self._port = port
+        self._stop = False
+        self._listener = None
+        self._groups = {}  # by group id
+        self._peers = {}  # the hosts running members of our groups, by name
+        self._connections = _Connections()
+        self._runnable = deque()  # groups with messages waiting
+        self._wakeup = asyncio.Event()
+        self._heartBeatTimer = None
+
+    def add_group(self, group, state: State, neighbors, log=None, stateMachine=None):
+        """Starts the member of group on this host, neighbors are the
+        hosts running the other members. Returns its GroupServer.
+
+        """
+        for n in neighbors:
+            self._peers[n._name] = n
+        server = GroupServer(
+            group,
+            self,
+            state,
+            log,
+            neighbors=list(neighbors),
+            stateMachine=stateMachine,
+        )
+        self._groups[group] = server
+        return server
+
+    def remove_group(self, group):
+        return self._groups.pop(group, None)
+
+    def group(self, group):
+        return self._groups[group]
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        self._listener = await loop.create_server(
+            lambda: _Inbound(self), self._host, self._port
+        )
+        self._port = self._listener.sockets[0].getsockname()[1]
+        logger.info(f"{self._name}: listening on {self._host}:{self._port}")
+        asyncio.create_task(self.dispatcher())
+        self._heartBeatTimer = get_wheel().call_later(
+            HEART_BEAT_INTERVAL, self._beat, HEART_BEAT_INTERVAL
+        )
+
+    def stop(self):
+        self._stop = True
+        self._wakeup.set()
+        if self._heartBeatTimer is not None:
+            self._heartBeatTimer.cancel()
+        if self._listener is not None:
+            self._listener.close()
+        self._connections.close()
+
+    def _schedule(self, server):
+        if not server._runnable:
+            server._runnable = True
+            self._runnable.append(server)
+            self._wakeup.set()
+
+    async def dispatcher(self):
+        while not self._stop:
+            if not self._runnable:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            server = self._runnable.popleft()
+            server._runnable = False
+            board = server._messageBoard
+            if board.empty():
+                continue  # everything posted was dropped
+            for message in await board.get_messages(MAX_BOARD_BATCH):
+                # A failing group mustn't stop the others
+                try:
+                    await server.on_message(message)
+                except Exception:
+                    logger.exception(f"{self._name}: failed to handle {message}")
+            if not board.empty():
+                self._schedule(server)
+
+    def _beat(self):
+        beats = defaultdict(list)  # by peer name
+        for server in self._groups.values():
+            server._state._coalesce_heart_beats(beats)
+        for name, peerBeats in beats.items():
+            message = HeartBeatMessage(self._name, name, 0, HeartBeatData(peerBeats))
+            self._connections.open(self._peers[name]).write(codec.encode(message))
+
+    def _on_heart_beats(self, message):
+        acks = []
+        for group, term, commitIndex in message.data.beats:
+            server = self._groups.get(group)
+            if server is None:
+                acks.append([group, term, False])
+                continue
+            accepted = server._state.on_heart_beat(message.sender, term, commitIndex)
+            acks.append([group, server._currentTerm, accepted])
+
+        peer = self._peers.get(message.sender)
+        if peer is not None:
+            response = HeartBeatResponseMessage(
+                self._name, message.sender, 0, HeartBeatResponseData(acks)
+            )
+            self._connections.open(peer).write(codec.encode(response))
+
+    def _on_heart_beat_acks(self, message):
+        for group, term, accepted in message.data.acks:
+            server = self._groups.get(group)
+            if server is not None:
+                server._state.on_heart_beat_ack(message.sender, term, accepted)
+
+    async def _post_messages(self, messages):
+        for message in messages:
+            # Coalesced heart beats are handled right away, for all groups
+            if message.type == BaseMessage.MessageType.HeartBeat:
+                self._on_heart_beats(message)
+                continue
+            if message.type == BaseMessage.MessageType.HeartBeatResponse:
+                self._on_heart_beat_acks(message)
+                continue
+            server = self._groups.get(message.group)
+            if server is None:
+                logger.debug(f"{self._name}: no member of group {message.group}")
+                continue
+            await server.post_message(message)
+
+    async def send_message(self, message, neighbors):
+        """Sends message to its receiver among neighbors, or to all of
+        them if it has none.
+
+        """
+        frames = codec.encode(message)
+        if message.receiver is not None:
+            for n in neighbors:
+                if n._name == message.receiver:
+                    self._connections.open(n).write(frames)
+                    break
+            return
+        for n in neighbors:
+            self._connections.open(n).write(codec.readdress(frames, message, n._name))
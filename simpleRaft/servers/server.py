@@ -1,42 +1,466 @@
 import asyncio
+import heapq
+import itertools
 import logging
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Set, Union
 
 import zmq
 import zmq.asyncio
 
 from ..boards.memory_board import Board, MemoryBoard
+from ..exceptions import LeadershipTransferError, NotLeaderError, OverloadedError
+from ..logs.log import Log
+from ..logs.memory_log import MemoryLog
+from ..logs.snapshot import Snapshot
+from ..messages import codec
+from ..state_machines.state_machine import StateMachine
+from ..states.config import (
+    BOARD_HIGH_WATERMARK,
+    FOLLOWER_TIMEOUT,
+    MAX_BOARD_BATCH,
+    SNAPSHOT_THRESHOLD,
+)
 from ..states.state import State
+from ..timer_wheel import get_wheel
 
 
 @dataclass
 class Server:
     _name: str
     _state: State
-    _log: List
-    _messageBoard: Board
-    _neighbors: List
+    _log: Union[Log, List, None]
+    _messageBoard: Optional[Board]
+    _neighbors: Optional[List]
 
     # Internal state
+    # _commitIndex and _lastApplied count entries: log[:_commitIndex]
+    # is committed and log[:_lastApplied] has been applied.
     _commitIndex: int = 0
     _currentTerm: int = 0
+    # Whom we voted for in _currentTerm, both survive a restart
+    _votedFor: Any = None
     _lastApplied: int = 0
     _lastLogIndex: int = 0
     _lastLogTerm: Optional[int] = None
+    _stateMachine: Optional[StateMachine] = None
+    # Names of the servers, possibly this one, that get the log without
+    #   having a say in elections or commits
+    _learners: Set = field(default_factory=set)
+    # _neighbors by name
+    _neighborIndex: dict = field(default_factory=dict)
+    # Set once the server is stopped, which ends its tasks
+    _stop: bool = False
+
+    # Whether the leader leaves its periodic heart beats to a host that
+    #   coalesces those of many groups
+    _coalescesHeartBeats = False
 
     def __post_init__(self):
+        # Transports leave out the log, board and neighbors they don't get
+        if self._log is None:
+            self._log = MemoryLog()
+        elif isinstance(self._log, list):
+            self._log = MemoryLog(self._log)
+        if self._messageBoard is None:
+            self._messageBoard = MemoryBoard()
+        if self._neighbors is None:
+            self._neighbors = []
         self._clear()
         self._state.set_server(self)
         self._messageBoard.set_owner(self)
 
     def _clear(self):
-        self._total_nodes = len(self._neighbors)
-        self._commitIndex = 0
-        self._currentTerm = 0
-        self._lastApplied = 0
-        self._lastLogIndex = 0
-        self._lastLogTerm = None
+        self._currentTerm, self._votedFor = self._log.hard_state
+        # A durable log may already hold entries, and whatever its
+        #   snapshot covers is committed and applied.
+        self._commitIndex = self._log.first_index
+        self._lastApplied = self._log.first_index
+        self._lastLogIndex = max(len(self._log) - 1, 0)
+        self._lastLogTerm = self._log.term(-1) if len(self._log) > 0 else None
+        # A log saved without its term is at least as far as its last entry
+        if self._lastLogTerm is not None and self._lastLogTerm > self._currentTerm:
+            self._currentTerm, self._votedFor = self._lastLogTerm, None
+        if self._log.snapshot is not None and self._stateMachine is not None:
+            self._stateMachine.restore(self._log.snapshot.data)
+        # The latest configuration in the log is in force, committed or not
+        self._config, self._configIndex = self._last_config(len(self._log))
+        if self._config is not None:
+            self._learners = set(self._config.get("learners", ()))
+        self._total_nodes = self._count_voters()
+
+        self._applyWaiters = []  # heap of (index, seq, term, future)
+        self._applySeq = itertools.count()
+        self._applyHandle = None
+        self._snapshotting = None  # saving of the latest snapshot, if under way
+        # (target, future, timer) of the transfer we stepped down for
+        self._handover = None
+
+    def _set_term(self, term):
+        """Moves on to a later term, in which we haven't voted yet."""
+        self._currentTerm, self._votedFor = term, None
+        self._log.save_hard_state(term, None)
+
+    def _vote(self, name):
+        """Votes for name in the current term. The vote must be durable,
+        by awaiting log.sync(), before it is sent.
+
+        """
+        self._votedFor = name
+        self._log.save_hard_state(self._currentTerm, name)
+
+    def _count_voters(self):
+        """Returns the number of neighbors that vote."""
+        return sum(
+            getattr(n, "_name", n) not in self._learners for n in self._neighbors
+        )
+
+    def _last_config(self, stop):
+        """Returns the latest configuration in log[:stop] and its index,
+        that of the snapshot if there is none, or (None, -1).
+
+        """
+        log = self._log
+        for index in range(min(stop, len(log)) - 1, log.first_index - 1, -1):
+            config = log[index].get("config")
+            if config is not None:
+                return config, index
+        snapshot = log.snapshot
+        if snapshot is not None and snapshot.config is not None:
+            return snapshot.config, snapshot.index
+        return None, -1
+
+    def _log_changed(self, start, entries=()):
+        """Called once the log from start on was replaced by entries, so
+        that the configuration in force follows the log.
+
+        """
+        config, configIndex = self._config, self._configIndex
+        if configIndex >= start:
+            config, configIndex = self._last_config(start)
+        for index, entry in enumerate(entries, start):
+            if "config" in entry:
+                config, configIndex = entry["config"], index
+        self._set_config(config, configIndex)
+
+    def _set_config(self, config, configIndex):
+        if (config, configIndex) != (self._config, self._configIndex):
+            self._config, self._configIndex = config, configIndex
+            if config is not None:
+                self._learners = set(config.get("learners", ()))
+            self._total_nodes = self._count_voters()
+            self._state = self._state.on_membership_change()
+
+    def _voter_sets(self):
+        """Returns the sets of names a majority of every one of which
+        must agree: the voters, or the old and the new ones while the
+        membership changes. Without a configuration every neighbor but
+        the learners votes, and so do we.
+
+        """
+        config = self._config
+        if config is None:
+            names = {getattr(n, "_name", n) for n in self._neighbors}
+            return [(names | {self._name}) - self._learners]
+        voters = [set(config["voters"])]
+        if "old" in config:
+            voters.append(set(config["old"]))
+        return voters
+
+    def _is_voter(self, name):
+        if self._config is None:
+            return name not in self._learners
+        return any(name in voters for voters in self._voter_sets())
+
+    def _is_quorum(self, names):
+        """Whether the servers called names, ours possibly included,
+        make a majority of the voters.
+
+        """
+        if self._config is None:
+            others = set(names) - self._learners - {self._name}
+            return len(others) > (self._total_nodes - 1) / 2
+        names = set(names)
+        return all(
+            len(voters & names) > len(voters) / 2 for voters in self._voter_sets()
+        )
+
+    async def change_membership(self, voters):
+        """Makes voters the servers of the cluster, while it keeps
+        serving: the leader first commits a configuration entry holding
+        both the old and the new voters, under which decisions take a
+        majority of both, then one holding the new voters alone.
+
+        Returns once the latter is committed. New servers have to be
+        neighbors of the leader beforehand, and removed ones can stop
+        being neighbors afterwards; a leader that is no longer a voter
+        then steps down. Raises NotLeaderError unless this server is the
+        leader, and MembershipChangeError while another change is under
+        way.
+
+        """
+        voters = list(voters)
+        if not voters:
+            raise ValueError("a cluster needs voters")
+        return await self._change_config(voters, None)
+
+    async def add_learner(self, name):
+        """Makes the server called name a learner: the leader replicates
+        its log there, but it counts towards no quorum. It has to be a
+        neighbor of the leader beforehand.
+
+        The learners are part of the configuration in the log, so this
+        goes through change_membership() if name was a voter, and like
+        it returns once the new configuration is committed.
+        """
+        voters = sorted(self._voter_sets()[0] - {name}, key=str)
+        return await self._change_config(voters, self._learners | {name})
+
+    async def promote(self, name):
+        """Makes the learner called name a voter through
+        change_membership(). The leader raises ValueError unless name
+        holds every committed entry.
+
+        """
+        if not self._state.caught_up(name):
+            raise ValueError(f"{name} has not caught up yet")
+        voters = sorted(self._voter_sets()[0] | {name}, key=str)
+        return await self._change_config(voters, self._learners - {name})
+
+    async def _change_config(self, voters, learners):
+        state, future = await self._state.on_membership_request(voters, learners)
+        if future is None:
+            raise NotLeaderError(getattr(state, "leader", None))
+        return await future
+
+    async def transfer_leadership(self, target):
+        """Hands the leadership over to the voter called target, for
+        instance before this server is restarted: proposals are turned
+        away meanwhile, and target takes over as soon as it holds the
+        whole log, without waiting for an election timeout.
+
+        Returns once target leads. Raises NotLeaderError unless this
+        server is the leader, and LeadershipTransferError if target did
+        not take over within FOLLOWER_TIMEOUT or someone else won.
+
+        """
+        state, future = await self._state.on_transfer_request(target)
+        if future is None:
+            raise NotLeaderError(getattr(state, "leader", None))
+        return await future
+
+    def _await_handover(self, target, future):
+        """Resolves the future of a transfer to target once we follow
+        the winner of the election it led to, or fails it unless we do
+        within FOLLOWER_TIMEOUT.
+
+        """
+        self._handed_over()
+        timer = get_wheel().call_later(FOLLOWER_TIMEOUT, self._handed_over)
+        self._handover = (target, future, timer)
+
+    def _handed_over(self, leader=None):
+        """Called once we follow leader, or gave up on hearing of one."""
+        if self._handover is None:
+            return
+        target, future, timer = self._handover
+        self._handover = None
+        timer.cancel()
+        if future.done():
+            return
+        if leader == target:
+            future.set_result(None)
+        else:
+            future.set_exception(
+                LeadershipTransferError(f"{self._name}: {target} did not take over")
+            )
+
+    def apply_committed(self):
+        """Applies every committed entry that hasn't been applied yet
+        with a single call to the state machine, then wakes up whoever
+        waits for them.
+
+        """
+        self._applyHandle = None
+        start, stop = self._lastApplied, self._commitIndex
+        if start >= stop:
+            return
+
+        entries = self._log[start:stop]
+        if self._stateMachine is not None:
+            results = self._stateMachine.apply(entries)
+        else:
+            results = [None] * len(entries)
+        self._lastApplied = stop
+
+        while self._applyWaiters and self._applyWaiters[0][0] < stop:
+            index, _, term, waiter = heapq.heappop(self._applyWaiters)
+            if waiter.done():
+                continue
+            if index < start:
+                waiter.set_result(None)
+            elif term is not None and entries[index - start]["term"] != term:
+                # Another leader's entry took the place of the one proposed
+                waiter.set_exception(NotLeaderError())
+            else:
+                waiter.set_result(results[index - start])
+
+        if (
+            self._stateMachine is not None
+            and stop - self._log.first_index >= SNAPSHOT_THRESHOLD
+        ):
+            self.snapshot()
+
+    def _schedule_apply(self):
+        """Applies newly committed entries once the current event loop
+        iteration is over, so that everything committed meanwhile is
+        applied in one batch.
+
+        """
+        if self._commitIndex > self._lastApplied and self._applyHandle is None:
+            loop = asyncio.get_event_loop()
+            self._applyHandle = loop.call_soon(self.apply_committed)
+
+    async def wait_applied(self, index):
+        """Waits until the entry at index has been applied and returns
+        what the state machine returned for it, if it is still known.
+
+        """
+        if index < self._lastApplied:
+            return None
+        waiter = asyncio.get_event_loop().create_future()
+        self._add_apply_waiter(index, waiter)
+        return await waiter
+
+    def _add_apply_waiter(self, index, waiter, term=None):
+        """Sets the result of waiter once the entry at index is applied.
+        With a term, waiter fails with NotLeaderError if the entry applied
+        there is not of that term.
+
+        """
+        heapq.heappush(self._applyWaiters, (index, next(self._applySeq), term, waiter))
+        self._schedule_apply()
+
+    async def propose(self, command):
+        """Replicates command through the log and returns what the state
+        machine returned for it once it has been applied. Raises
+        NotLeaderError unless this server is the leader, and
+        OverloadedError while its message board is overloaded.
+
+        """
+        if getattr(self._messageBoard, "overloaded", False):
+            raise OverloadedError(f"{self._name}: message board overloaded")
+        state, future = await self._state.on_client_command(command)
+        if future is None:
+            raise NotLeaderError(getattr(state, "leader", None))
+        return await future
+
+    async def read_index(self):
+        """Waits until the state machine reflects every write committed
+        before the call, without going through the log, so it can be
+        read from. Raises NotLeaderError unless this server is the leader.
+
+        """
+        state, future = await self._state.on_client_read()
+        if future is None:
+            raise NotLeaderError(getattr(state, "leader", None))
+        readIndex = await future
+        await self.wait_applied(readIndex - 1)
+        return readIndex
+
+    def snapshot(self):
+        """Snapshots the state machine and compacts the log up to the
+        last applied entry. On an event loop the snapshot is saved in
+        the background and the task doing so is returned, unless one
+        already is.
+
+        """
+        if self._snapshotting is not None or self._lastApplied <= self._log.first_index:
+            return None
+        snapshot = self._snapshot_at(
+            self._lastApplied - 1, self._stateMachine.snapshot()
+        )
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._log.compact(snapshot)
+            return None
+        self._snapshotting = asyncio.ensure_future(self._log.compact_async(snapshot))
+        self._snapshotting.add_done_callback(self._snapshotted)
+        return self._snapshotting
+
+    def _snapshotted(self, future):
+        self._snapshotting = None
+        if not future.cancelled() and future.exception() is not None:
+            logging.getLogger("raft").error(
+                f"{self._name}: failed to save a snapshot", exc_info=future.exception()
+            )
+
+    def take_snapshot(self, index, data):
+        """Compacts the log up to and including the entry at index. data
+        is the state of the state machine once that entry was applied.
+
+        """
+        if index >= self._commitIndex:
+            raise ValueError(f"entry {index} is not committed yet")
+        self._log.compact(self._snapshot_at(index, data))
+
+    def _snapshot_at(self, index, data):
+        config, _ = self._last_config(index + 1)
+        return Snapshot(index, self._log.term(index), data, config)
+
+    async def install_snapshot(self, snapshot):
+        """Replaces the state up to snapshot.index with the snapshot the
+        leader sent, once it is saved.
+
+        """
+        if snapshot.index < self._log.first_index:
+            return
+        await self._log.compact_async(snapshot)
+        self._commitIndex = max(self._commitIndex, snapshot.index + 1)
+        self._lastLogIndex = len(self._log) - 1
+        self._lastLogTerm = self._log.term(-1)
+        self._set_config(*self._last_config(len(self._log)))
+
+        if self._lastApplied <= snapshot.index:
+            if self._stateMachine is not None:
+                self._stateMachine.restore(snapshot.data)
+            self._lastApplied = snapshot.index + 1
+            while (
+                self._applyWaiters
+                and self._applyWaiters[0][0] < self._lastApplied
+            ):
+                _, _, term, waiter = heapq.heappop(self._applyWaiters)
+                if waiter.done():
+                    continue
+                if term is not None:
+                    # Whether the proposed entry made it can't be told
+                    waiter.set_exception(NotLeaderError())
+                else:
+                    waiter.set_result(None)
+
+    def _neighbor(self, name):
+        # Neighbors may also be appended to _neighbors directly
+        if len(self._neighborIndex) != len(self._neighbors):
+            self._neighborIndex = {n._name: n for n in self._neighbors}
+        return self._neighborIndex.get(name)
+
+    def add_neighbor(self, neighbor):
+        self._neighbors.append(neighbor)
+        self._neighborIndex[neighbor._name] = neighbor
+
+    def remove_neighbor(self, neighbor):
+        self._neighbors.remove(neighbor)
+        self._neighborIndex.pop(neighbor._name, None)
+
+    async def dispatcher(self):
+        "Handles the messages posted to the board until the server stops"
+        while not self._stop:
+            for message in await self._messageBoard.get_messages(MAX_BOARD_BATCH):
+                try:
+                    await self.on_message(message)
+                except Exception:
+                    logging.getLogger("raft").exception(f"Failed to handle {message}")
 
     async def send_message(self, message):
         ...
@@ -47,45 +471,76 @@ class Server:
 
     async def _receive_message(self, message):
         "Use this for local message delivery"
-        ...
+        await self.receive_message(message)
+
+    async def _post_messages(self, messages):
+        for message in messages:
+            await self._messageBoard.post_message(message)
 
     async def post_message(self, message):
-        ...
+        await self._messageBoard.post_message(message)
 
     async def on_message(self, message):
-        ...
+        state, response = await self._state.on_message(message)
+
+        self._state = state
+        self._schedule_apply()
 
 
 class ZeroMQServer(Server):
-    "This implementation is suitable for single process testing"
+    """This implementation is suitable for single process testing.
+
+    With directed=True it talks to other processes instead: it receives
+    on a ROUTER socket bound to port and sends to every peer through a
+    DEALER socket connected to the peer's host and port, so a message
+    only reaches its receiver.
+    """
 
     def __init__(
-        self, name, state: State, log=None, messageBoard=None, neighbors=None, port=0
+        self,
+        name,
+        state: State,
+        log=None,
+        messageBoard=None,
+        neighbors=None,
+        port=0,
+        stateMachine=None,
+        directed=False,
+        host=None,
     ):
-        if log == None:
-            log = []
-        if neighbors == None:
-            neighbors = []
-        if messageBoard == None:
-            messageBoard = MemoryBoard()
-
-        super().__init__(name, state, log, messageBoard, neighbors)
+        super().__init__(
+            name, state, log, messageBoard, neighbors, _stateMachine=stateMachine
+        )
         self._port = port
-        self._stop = False
+        self._host = name if host is None else host
+        self._directed = directed
+        self._context = zmq.asyncio.Context.instance()
+        self._router = None
+        self._dealers = {}  # by peer name
+
+    def _endpoint(self, neighbor):
+        host = getattr(neighbor, "_host", neighbor._name)
+        return "tcp://%s:%d" % (host, neighbor._port)
 
     async def subscriber(self):
         logger = logging.getLogger("raft")
-        context = zmq.asyncio.Context()
-        socket = context.socket(zmq.SUB)
+        socket = self._context.socket(zmq.SUB)
+        socket.setsockopt(zmq.SUBSCRIBE, b"")
         for n in self._neighbors:
-            socket.connect("tcp://%s:%d" % (n._name, n._port))
+            socket.connect(self._endpoint(n))
 
         while not self._stop:
             try:
-                message = await socket.recv()
+                frames = await socket.recv_multipart(copy=False)
             except zmq.error.ContextTerminated as e:
                 break
-            if not message:
+            try:
+                message = codec.decode([f.buffer for f in frames])
+            except Exception as e:
+                logger.info(f"Dropping undecodable message: {e}")
+                continue
+            # Every subscriber gets what a peer publishes
+            if message.receiver not in (None, self._name):
                 continue
             logger.debug(f"Got message: {message}")
             await self.on_message(message)
@@ -93,61 +548,106 @@ class ZeroMQServer(Server):
 
     async def publisher(self):
         logger = logging.getLogger("raft")
-        context = zmq.asyncio.Context()
-        socket = context.socket(zmq.PUB)
+        socket = self._context.socket(zmq.PUB)
+        # Messages for a subscriber that can't keep up are dropped
+        socket.setsockopt(zmq.SNDHWM, BOARD_HIGH_WATERMARK)
+        self._bind(socket)
+        logger.info(f"publish port: {self._port}")
+
+        while not self._stop:
+            messages = await self._messageBoard.get_messages(MAX_BOARD_BATCH)
+            try:
+                for message in messages:
+                    await socket.send_multipart(codec.encode(message), copy=False)
+            except Exception as e:
+                print(e)
+                break
+        socket.close()
+
+    def _bind(self, socket):
         if self._port == 0:
             self._port = socket.bind_to_random_port("tcp://*")
         else:
             socket.bind("tcp://*:%d" % self._port)
-        logger.info(f"publish port: {self._port}")
+
+    async def router(self):
+        logger = logging.getLogger("raft")
+        socket = self._router
 
         while not self._stop:
-            message = await self._messageBoard.get_message()
-            if not message:
-                continue  # sleep wait?
             try:
-                await socket.send_string(str(message))
-            except Exception as e:
-                print(e)
+                frames = await socket.recv_multipart(copy=False)
+            except zmq.error.ContextTerminated:
                 break
+            # The first frame is the identity of the sending DEALER
+            try:
+                message = codec.decode([f.buffer for f in frames[1:]])
+            except Exception as e:
+                logger.info(f"Dropping undecodable message: {e}")
+                continue
+            logger.debug(f"Got message: {message}")
+            await self.on_message(message)
         socket.close()
 
+    def _dealer(self, neighbor):
+        dealer = self._dealers.get(neighbor._name)
+        if dealer is None:
+            dealer = self._context.socket(zmq.DEALER)
+            dealer.setsockopt(zmq.SNDHWM, BOARD_HIGH_WATERMARK)
+            dealer.setsockopt(zmq.LINGER, 0)
+            dealer.connect(self._endpoint(neighbor))
+            self._dealers[neighbor._name] = dealer
+        return dealer
+
     async def run(self):
-        asyncio.create_task(self.publisher())
-        asyncio.create_task(self.subscriber())
+        if self._directed:
+            self._router = self._context.socket(zmq.ROUTER)
+            self._bind(self._router)
+            logging.getLogger("raft").info(f"router port: {self._port}")
+            asyncio.create_task(self.router())
+        else:
+            asyncio.create_task(self.publisher())
+            asyncio.create_task(self.subscriber())
 
     def stop(self):
         self._stop = True
-
-    def add_neighbor(self, neighbor):
-        self._neighbors.append(neighbor)
+        for dealer in self._dealers.values():
+            dealer.close()
+        self._dealers.clear()
 
     def remove_neighbor(self, neighbor):
-        self._neighbors.remove(neighbor)
+        super().remove_neighbor(neighbor)
+        dealer = self._dealers.pop(neighbor._name, None)
+        if dealer is not None:
+            dealer.close()
 
     async def send_message(self, message):
         if message.receiver is None:
-            for n in self._neighbors:
-                message._receiver = n._name
-                await n.post_message(message)
+            targets = self._neighbors
         else:
-            for n in self._neighbors:
-                if n._name == message.receiver:
-                    await n.post_message(message)
-                    break
-
-    async def receive_message(self, message):
-        n = [n for n in self._neighbors if n._name == message.receiver]
-        if len(n) > 0:
-            await n[0].post_message(message)
-
-    async def _receive_message(self, message):
-        await self.receive_message(message)
+            n = self._neighbor(message.receiver)
+            targets = [] if n is None else [n]
 
-    async def post_message(self, message):
-        await self._messageBoard.post_message(message)
-
-    async def on_message(self, message):
-        state, response = await self._state.on_message(message)
+        if self._directed:
+            frames = codec.encode(message)
+            for n in targets:
+                if message.receiver is None:
+                    to = codec.readdress(frames, message, n._name)
+                else:
+                    to = frames
+                # Messages for a peer that can't keep up are dropped rather
+                #   than holding up the others, Raft sends them again
+                try:
+                    await self._dealer(n).send_multipart(
+                        to, flags=zmq.NOBLOCK, copy=False
+                    )
+                except zmq.Again:
+                    logging.getLogger("raft").debug(f"Dropping message for {n._name}")
+        else:
+            for n in targets:
+                await n.post_message(message)
 
-        self._state = state
+    async def receive_message(self, message):
+        n = self._neighbor(message.receiver)
+        if n is not None:
+            await n.post_message(message)
@@ -0,0 +1,320 @@
+import asyncio
+import errno
+import logging
+import os
+import struct
+import tempfile
+from multiprocessing import resource_tracker, shared_memory
+
+from ..messages import codec
+from ..states.config import MAX_PENDING_MESSAGES
+from ..states.state import State
+from .server import Server
+
+logger = logging.getLogger("raft")
+
+# The producer's and the consumer's positions, on cache lines of their own.
+# Both only ever grow, the ring holds head - tail bytes.
+HEAD = struct.Struct("<Q")
+TAIL_OFFSET = 64
+DATA_OFFSET = 128
+RECORD = struct.Struct("<I")
+
+RING_SIZE = 1 << 22
+
+
+class RingBuffer:
+    """A single producer, single consumer ring of variable sized records
+    in a shared memory block. The consumer creates it, the producer
+    attaches to it by name. Only the producer moves the head and only
+    the consumer moves the tail.
+
+    """
+
+    def __init__(self, name, create=False, size=RING_SIZE):
+        if create:
+            self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+            self._shm.buf[:DATA_OFFSET] = bytes(DATA_OFFSET)
+        else:
+            self._shm = shared_memory.SharedMemory(name)
+            # Only the creator gets to unlink it
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        self._owner = create
+        self._buf = self._shm.buf
+        self._capacity = self._shm.size - DATA_OFFSET
+
+    @property
+    def _head(self):
+        return HEAD.unpack_from(self._buf, 0)[0]
+
+    @property
+    def _tail(self):
+        return HEAD.unpack_from(self._buf, TAIL_OFFSET)[0]
+
+    def __len__(self):
+        return self._head - self._tail
+
+    @property
+    def max_record(self):
+        """The size of the largest record the ring can ever take."""
+        return self._capacity - RECORD.size
+
+    def _copy_in(self, pos, data):
+        offset = pos % self._capacity
+        first = min(len(data), self._capacity - offset)
+        start = DATA_OFFSET + offset
+        self._buf[start : start + first] = data[:first]
+        if first < len(data):
+            self._buf[DATA_OFFSET : DATA_OFFSET + len(data) - first] = data[first:]
+
+    def _copy_out(self, pos, size):
+        """Returns size bytes at pos, without copying unless they wrap."""
+        offset = pos % self._capacity
+        start = DATA_OFFSET + offset
+        if offset + size <= self._capacity:
+            return self._buf[start : start + size]
+        first = self._capacity - offset
+        return bytes(self._buf[start : start + first]) + bytes(
+            self._buf[DATA_OFFSET : DATA_OFFSET + size - first]
+        )
+
+    def put(self, parts):
+        """Appends the concatenation of parts as one record. Returns False
+        if the ring is too full to take it.
+
+        """
+        size = sum(len(p) for p in parts)
+        head = self._head
+        if self._capacity - (head - self._tail) < RECORD.size + size:
+            return False
+        self._copy_in(head, RECORD.pack(size))
+        pos = head + RECORD.size
+        for p in parts:
+            self._copy_in(pos, p)
+            pos += len(p)
+        # Publish the record once it is whole
+        HEAD.pack_into(self._buf, 0, pos)
+        return True
+
+    def get(self):
+        """Yields every record in the ring, each one is released once the
+        next one is asked for.
+
+        """
+        tail, head = self._tail, self._head
+        while tail < head:
+            (size,) = RECORD.unpack(self._copy_out(tail, RECORD.size))
+            yield self._copy_out(tail + RECORD.size, size)
+            tail += RECORD.size + size
+            HEAD.pack_into(self._buf, TAIL_OFFSET, tail)
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class _Inbound:
+    """A ring another server writes to, and the FIFO it pokes us through."""
+
+    def __init__(self, name, size):
+        self.ring = RingBuffer(name, create=True, size=size)
+        self.fifo = _fifo_path(name)
+        if os.path.exists(self.fifo):
+            os.remove(self.fifo)
+        os.mkfifo(self.fifo)
+        # Also opened for writing so the FIFO never reads as closed
+        self.fd = os.open(self.fifo, os.O_RDWR | os.O_NONBLOCK)
+
+    def close(self):
+        os.close(self.fd)
+        os.remove(self.fifo)
+        self.ring.close()
+
+
+class _Outbound:
+    """A ring we write to. Everything sent in one event loop iteration is
+    followed by a single wakeup.
+
+    Once the reader is gone the outbound closes: a reader coming back
+    creates a ring of its own, which a new outbound maps.
+    """
+
+    def __init__(self, name, loop):
+        self.name = name
+        self.ring = RingBuffer(name)
+        self.fd = os.open(_fifo_path(name), os.O_WRONLY | os.O_NONBLOCK)
+        self.closed = False
+        self._loop = loop
+        self._pending = []
+        self._handle = None
+
+    def write(self, record):
+        size = sum(len(p) for p in record)
+        if size > self.ring.max_record:
+            logger.warning(f"{self.name}: dropping a message of {size} bytes")
+            return
+        if len(self._pending) >= MAX_PENDING_MESSAGES:
+            logger.debug(f"{self.name}: reader can't keep up, dropping a message")
+            return
+        self._pending.append(record)
+        if self._handle is None:
+            self._handle = self._loop.call_soon(self.flush)
+
+    def flush(self):
+        self._handle = None
+        written = 0
+        for record in self._pending:
+            if not self.ring.put(record):
+                break
+            written += 1
+        del self._pending[:written]
+        try:
+            os.write(self.fd, b"\0")
+        except BlockingIOError:
+            pass  # plenty of wakeups are waiting already
+        except BrokenPipeError:
+            logger.info(f"{self.name}: reader is gone")
+            self.close()
+            return
+        if self._pending:
+            # The ring is full, try again once the reader made room
+            self._handle = self._loop.call_later(0.001, self.flush)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._handle is not None:
+            self._handle.cancel()
+        os.close(self.fd)
+        self.ring.close()
+
+
+def _fifo_path(name):
+    return os.path.join(tempfile.gettempdir(), name + ".fifo")
+
+
+class SharedMemoryServer(Server):
+    """Talks to neighbors running on the same machine, possibly in other
+    processes, through shared memory.
+
+    Every server creates one ring per neighbor for that neighbor to
+    write to, named after the namespace and both server names, and a
+    FIFO next to it that the writer pokes once it wrote a batch.
+    Received messages are posted to the message board and handled in
+    order by a single task.
+    """
+
+    def __init__(
+        self,
+        name,
+        state: State,
+        log=None,
+        messageBoard=None,
+        neighbors=None,
+        namespace="raft",
+        ringSize=RING_SIZE,
+        stateMachine=None,
+    ):
+        super().__init__(
+            name, state, log, messageBoard, neighbors, _stateMachine=stateMachine
+        )
+        self._namespace = namespace
+        self._ringSize = ringSize
+        self._inbound = {}  # by peer name
+        self._outbound = {}  # by peer name
+
+    def _ring_name(self, sender, receiver):
+        return f"{self._namespace}-{sender}-{receiver}"
+
+    async def run(self):
+        for n in self._neighbors:
+            self._listen(n)
+        asyncio.create_task(self.dispatcher())
+
+    def _listen(self, neighbor):
+        if neighbor._name in self._inbound:
+            return
+        inbound = _Inbound(self._ring_name(neighbor._name, self._name), self._ringSize)
+        self._inbound[neighbor._name] = inbound
+        loop = asyncio.get_event_loop()
+        loop.add_reader(inbound.fd, self._read, inbound)
+
+    def _read(self, inbound):
+        try:
+            while os.read(inbound.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        messages = []
+        for record in inbound.ring.get():
+            try:
+                messages.append(codec.decode(codec.split(record)))
+            except Exception as e:
+                logger.info(f"Dropping undecodable message: {e}")
+            del record
+        if messages:
+            asyncio.ensure_future(self._post_messages(messages))
+
+    def stop(self):
+        self._stop = True
+        loop = asyncio.get_event_loop()
+        for inbound in self._inbound.values():
+            loop.remove_reader(inbound.fd)
+            inbound.close()
+        for outbound in self._outbound.values():
+            outbound.close()
+        self._inbound.clear()
+        self._outbound.clear()
+
+    def add_neighbor(self, neighbor):
+        super().add_neighbor(neighbor)
+        self._listen(neighbor)
+
+    def remove_neighbor(self, neighbor):
+        super().remove_neighbor(neighbor)
+        outbound = self._outbound.pop(neighbor._name, None)
+        if outbound is not None:
+            outbound.close()
+        inbound = self._inbound.pop(neighbor._name, None)
+        if inbound is not None:
+            asyncio.get_event_loop().remove_reader(inbound.fd)
+            inbound.close()
+
+    def _connection(self, neighbor):
+        outbound = self._outbound.get(neighbor._name)
+        if outbound is None or outbound.closed:
+            name = self._ring_name(self._name, neighbor._name)
+            try:
+                outbound = _Outbound(name, asyncio.get_event_loop())
+            except OSError as e:
+                if e.errno not in (errno.ENOENT, errno.ENXIO):
+                    raise
+                # The neighbor isn't listening yet, Raft retries on its own
+                logger.debug(f"{name}: not there yet")
+                return None
+            self._outbound[neighbor._name] = outbound
+        return outbound
+
+    async def send_message(self, message):
+        if message.receiver is None:
+            targets = self._neighbors
+        else:
+            n = self._neighbor(message.receiver)
+            targets = [] if n is None else [n]
+
+        frames = codec.encode(message)
+        for n in targets:
+            outbound = self._connection(n)
+            if outbound is None:
+                continue
+            if message.receiver is None:
+                outbound.write(codec.prefix(codec.readdress(frames, message, n._name)))
+            else:
+                outbound.write(codec.prefix(frames))
+
+    async def receive_message(self, message):
+        await self.post_message(message)
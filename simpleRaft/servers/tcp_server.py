@@ -0,0 +1,224 @@
+import asyncio
+import logging
+
+from ..messages import codec
+from ..messages.codec import PREFIX
+from ..states.config import MAX_PENDING_MESSAGES
+from ..states.state import State
+from .server import Server
+
+logger = logging.getLogger("raft")
+
+READ_BUFFER_SIZE = 1 << 16
+
+
+class _Connection:
+    """The connection to one peer. Everything sent in the same event loop
+    iteration goes out with a single writelines().
+
+    While the transport's buffer is full messages wait here, up to
+    MAX_PENDING_MESSAGES of them, and further ones are dropped.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self.transport = None
+        self.paused = False
+        self._pending = []
+        self._queued = 0  # messages in _pending
+        self._handle = None
+
+    def write(self, frames):
+        if self._queued >= MAX_PENDING_MESSAGES:
+            logger.debug("Peer can't keep up, dropping a message")
+            return
+        self._pending.extend(codec.prefix(frames))
+        self._queued += 1
+        if self._handle is None and self.transport is not None and not self.paused:
+            self._handle = self._loop.call_soon(self.flush)
+
+    def flush(self):
+        self._handle = None
+        if self._pending and self.transport is not None and not self.paused:
+            self.transport.writelines(self._pending)
+            self._pending = []
+            self._queued = 0
+
+    def resume(self):
+        self.paused = False
+        self.flush()
+
+
+class _Outbound(asyncio.Protocol):
+    def __init__(self, connections, name, connection):
+        self._connections = connections
+        self._name = name
+        self._connection = connection
+
+    def pause_writing(self):
+        self._connection.paused = True
+
+    def resume_writing(self):
+        self._connection.resume()
+
+    def connection_lost(self, exc):
+        # The next message to the peer connects again
+        self._connections.discard(self._name, self._connection)
+
+
+class _Connections(dict):
+    """The connections to the peers, by name. The first message to a
+    peer connects to it, and so does the first one after it was lost.
+
+    """
+
+    def open(self, peer):
+        connection = self.get(peer._name)
+        if connection is None:
+            loop = asyncio.get_event_loop()
+            connection = self[peer._name] = _Connection(loop)
+            loop.create_task(self._connect(peer, connection))
+        return connection
+
+    async def _connect(self, peer, connection):
+        loop = asyncio.get_event_loop()
+        try:
+            connection.transport, _ = await loop.create_connection(
+                lambda: _Outbound(self, peer._name, connection),
+                peer._host,
+                peer._port,
+            )
+        except OSError as e:
+            # What was queued is lost, Raft retries on its own
+            logger.info(f"Can't connect to {peer._name}: {e}")
+            self.discard(peer._name, connection)
+            return
+        connection.flush()
+
+    def discard(self, name, connection):
+        if self.get(name) is connection:
+            del self[name]
+
+    def close(self, name=None):
+        """Closes the connection to name, or every connection."""
+        names = list(self) if name is None else [name]
+        for name in names:
+            connection = self.pop(name, None)
+            if connection is not None and connection.transport is not None:
+                connection.transport.close()
+
+
+class _Inbound(asyncio.BufferedProtocol):
+    """Parses messages straight out of the buffer the socket is read into."""
+
+    def __init__(self, server):
+        self._server = server
+        self._buffer = bytearray(READ_BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        self._size = 0
+
+    def get_buffer(self, sizehint):
+        if self._size == len(self._buffer):
+            # A message larger than the buffer, make room for it
+            self._view.release()
+            self._buffer.extend(bytes(len(self._buffer)))
+            self._view = memoryview(self._buffer)
+        return self._view[self._size :]
+
+    def buffer_updated(self, nbytes):
+        self._size += nbytes
+        view = self._view
+        messages = []
+        pos = 0
+        while self._size - pos >= PREFIX.size:
+            sizes = PREFIX.unpack_from(view, pos)
+            end = pos + PREFIX.size + sum(sizes)
+            if end > self._size:
+                break
+            frames = []
+            start = pos + PREFIX.size
+            for size in sizes:
+                frames.append(view[start : start + size])
+                start += size
+            try:
+                messages.append(codec.decode(frames))
+            except Exception as e:
+                logger.info(f"Dropping undecodable message: {e}")
+            pos = end
+
+        if pos:
+            # Keep the start of the next message at the front
+            self._buffer[: self._size - pos] = view[pos : self._size]
+            self._size -= pos
+        if messages:
+            asyncio.ensure_future(self._server._post_messages(messages))
+
+
+class TCPServer(Server):
+    """Talks to its neighbors over plain TCP with nothing but asyncio.
+
+    Every peer gets one persistent connection, messages on it are the
+    codec frames prefixed with their sizes. Received messages are posted
+    to the message board and handled in order by a single task.
+    """
+
+    def __init__(
+        self,
+        name,
+        state: State,
+        log=None,
+        messageBoard=None,
+        neighbors=None,
+        host="127.0.0.1",
+        port=0,
+        stateMachine=None,
+    ):
+        super().__init__(
+            name, state, log, messageBoard, neighbors, _stateMachine=stateMachine
+        )
+        self._host = host
+        self._port = port
+        self._listener = None
+        self._connections = _Connections()
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        self._listener = await loop.create_server(
+            lambda: _Inbound(self), self._host, self._port
+        )
+        self._port = self._listener.sockets[0].getsockname()[1]
+        logger.info(f"listening on {self._host}:{self._port}")
+        asyncio.create_task(self.dispatcher())
+
+    def stop(self):
+        self._stop = True
+        self._state.stop()
+        if self._listener is not None:
+            self._listener.close()
+        self._connections.close()
+
+    def remove_neighbor(self, neighbor):
+        super().remove_neighbor(neighbor)
+        self._connections.close(neighbor._name)
+
+    async def send_message(self, message):
+        if self._stop:
+            # Or the peers would be connected to again
+            return
+        if message.receiver is None:
+            targets = self._neighbors
+        else:
+            n = self._neighbor(message.receiver)
+            targets = [] if n is None else [n]
+
+        frames = codec.encode(message)
+        for n in targets:
+            if message.receiver is None:
+                self._connections.open(n).write(
+                    codec.readdress(frames, message, n._name)
+                )
+            else:
+                self._connections.open(n).write(frames)
+
+    async def receive_message(self, message):
+        await self.post_message(message)
@@ -3,9 +3,8 @@ import uuid
 from typing import Union
 
 from pyre import Pyre
-from serde.msgpack import from_msgpack, to_msgpack
 
-from ..boards.memory_board import MemoryBoard
+from ..messages import codec
 from ..messages.base import BaseMessage
 from ..states.state import State
 from .server import Server
@@ -18,13 +17,23 @@ class ZREServer(Server):
 
     ZRE_GROUP = "raft"
 
-    def __init__(self, name, state: State, node: Pyre, log=None, messageBoard=None):
-        if log == None:
-            log = []
-        if messageBoard == None:
-            messageBoard = MemoryBoard()
-
-        super().__init__(node.uuid().hex, state, log, messageBoard, [])
+    def __init__(
+        self,
+        name,
+        state: State,
+        node: Pyre,
+        log=None,
+        messageBoard=None,
+        stateMachine=None,
+    ):
+        super().__init__(
+            node.uuid().hex,
+            state,
+            log,
+            messageBoard,
+            [],
+            _stateMachine=stateMachine,
+        )
         self._node = node
         self._human_name = name
 
@@ -39,7 +48,7 @@ class ZREServer(Server):
         if isinstance(message, bytes):
             self._node.shout(self.ZRE_GROUP, b"/raft " + message)
         else:
-            message_bytes = to_msgpack(message, ext_dict=BaseMessage.EXT_DICT)
+            message_bytes = b"".join(codec.prefix(codec.encode(message)))
             if message.receiver is None:
                 self._node.shout(self.ZRE_GROUP, b"/raft " + message_bytes)
             else:
@@ -49,9 +58,7 @@ class ZREServer(Server):
 
     async def receive_message(self, message_bytes: bytes):
         try:
-            message = from_msgpack(
-                BaseMessage, message_bytes, ext_dict=BaseMessage.EXT_DICT
-            )
+            message = codec.decode(codec.split(message_bytes))
         except Exception as e:
             logger.info(f"Got exception: {e}")
             return
@@ -72,3 +79,4 @@ class ZREServer(Server):
         logger.debug(f"---------- on_message end -----------")
 
         self._state = state
+        self._schedule_apply()
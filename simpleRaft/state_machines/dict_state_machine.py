@@ -0,0 +1,41 @@
+import json
+import logging
+
+from .state_machine import StateMachine
+
+logger = logging.getLogger("raft")
+
+
+class DictStateMachine(StateMachine):
+    """A key value store. Commands are ["set", key, value] and
+    ["delete", key], both return the previous value of key.
+
+    """
+
+    def __init__(self):
+        StateMachine.__init__(self)
+        self._data = {}
+
+    def apply(self, entries):
+        return [self._execute(entry.get("value")) for entry in entries]
+
+    def snapshot(self):
+        return json.dumps(self._data).encode()
+
+    def restore(self, data):
+        self._data = json.loads(data)
+
+    def _execute(self, command):
+        if command is None:
+            return None
+
+        op, key, *args = command
+        if op == "set":
+            previous = self._data.get(key)
+            self._data[key] = args[0]
+            return previous
+        elif op == "delete":
+            return self._data.pop(key, None)
+
+        logger.warning(f"Ignoring unknown command: {command}")
+        return None
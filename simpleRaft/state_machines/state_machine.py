@@ -0,0 +1,22 @@
+class StateMachine:
+    """The replicated state machine committed entries are applied to.
+
+    Every entry is a dict holding the command as its "value". Entries
+    without a value, or with a None value, are internal to Raft and
+    should be left alone.
+    """
+
+    def apply(self, entries):
+        """Applies a contiguous run of committed entries, in log order,
+        and returns a list with the result of every entry.
+
+        """
+        raise NotImplementedError
+
+    def snapshot(self):
+        """Returns the whole state as bytes."""
+        raise NotImplementedError
+
+    def restore(self, data):
+        """Replaces the whole state with one returned by snapshot()."""
+        raise NotImplementedError
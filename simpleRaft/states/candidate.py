@@ -1,15 +1,16 @@
 import asyncio
 
-from ..messages.request_vote import RequestVoteMessage
+from ..messages.request_vote import RequestVoteData, RequestVoteMessage
 from .config import CANDIDATE_TIMEOUT
 from .leader import Leader
 from .voter import Voter
 
 
 class Candidate(Voter):
-    def __init__(self, timeout=CANDIDATE_TIMEOUT):
+    def __init__(self, timeout=CANDIDATE_TIMEOUT, transfer=False):
         super().__init__(timeout)
         self.leader = None
+        self._transfer = transfer  # whether the leader handed over to us
 
     def set_server(self, server):
         self._server = server
@@ -20,11 +21,18 @@ class Candidate(Voter):
     async def on_vote_request(self, message):
         return self, None
 
+    async def on_timeout_now(self, message):
+        return self, None  # already standing for election
+
     async def on_vote_received(self, message):
+        # Only the votes granted by voters count
+        server = self._server
+        if not message.data.response or not server._is_voter(message.sender):
+            return self, None
         if message.sender not in self._votes:
             self._votes[message.sender] = message
 
-            if len(list(self._votes.keys())) > (self._server._total_nodes - 1) / 2:
+            if server._is_quorum({server._name, *self._votes}):
                 self.timer.cancel()
                 leader = Leader()
                 leader.set_server(self._server)
@@ -33,16 +41,18 @@ class Candidate(Voter):
         return self, None
 
     async def _start_election(self):
-        self._server._currentTerm += 1
+        self._server._set_term(self._server._currentTerm + 1)
+        self._server._vote(self._server._name)
+        await self._server._log.sync()
         election = RequestVoteMessage(
             self._server._name,
             None,
             self._server._currentTerm,
-            {
-                "lastLogIndex": self._server._lastLogIndex,
-                "lastLogTerm": self._server._lastLogTerm,
-            },
+            RequestVoteData(
+                lastLogIndex=self._server._lastLogIndex,
+                lastLogTerm=self._server._lastLogTerm,
+                transfer=self._transfer,
+            ),
         )
 
         await self._server.send_message(election)
-        self._last_vote = self._server._name
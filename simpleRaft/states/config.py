@@ -1,3 +1,56 @@
 HEART_BEAT_INTERVAL = 1
 FOLLOWER_TIMEOUT = 5
 CANDIDATE_TIMEOUT = 5
+
+# With PRE_VOTE a server only stands for election, and moves to a new term,
+# once a majority told it they would vote for it: they haven't heard from a
+# leader for FOLLOWER_TIMEOUT and its log is up to date. With CHECK_QUORUM a
+# leader that didn't hear from a majority for FOLLOWER_TIMEOUT steps down.
+PRE_VOTE = True
+CHECK_QUORUM = True
+
+# Election and heart beat deadlines are kept on a timer wheel that turns
+# every TIMER_TICK seconds, with TIMER_WHEEL_LEVELS wheels of
+# TIMER_WHEEL_SLOTS slots each, every one turning once per slot of the next.
+TIMER_TICK = 0.01
+TIMER_WHEEL_SLOTS = 64
+TIMER_WHEEL_LEVELS = 4
+
+# Replication: upper bounds for a single AppendEntries batch, and for
+# the batches and bytes a leader keeps in flight to one follower.
+MAX_APPEND_ENTRIES = 128
+MAX_APPEND_BYTES = 1 << 20
+MAX_INFLIGHT_APPENDS = 4
+MAX_INFLIGHT_BYTES = 4 << 20
+# Batches recently sent are kept, encoded, for followers asking for the same
+ENTRY_BATCH_CACHE_SIZE = 16
+
+# Client proposals reaching the leader within this many seconds of each
+# other, up to PROPOSAL_BATCH_SIZE of them, are appended together
+PROPOSAL_BATCH_WINDOW = 0.001
+PROPOSAL_BATCH_SIZE = 1024
+
+# With lease reads a leader that heard from a majority less than
+# FOLLOWER_TIMEOUT - MAX_CLOCK_DRIFT seconds ago serves reads locally
+LEASE_READS = False
+MAX_CLOCK_DRIFT = 0.5
+
+# Servers take up to this many messages off their board per wakeup
+MAX_BOARD_BATCH = 256
+
+# A board holding BOARD_HIGH_WATERMARK messages is overloaded until it is
+# drained down to BOARD_LOW_WATERMARK: meanwhile it sheds the messages it
+# can do without and its server rejects proposals.
+BOARD_HIGH_WATERMARK = 10000
+BOARD_LOW_WATERMARK = 5000
+
+# Transports queue up to this many messages for a peer that can't keep up,
+# further ones are dropped: Raft sends again what it still needs.
+MAX_PENDING_MESSAGES = 10000
+
+# Snapshots are sent to followers in chunks of this many bytes
+SNAPSHOT_CHUNK_SIZE = 1 << 20
+
+# The state machine is snapshotted and the log compacted once this many
+# entries have been applied since the last snapshot
+SNAPSHOT_THRESHOLD = 100000
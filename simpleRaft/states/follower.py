@@ -1,5 +1,6 @@
 import logging
 
+from ..logs.snapshot import Snapshot
 from .config import FOLLOWER_TIMEOUT
 from .voter import Voter
 
@@ -10,83 +11,128 @@ class Follower(Voter):
     def __init__(self, timeout=FOLLOWER_TIMEOUT):
         super().__init__(timeout)
         self.leader = None
+        self._snapshot_chunks = None
 
     async def on_append_entries(self, message):
         await super().on_append_entries(message)
-        if message.data != {}:
-            log = self._server._log
-            data = message.data
-
-            # Check if the leader is too far ahead in the log.
-            if data["leaderCommit"] != self._server._commitIndex:
-                # If the leader is too far ahead then we
-                #   use the length of the log - 1
-                self._server._commitIndex = min(data["leaderCommit"], len(log) - 1)
-
-            # Can't possibly be up-to-date with the log
-            # If the log is smaller than the preLogIndex
-            if len(log) < data["prevLogIndex"]:
-                await self._send_response_message(message, yes=False)
-                return self, None
-
-            # We need to hold the induction proof of the algorithm here.
-            #   So, we make sure that the prevLogIndex term is always
-            #   equal to the server.
-            if (
-                len(log) > 0
-                and log[data["prevLogIndex"]]["term"] != data["prevLogTerm"]
-            ):
-
-                # There is a conflict we need to resync so delete everything
-                #   from this prevLogIndex and forward and send a failure
-                #   to the server.
-                log = log[: data["prevLogIndex"]]
-                await self._send_response_message(message, yes=False)
-                self._server._log = log
-                self._server._lastLogIndex = data["prevLogIndex"]
-                self._server._lastLogTerm = data["prevLogTerm"]
-                return self, None
-            # The induction proof held so lets check if the commitIndex
-            #   value is the same as the one on the leader
-            else:
-                # Make sure that leaderCommit is > 0 and that the
-                #   data is different here
-                if (
-                    len(log) > 0
-                    and data["leaderCommit"] > 0
-                    and log[data["leaderCommit"]]["term"] != message.term
-                ):
-                    # Data was found to be different so we fix that
-                    #   by taking the current log and slicing it to the
-                    #   leaderCommit + 1 range then setting the last
-                    #   value to the commitValue
-                    log = log[: self._server._commitIndex]
-                    for e in data["entries"]:
-                        log.append(e)
-                        self._server._commitIndex += 1
-
-                    await self._send_response_message(message)
-                    self._server._lastLogIndex = len(log) - 1
-                    self._server._lastLogTerm = log[-1]["term"]
-                    self._commitIndex = len(log) - 1
-                    self._server._log = log
-                else:
-                    # The commit index is not out of the range of the log
-                    #   so we can just append it to the log now.
-                    #   commitIndex = len(log)
-                    #   Is this a heartbeat?
-                    if len(data["entries"]) > 0:
-                        for e in data["entries"]:
-                            log.append(e)
-                            self._server._commitIndex += 1
-
-                        self._server._lastLogIndex = len(log) - 1
-                        self._server._lastLogTerm = log[-1]["term"]
-                        self._commitIndex = len(log) - 1
-                        self._server._log = log
-                        await self._send_response_message(message)
-
-            await self._send_response_message(message)
+
+        log = self._server._log
+        data = message.data
+        prevLogIndex = data.prevLogIndex
+
+        # The entries start right after prevLogIndex. A negative
+        #   prevLogIndex, or prevLogIndex 0 against an empty log, means
+        #   that nothing precedes them.
+        if prevLogIndex < 0 or (prevLogIndex == 0 and len(log) == 0):
+            start = 0
+        # Can't possibly be up-to-date with the log
+        #   if the log is smaller than the prevLogIndex
+        elif prevLogIndex >= len(log):
+            await self._send_response_message(
+                message, yes=False, conflictTerm=None, conflictIndex=len(log)
+            )
+            return self, None
+        # Whatever our snapshot covers is committed, so it matches
+        elif prevLogIndex < log.first_index:
+            start = prevLogIndex + 1
+        # We need to hold the induction proof of the algorithm here.
+        #   So, we make sure that the prevLogIndex term is always
+        #   equal to the server.
+        elif log.term(prevLogIndex) != data.prevLogTerm:
+            # There is a conflict we need to resync so delete everything
+            #   from this prevLogIndex and forward and send a failure
+            #   to the server, along with where its term starts so the
+            #   leader can skip the whole term at once.
+            conflictTerm = log.term(prevLogIndex)
+            conflictIndex = self._first_index_of_term(conflictTerm, prevLogIndex)
+            del log[prevLogIndex:]
+            self._update_last_log()
+            self._server._log_changed(prevLogIndex)
+            await self._send_response_message(
+                message,
+                yes=False,
+                conflictTerm=conflictTerm,
+                conflictIndex=conflictIndex,
+            )
             return self, None
         else:
+            start = prevLogIndex + 1
+
+        # The induction proof held, so skip the entries we already have
+        #   and replace everything from the first one that differs.
+        entries = data.entries
+        for i, entry in enumerate(entries):
+            index = start + i
+            if index < log.first_index:
+                continue
+            if index < len(log) and log.term(index) == entry["term"]:
+                continue
+            del log[index:]
+            log.extend(entries[i:])
+            self._update_last_log()
+            self._server._log_changed(index, entries[i:])
+            break
+
+        # Entries must be durable before the leader is told about them.
+        await log.sync()
+
+        # Only what is known to match the leader can be committed.
+        matchIndex = start + len(entries) - 1
+        commitIndex = min(data.leaderCommit, matchIndex + 1)
+        if commitIndex > self._server._commitIndex:
+            self._server._commitIndex = commitIndex
+
+        await self._send_response_message(message, matchIndex=matchIndex)
+        return self, None
+
+    async def on_install_snapshot(self, message):
+        self._reset_leader_timeout()
+        data = message.data
+
+        if data.offset == 0:
+            self._snapshot_chunks = bytearray()
+        elif (
+            self._snapshot_chunks is None
+            or len(self._snapshot_chunks) != data.offset
+        ):
+            # A chunk went missing, the leader has to start over
+            self._snapshot_chunks = None
+            await self._send_response_message(
+                message,
+                yes=False,
+                conflictTerm=None,
+                conflictIndex=len(self._server._log),
+                lastIncludedIndex=data.lastIncludedIndex,
+            )
+            return self, None
+
+        self._snapshot_chunks += data.data
+        if not data.done:
+            # Frees the window the leader streams the chunks in
+            await self._send_response_message(
+                message,
+                lastIncludedIndex=data.lastIncludedIndex,
+                offset=len(self._snapshot_chunks),
+            )
             return self, None
+
+        snapshot = Snapshot(
+            data.lastIncludedIndex,
+            data.lastIncludedTerm,
+            bytes(self._snapshot_chunks),
+            data.config,
+        )
+        self._snapshot_chunks = None
+        await self._server.install_snapshot(snapshot)
+
+        await self._send_response_message(
+            message,
+            matchIndex=snapshot.index,
+            lastIncludedIndex=snapshot.index,
+        )
+        return self, None
+
+    def _update_last_log(self):
+        log = self._server._log
+        self._server._lastLogIndex = max(len(log) - 1, 0)
+        self._server._lastLogTerm = log.term(-1) if len(log) > 0 else None
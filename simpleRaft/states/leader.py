@@ -1,18 +1,85 @@
 import asyncio
+import heapq
 import logging
-from collections import defaultdict
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict, deque
 
-from ..messages.append_entries import AppendEntriesMessage
-from .config import HEART_BEAT_INTERVAL
+from ..exceptions import (
+    LeadershipTransferError,
+    MembershipChangeError,
+    NotLeaderError,
+)
+from ..messages import codec
+from ..messages.append_entries import AppendEntriesData, AppendEntriesMessage
+from ..messages.base import BaseMessage
+from ..messages.codec import EntryBatch
+from ..messages.install_snapshot import InstallSnapshotData, InstallSnapshotMessage
+from ..messages.timeout_now import TimeoutNowData, TimeoutNowMessage
+from .config import (
+    CHECK_QUORUM,
+    ENTRY_BATCH_CACHE_SIZE,
+    FOLLOWER_TIMEOUT,
+    HEART_BEAT_INTERVAL,
+    LEASE_READS,
+    MAX_APPEND_BYTES,
+    MAX_APPEND_ENTRIES,
+    MAX_CLOCK_DRIFT,
+    PROPOSAL_BATCH_SIZE,
+    PROPOSAL_BATCH_WINDOW,
+    SNAPSHOT_CHUNK_SIZE,
+)
+from ..timer_wheel import get_wheel
+from .follower import Follower
+from .learner import Learner
+from .progress import Progress
 from .state import State
 
 logger = logging.getLogger("raft")
 
+
 class Leader(State):
     def __init__(self):
         self._nextIndexes = defaultdict(int)
-        self._matchIndex = defaultdict(int)
+        self._matchIndex = {}  # learners included
+        # Every set of voters, with their matchIndexes, ours included,
+        #   kept sorted so the index stored on a majority is found
+        #   without sorting. There are two sets while the membership
+        #   changes.
+        self._quorums = []  # (voters, matchIndexes)
+        # How replication to every follower is going, followers only
+        #   get new entries right away once they answered us.
+        self._progress = defaultdict(Progress)
+        # Followers at the same nextIndex share a batch, so that it is
+        #   read from the log and encoded once.
+        self._batches = OrderedDict()  # (start, log length) -> (batch, size)
+        # (entry, future) waiting to be appended, entries of our own come
+        #   without a future
+        self._proposals = []
+        self._proposalTask = None
+        self._membershipChange = None  # resolved once the new voters are
+        # Every heart beat round is numbered and followers echo the number
+        #   back, reads wait for a majority to answer a round sent after
+        #   them.
+        self._heartBeatSeq = 0
+        self._heartBeatAcks = {}  # the latest round every peer answered
+        self._pendingReads = []  # futures waiting for the next round
+        self._reads = deque()  # (round, readIndex, futures)
+        # When the rounds still able to extend the lease were sent
+        self._heartBeatTimes = deque()  # (round, time)
+        self._leaseAcks = {}  # when the round every peer answered was sent
+        self._leaseExpiry = 0
         self.timer = None  # Used by followers/candidates for leader timeout
+        self._heartBeatTimer = None
+        # The peers we heard from since the quorum was last checked
+        self._active = set()
+        self._checkQuorumTimer = None
+        # While the leadership is handed over, the follower taking over
+        #   and the future resolved once we stepped down. Clients are
+        #   sent to the leader meanwhile.
+        self._transferee = None
+        self._transfer = None
+        self._transferTimer = None
+        self.leader = None
 
     def set_server(self, server):
         self._server = server
@@ -20,68 +87,675 @@ class Leader(State):
         loop = asyncio.get_event_loop()
         heart_beat_task = loop.create_task(self._send_heart_beat())
 
-        for n in self._server._neighbors:
-            # With ZeroMQServer we use n.name, but for ZREServer, neighbor is an id
-            if hasattr(n, "_name"):
-                n = n._name
-            self._nextIndexes[n] = self._server._lastLogIndex + 1
-            self._matchIndex[n] = 0
+        for n in self._peers():
+            self._nextIndexes[n] = len(self._server._log)
+            self._matchIndex[n] = -1
+        self._matchIndex[self._server._name] = len(self._server._log) - 1
+        self._sort_match_indexes()
+        if CHECK_QUORUM:
+            self._checkQuorumTimer = get_wheel().call_later(
+                FOLLOWER_TIMEOUT, self._check_quorum, FOLLOWER_TIMEOUT
+            )
+        config = self._server._config
+        if config is not None and "old" in config:
+            if self._server._configIndex < self._server._commitIndex:
+                # The previous leader left the membership change half way
+                self._on_config_committed()
 
         return heart_beat_task
 
+    async def on_message(self, message):
+        if message.term > self._server._currentTerm and message.type not in (
+            BaseMessage.MessageType.PreVote,
+            BaseMessage.MessageType.PreVoteResponse,
+        ):
+            # A newer term started without us, whoever leads it
+            follower = self._step_down(Follower())
+            return await follower.on_message(message)
+        return await super().on_message(message)
+
+    def stop(self):
+        for timer in (
+            self._heartBeatTimer,
+            self._checkQuorumTimer,
+            self._transferTimer,
+        ):
+            if timer is not None:
+                timer.cancel()
+
+    def _step_down(self, state):
+        logger.info(f"{self._server._name}: Stepping down")
+        self._leaseExpiry = 0
+        if self._heartBeatTimer is not None:
+            self._heartBeatTimer.cancel()
+        if self._checkQuorumTimer is not None:
+            self._checkQuorumTimer.cancel()
+        if self._transfer is not None:
+            self._transferTimer.cancel()
+            if not self._transfer.done():
+                # Only done once we know the target won
+                self._server._await_handover(self._transferee, self._transfer)
+        # What was proposed but not appended yet never will be
+        if self._proposalTask is not None:
+            self._proposalTask.cancel()
+            self._proposalTask = None
+        self._fail_proposals()
+        self._fail_reads()
+        state.set_server(self._server)
+        self._server._state = state
+        return state
+
+    def _deposed(self, term):
+        """A peer is in a later term, someone else may be leading it."""
+        self._server._set_term(term)
+        return self._step_down(Follower())
+
+    def _check_quorum(self):
+        """Steps down unless a majority answered us since the last check:
+        we may be cut off from it, and it may have elected a new leader.
+
+        """
+        server = self._server
+        active, self._active = self._active, set()
+        if not server._is_quorum(active | {server._name}):
+            logger.info(f"{server._name}: Lost touch with the majority")
+            self._step_down(Follower())
+
+    def _sort_match_indexes(self):
+        matchIndex = self._matchIndex
+        self._quorums = [
+            (voters, sorted(matchIndex.get(v, -1) for v in voters))
+            for voters in self._server._voter_sets()
+        ]
+
+    def on_membership_change(self):
+        # A new voter may complete a majority, and a former one no longer
+        #   confirms our leadership.
+        self._sort_match_indexes()
+        for peer in list(self._heartBeatAcks):
+            if not self._server._is_voter(peer):
+                del self._heartBeatAcks[peer]
+        for peer in list(self._leaseAcks):
+            if not self._server._is_voter(peer):
+                del self._leaseAcks[peer]
+        self._advance_commit_index()
+        self._resolve_reads()
+        # Committing the new configuration may have made us step down
+        return self._server._state
+
+    async def on_membership_request(self, voters, learners=None):
+        """Appends the joint configuration of the current and the new
+        voters. The configuration of the new voters alone follows once
+        it is committed. Learners that don't become voters stay learners
+        unless given learners.
+
+        When the voters stay the same, as when only the learners change,
+        the new configuration is appended right away.
+        """
+        server = self._server
+        if self._transferee is not None:
+            return self, None
+        config = server._config
+        if server._configIndex >= server._commitIndex or "old" in (config or {}):
+            raise MembershipChangeError(f"{server._name}: membership is changing")
+        old = list(server._voter_sets()[0])
+        if learners is None:
+            learners = server._learners - set(voters)
+        config = {"voters": voters}
+        if learners:
+            config["learners"] = sorted(learners, key=str)
+        future = self._new_future()
+        if set(voters) == set(old):
+            self._proposals.append(({"config": config}, future))
+        else:
+            self._membershipChange = future
+            self._proposals.append(({"config": {**config, "old": old}}, None))
+        await self._append_proposals()
+        return self, future
+
+    def _new_future(self):
+        return asyncio.get_event_loop().create_future()
+
+    async def on_transfer_request(self, target):
+        """Stops taking proposals, brings target up to date and tells it
+        to stand for election right away. Gives up after FOLLOWER_TIMEOUT.
+
+        """
+        server = self._server
+        if self._transferee is not None:
+            raise LeadershipTransferError(f"{server._name}: already handing over")
+        if target not in self._peers() or not server._is_voter(target):
+            raise ValueError(f"{target} is not a voter")
+        self._transferee = self.leader = target
+        self._transfer = self._new_future()
+        self._transferTimer = get_wheel().call_later(
+            FOLLOWER_TIMEOUT, self._abort_transfer
+        )
+        # What was proposed until now is replicated first
+        await self._append_proposals()
+        if self._matchIndex.get(target) == len(server._log) - 1:
+            await self._send_timeout_now()
+        else:
+            await self._replicate(target)
+        return self, self._transfer
+
+    async def _send_timeout_now(self):
+        message = TimeoutNowMessage(
+            self._server._name,
+            self._transferee,
+            self._server._currentTerm,
+            TimeoutNowData(leaderId=self._server._name),
+        )
+        await self._server.send_message(message)
+
+    def _abort_transfer(self):
+        logger.info(f"{self._server._name}: {self._transferee} did not take over")
+        self._transferee = self.leader = None
+        if not self._transfer.done():
+            self._transfer.set_exception(
+                LeadershipTransferError(f"{self._server._name}: transfer timed out")
+            )
+
+    def caught_up(self, peer):
+        return self._matchIndex.get(peer, -1) + 1 >= self._server._commitIndex
+
+    def _peers(self):
+        # With ZeroMQServer we use n.name, but for ZREServer, neighbor is an id
+        return [getattr(n, "_name", n) for n in self._server._neighbors]
+
+    async def on_client_command(self, command):
+        if self._transferee is not None:
+            return self, None
+        future = asyncio.get_event_loop().create_future()
+        self._proposals.append(({"value": command}, future))
+
+        if len(self._proposals) >= PROPOSAL_BATCH_SIZE:
+            await self._append_proposals()
+        elif self._proposalTask is None:
+            self._proposalTask = asyncio.create_task(self._append_proposals_later())
+        return self, future
+
+    async def _append_proposals_later(self):
+        await asyncio.sleep(PROPOSAL_BATCH_WINDOW)
+        self._proposalTask = None
+        await self._append_proposals()
+
+    async def _append_proposals(self):
+        """Appends every queued proposal to the log at once and sends
+        them to the followers in a single round of AppendEntries.
+
+        """
+        if self._proposalTask is not None:
+            self._proposalTask.cancel()
+            self._proposalTask = None
+        if self._server._state is not self:
+            self._fail_proposals()  # we stepped down meanwhile
+            return
+        proposals, self._proposals = self._proposals, []
+        if not proposals:
+            return
+
+        log = self._server._log
+        term = self._server._currentTerm
+        index = len(log)
+        entries = [{"term": term, **entry} for entry, _ in proposals]
+        log.extend(entries)
+        last = len(log) - 1
+        self._server._lastLogIndex = last
+        self._server._lastLogTerm = term
+        self._server._log_changed(index, entries)
+        for i, (_, future) in enumerate(proposals):
+            if future is not None:
+                self._server._add_apply_waiter(index + i, future, term)
+
+        for peer in self._peers():
+            if self._progress[peer].mode == Progress.REPLICATE:
+                await self._replicate(peer)
+        # Our own copy counts towards the majority once it is durable
+        await log.sync()
+        self._update_match_index(self._server._name, last)
+
+    def _fail_proposals(self):
+        proposals, self._proposals = self._proposals, []
+        futures = [future for _, future in proposals if future is not None]
+        if self._membershipChange is not None:
+            futures.append(self._membershipChange)
+            self._membershipChange = None
+        for future in futures:
+            if not future.done():
+                future.set_exception(NotLeaderError())
+
+    def _fail_reads(self):
+        """Our leadership can no longer be confirmed for pending reads."""
+        futures, self._pendingReads = self._pendingReads, []
+        for _, _, confirming in self._reads:
+            futures.extend(confirming)
+        self._reads.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(NotLeaderError())
+
+    async def on_client_read(self):
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        # The follower we hand over to doesn't wait for the lease to expire
+        if LEASE_READS and self._transferee is None and loop.time() < self._leaseExpiry:
+            commitIndex = self._server._commitIndex
+            if commitIndex > 0 and self._server._log.term(commitIndex - 1) == (
+                self._server._currentTerm
+            ):
+                future.set_result(commitIndex)
+                return self, future
+
+        self._pendingReads.append(future)
+        if len(self._pendingReads) == 1:
+            # Reads arriving until the round goes out share it
+            asyncio.create_task(self._confirm_reads())
+        return self, future
+
+    async def _confirm_reads(self):
+        """Sends one heart beat round on behalf of every pending read.
+        Once a majority answers it, the reads may be served as soon as
+        the commit index recorded now has been applied.
+
+        """
+        futures, self._pendingReads = self._pendingReads, []
+        if not futures:
+            return  # we stepped down meanwhile
+        readIndex = self._server._commitIndex
+        # Until an entry of our term is committed we may not know about
+        #   everything the previous leaders committed.
+        log = self._server._log
+        first = self._first_index_of_term(self._server._currentTerm, len(log))
+        if first == len(log):
+            self._proposals.append(({"value": None}, None))
+            await self._append_proposals()
+        readIndex = max(readIndex, first + 1)
+
+        self._reads.append((self._heartBeatSeq + 1, readIndex, futures))
+        await self._broadcast_heart_beat()
+        self._resolve_reads()
+
+    def _resolve_reads(self):
+        server = self._server
+        while self._reads:
+            seq, readIndex, futures = self._reads[0]
+            acked = {p for p, s in self._heartBeatAcks.items() if s >= seq}
+            if not server._is_quorum(acked | {server._name}):
+                break
+            self._reads.popleft()
+            for future in futures:
+                if not future.done():
+                    future.set_result(readIndex)
+
+    def _extend_lease(self, peer, seq):
+        """A peer answering a round won't vote for anyone else for at
+        least FOLLOWER_TIMEOUT after the round was sent, so once a
+        majority did, nobody else can become leader before then.
+
+        """
+        times = self._heartBeatTimes
+        if not times or seq < times[0][0]:
+            return
+        self._leaseAcks[peer] = times[seq - times[0][0]][1]
+
+        # The round every set of voters confirmed, the oldest one counts
+        starts = []
+        for voters in self._server._voter_sets():
+            sent = [t for p, t in self._leaseAcks.items() if p in voters]
+            needed = len(voters) // 2 + 1
+            if self._server._name in voters:
+                needed -= 1  # we count as well
+            if len(sent) < needed:
+                return
+            if needed:
+                starts.append(heapq.nlargest(needed, sent)[-1])
+        if not starts:
+            return
+        start = min(starts)
+        self._leaseExpiry = max(
+            self._leaseExpiry, start + FOLLOWER_TIMEOUT - MAX_CLOCK_DRIFT
+        )
+        # Older rounds can no longer move the lease forward
+        while times and times[0][1] < start:
+            times.popleft()
+
     async def on_response_received(self, message):
+        peer = message.sender
+        data = message.data
+        if data.currentTerm > self._server._currentTerm:
+            return self._deposed(data.currentTerm), None
+        self._active.add(peer)
+
+        seq = data.seq
+        if not self._server._is_voter(peer):
+            pass  # learners don't confirm our leadership
+        elif seq is not None and seq > self._heartBeatAcks.get(peer, 0):
+            self._heartBeatAcks[peer] = seq
+            self._resolve_reads()
+            self._extend_lease(peer, seq)
+
         # Was the last AppendEntries good?
-        if not message.data["response"]:
-            # No, so lets back up the log for this node
-            self._nextIndexes[message.sender] -= 1
+        progress = self._progress[peer]
+        if not data.response:
+            if progress.mode == Progress.SNAPSHOT:
+                # Appends sent before the snapshot are bound to fail,
+                #   only a rejected snapshot needs to be acted upon.
+                if data.lastIncludedIndex is None:
+                    return self, None
+            # A heart beat may overtake the appends in flight, they
+            #   are answered on their own. Unless one sent a round after
+            #   them still finds the follower without them: they were lost.
+            elif (
+                data.seq is not None
+                and progress.mode == Progress.REPLICATE
+                and progress.inflight
+                and not progress.lost(data.seq, message.conflict_index)
+            ):
+                return self, None
+
+            # No, so drop the pipeline, back up the log for this node
+            #   and probe it with a single batch.
+            progress.become_probe()
+            self._nextIndexes[peer] = self._conflict_next_index(message)
+            await self._send_append_entries(peer)
+            return self, None
+
+        if data.offset is not None:
+            if (
+                progress.mode == Progress.SNAPSHOT
+                and data.lastIncludedIndex == progress.pendingSnapshot
+            ):
+                progress.acked_chunks(data.offset)
+                await self._send_snapshot_chunks(peer)
+            return self, None
+
+        matchIndex = data.matchIndex
+        if matchIndex is not None:
+            self._update_match_index(peer, matchIndex)
+            progress.acked(matchIndex)
+            if progress.mode == Progress.PROBE or (
+                progress.mode == Progress.SNAPSHOT
+                and progress.pendingSnapshot <= matchIndex
+            ):
+                progress.become_replicate()
+            # Nothing else is on its way, so the follower is
+            #   expecting exactly what follows matchIndex.
+            if not progress.inflight:
+                self._nextIndexes[peer] = matchIndex + 1
+            if peer == self._transferee and matchIndex == len(self._server._log) - 1:
+                # It holds our whole log, it can win the election
+                await self._send_timeout_now()
+                return self, None
+
+        await self._replicate(peer)
+        return self, None
+
+    def _update_match_index(self, peer, matchIndex):
+        if peer not in self._matchIndex:
+            # A neighbor that joined after we became leader
+            self._matchIndex[peer] = -1
+            self._sort_match_indexes()
+
+        old = self._matchIndex[peer]
+        if matchIndex <= old:
+            return
+        self._matchIndex[peer] = matchIndex
+        voter = False
+        for voters, indexes in self._quorums:
+            if peer in voters:
+                del indexes[bisect_left(indexes, old)]
+                insort(indexes, matchIndex)
+                voter = True
+        if voter:
+            self._advance_commit_index()
+
+    def _advance_commit_index(self):
+        """Commits everything up to the highest index stored on a
+        majority of every set of voters.
+
+        """
+        server = self._server
+        index = min(indexes[-(len(indexes) // 2 + 1)] for _, indexes in self._quorums)
+        if index < server._commitIndex:
+            return
+        # Only entries from our own term are committed by counting
+        #   replicas, older ones get committed along with them.
+        if server._log.term(index) != server._currentTerm:
+            return
+        commitIndex, server._commitIndex = server._commitIndex, index + 1
+        server._schedule_apply()
+        if commitIndex <= server._configIndex <= index:
+            self._on_config_committed()
+
+    def _on_config_committed(self):
+        """Once the joint configuration is committed, the new voters can
+        decide alone. Once theirs is, a leader left out steps down.
+
+        """
+        server = self._server
+        config = server._config
+        if config is None:
+            return
+        if "old" in config:
+            new = {k: v for k, v in config.items() if k != "old"}
+            future, self._membershipChange = self._membershipChange, None
+            self._proposals.append(({"config": new}, future))
+            asyncio.ensure_future(self._append_proposals())
+        elif server._name not in config["voters"]:
+            logger.info(f"{server._name}: No longer a voter")
+            self._step_down(Learner())
+
+    def _conflict_next_index(self, message):
+        """Uses the follower's conflict hints to skip every entry of the
+        conflicting term in one step instead of one entry per round trip.
+
+        """
+        log = self._server._log
+        nextIndex = self._nextIndexes[message.sender]
+        conflictIndex = message.conflict_index
+        if conflictIndex is None:
+            # An old style rejection, back up by one
+            return max(0, nextIndex - 1)
+
+        conflictTerm = message.conflict_term
+        if conflictTerm is not None:
+            # If we have entries of that term the follower agrees with us
+            #   up to our last one, otherwise skip its whole term.
+            last = self._first_index_of_term(conflictTerm + 1, len(log)) - 1
+            if last >= 0 and log.term(last) == conflictTerm:
+                conflictIndex = last + 1
+
+        return max(0, min(conflictIndex, len(log)))
+
+    async def _replicate(self, peer):
+        """Sends peer what follows its nextIndex, for as long as its
+        inflight window allows. The window opens again as it answers.
+
+        """
+        log = self._server._log
+        progress = self._progress[peer]
+        while not progress.paused and self._nextIndexes[peer] < len(log):
+            await self._send_append_entries(peer)
+
+    def _batch(self, start):
+        """Returns the entries from start onwards that fit in a single
+        AppendEntries, and their size. The first entry is always included.
 
-            # Get the next log entry to send to the client.
-            previousIndex = max(0, self._nextIndexes[message.sender] - 1)
-            previous = self._server._log[previousIndex]
-            current = self._server._log[self._nextIndexes[message.sender]]
+        """
+        log = self._server._log
+        key = (start, len(log))
+        batch = self._batches.get(key)
+        if batch is not None:
+            return batch
 
-            # Send the new log to the client and wait for it to respond.
-            appendEntry = AppendEntriesMessage(
+        end = min(len(log), start + MAX_APPEND_ENTRIES)
+        size = 0
+        if log.entry_size(start) is None:
+            # Size the entries by encoding them, the batch is sent as such
+            entries = []
+            packed = []
+            for index in range(start, end):
+                entry = log[index]
+                data = codec.pack_entry(entry)
+                if size + len(data) > MAX_APPEND_BYTES and index > start:
+                    break
+                size += len(data)
+                entries.append(entry)
+                packed.append(data)
+            entries = codec.entry_batch(entries, packed)
+        else:
+            for index in range(start, end):
+                entrySize = log.entry_size(index)
+                if size + entrySize > MAX_APPEND_BYTES and index > start:
+                    end = index
+                    break
+                size += entrySize
+            entries = EntryBatch(log[start:end])
+        batch = self._batches[key] = (entries, size)
+        if len(self._batches) > ENTRY_BATCH_CACHE_SIZE:
+            self._batches.popitem(last=False)
+        return batch
+
+    async def _send_append_entries(self, peer):
+        log = self._server._log
+        nextIndex = self._nextIndexes[peer]
+        if nextIndex < log.first_index:
+            # What the follower needs has been compacted away
+            await self._send_snapshot(peer)
+            return
+
+        prevLogIndex = nextIndex - 1
+        entries, size = self._batch(nextIndex)
+
+        appendEntry = AppendEntriesMessage(
+            self._server._name,
+            peer,
+            self._server._currentTerm,
+            AppendEntriesData(
+                leaderId=self._server._name,
+                prevLogIndex=prevLogIndex,
+                prevLogTerm=log.term(prevLogIndex) if prevLogIndex >= 0 else None,
+                entries=entries,
+                leaderCommit=self._server._commitIndex,
+            ),
+        )
+
+        # Optimistically assume the batch will be accepted so the next
+        #   one can be sent without waiting for the response.
+        if len(entries) > 0:
+            self._nextIndexes[peer] = nextIndex + len(entries)
+            self._progress[peer].sent(
+                nextIndex + len(entries) - 1, size, self._heartBeatSeq
+            )
+
+        await self._server.send_message(appendEntry)
+
+    async def _send_snapshot(self, peer):
+        """Starts streaming the snapshot in chunks. The follower answers
+        every chunk, and once it has installed the snapshot.
+
+        """
+        snapshot = self._server._log.snapshot
+        self._progress[peer].become_snapshot(snapshot.index)
+        self._nextIndexes[peer] = snapshot.index + 1
+        await self._send_snapshot_chunks(peer)
+
+    async def _send_snapshot_chunks(self, peer):
+        """Sends the chunks that follow for as long as the window allows."""
+        snapshot = self._server._log.snapshot
+        progress = self._progress[peer]
+        if snapshot.index != progress.pendingSnapshot:
+            # A newer snapshot replaced the one being sent
+            await self._send_snapshot(peer)
+            return
+
+        data = snapshot.data
+        # An empty snapshot still takes one chunk
+        while not progress.chunks_paused and progress.snapshotOffset < max(
+            len(data), 1
+        ):
+            offset = progress.snapshotOffset
+            chunk = data[offset : offset + SNAPSHOT_CHUNK_SIZE]
+            message = InstallSnapshotMessage(
                 self._server._name,
-                message.sender,
+                peer,
                 self._server._currentTerm,
-                {
-                    "leaderId": self._server._name,
-                    "prevLogIndex": previousIndex,
-                    "prevLogTerm": previous["term"],
-                    "entries": [current],
-                    "leaderCommit": self._server._commitIndex,
-                },
+                InstallSnapshotData(
+                    leaderId=self._server._name,
+                    lastIncludedIndex=snapshot.index,
+                    lastIncludedTerm=snapshot.term,
+                    offset=offset,
+                    data=chunk,
+                    done=offset + SNAPSHOT_CHUNK_SIZE >= len(data),
+                    config=snapshot.config,
+                ),
             )
+            progress.sent_chunk(max(len(chunk), 1))
+            await self._server.send_message(message)
 
-            await self._send_response_message(appendEntry)
+    async def _send_heart_beat(self):
+        await self._broadcast_heart_beat()
+        if self._server._coalescesHeartBeats:
+            return  # the host beats for all of its leaders at once
+        # The next beat is due HEART_BEAT_INTERVAL after this one
+        if self._heartBeatTimer is None:
+            self._heartBeatTimer = get_wheel().call_later(
+                HEART_BEAT_INTERVAL, self._on_heart_beat_timer, HEART_BEAT_INTERVAL
+            )
         else:
-            # The last append was good so increase their index.
-            self._nextIndexes[message.sender] += 1
+            self._heartBeatTimer.reset()
 
-            # Are they caught up?
-            if self._nextIndexes[message.sender] > self._server._lastLogIndex:
-                self._nextIndexes[message.sender] = self._server._lastLogIndex
+    def _coalesce_heart_beats(self, beats):
+        """Followers holding our whole log, with nothing on its way to
+        them, only need to hear our term and commit index. If any other
+        follower needs a full heart beat, everyone gets one instead.
 
-        return self, None
+        """
+        server = self._server
+        last = len(server._log) - 1
+        peers = self._peers()
+        for peer in peers:
+            progress = self._progress[peer]
+            if (
+                progress.mode != Progress.REPLICATE
+                or progress.inflight
+                or self._matchIndex.get(peer) != last
+            ):
+                asyncio.ensure_future(self._broadcast_heart_beat())
+                return
+        beat = [server._group, server._currentTerm, server._commitIndex]
+        for peer in peers:
+            beats[peer].append(beat)
 
-    async def _send_heart_beat(self):
+    def on_heart_beat_ack(self, peer, term, accepted):
+        if term > self._server._currentTerm:
+            self._deposed(term)
+            return
+        self._active.add(peer)
+        if not accepted:
+            # The next round tells it about us in full
+            self._progress[peer].become_probe()
+
+    def _on_heart_beat_timer(self):
+        asyncio.ensure_future(self._broadcast_heart_beat())
+
+    async def _broadcast_heart_beat(self):
+        self._heartBeatSeq += 1
+        if LEASE_READS:
+            loop = asyncio.get_event_loop()
+            self._heartBeatTimes.append((self._heartBeatSeq, loop.time()))
         message = AppendEntriesMessage(
             self._server._name,
             None,
             self._server._currentTerm,
-            {
-                "leaderId": self._server._name,
-                "prevLogIndex": self._server._lastLogIndex,
-                "prevLogTerm": self._server._lastLogTerm,
-                "entries": [],
-                "leaderCommit": self._server._commitIndex,
-            },
+            AppendEntriesData(
+                leaderId=self._server._name,
+                prevLogIndex=self._server._lastLogIndex,
+                prevLogTerm=self._server._lastLogTerm,
+                entries=[],
+                leaderCommit=self._server._commitIndex,
+                seq=self._heartBeatSeq,
+            ),
         )
         await self._server.send_message(message)
-
-        async def schedule_another_beat():
-            await asyncio.sleep(HEART_BEAT_INTERVAL)
-            await self._send_heart_beat()
-
-        asyncio.create_task(schedule_another_beat())
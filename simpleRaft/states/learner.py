@@ -0,0 +1,41 @@
+from .follower import Follower
+
+
+class Learner(Follower):
+    """Gets the log from the leader like a follower, but has no say in
+    elections or commits: it never votes nor stands for election. It
+    turns into a follower once promoted.
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Without an election to start, there is nothing to time out
+        self.timer.cancel()
+
+    def set_server(self, server):
+        super().set_server(server)
+        server._learners.add(server._name)
+
+    def _reset_leader_timeout(self):
+        pass
+
+    async def on_vote_request(self, message):
+        return self, None
+
+    async def on_pre_vote_request(self, message):
+        return self, None
+
+    async def on_timeout_now(self, message):
+        return self, None
+
+    def on_membership_change(self):
+        # Only the configuration in the log makes us a voter
+        server = self._server
+        if not server._is_voter(server._name):
+            return self
+        server._learners.discard(server._name)
+        follower = Follower()
+        follower.leader = self.leader
+        follower.set_server(self._server)
+        return follower
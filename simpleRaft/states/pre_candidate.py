@@ -0,0 +1,60 @@
+import asyncio
+import logging
+
+from ..messages.request_vote import PreVoteMessage, RequestVoteData
+from .candidate import Candidate
+from .config import CANDIDATE_TIMEOUT
+from .voter import Voter
+
+logger = logging.getLogger("raft")
+
+
+class PreCandidate(Voter):
+    """Asks the voters whether they would vote for us in the next term
+    before standing for election in it. A server cut off from the leader
+    keeps asking in vain, without its term moving on, so it doesn't make
+    the leader step down when it is back.
+
+    """
+
+    def __init__(self, timeout=CANDIDATE_TIMEOUT):
+        super().__init__(timeout)
+        self.leader = None
+
+    def set_server(self, server):
+        self._server = server
+        self._votes = set()
+        # The term the votes are asked for
+        self._term = server._currentTerm + 1
+        loop = asyncio.get_event_loop()
+        return loop.create_task(self._start_pre_vote())
+
+    async def on_pre_vote_received(self, message):
+        # Only the votes granted by voters for this round count
+        server = self._server
+        if (
+            message.term != self._term
+            or not message.data.response
+            or not server._is_voter(message.sender)
+        ):
+            return self, None
+        self._votes.add(message.sender)
+        if server._is_quorum({server._name, *self._votes}):
+            self.timer.cancel()
+            candidate = Candidate()
+            candidate.set_server(server)
+            return candidate, None
+        return self, None
+
+    async def _start_pre_vote(self):
+        logger.info(f"{self._server._name}: Asking for pre-votes")
+        message = PreVoteMessage(
+            self._server._name,
+            None,
+            self._term,
+            RequestVoteData(
+                lastLogIndex=self._server._lastLogIndex,
+                lastLogTerm=self._server._lastLogTerm,
+            ),
+        )
+        await self._server.send_message(message)
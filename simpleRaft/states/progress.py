@@ -0,0 +1,103 @@
+from collections import deque
+
+from .config import MAX_INFLIGHT_APPENDS, MAX_INFLIGHT_BYTES
+
+
+class Progress:
+    """How replication to one follower is going, as the leader sees it.
+
+    In PROBE mode the leader doesn't know yet where the follower's log
+    stops matching its own, so it sends one AppendEntries at a time. In
+    REPLICATE mode it streams entries, as long as less than
+    MAX_INFLIGHT_APPENDS messages and MAX_INFLIGHT_BYTES bytes of entries
+    are waiting to be acknowledged. In SNAPSHOT mode it streams the
+    chunks of its snapshot, as long as less than MAX_INFLIGHT_BYTES of
+    them are waiting to be acknowledged, and no entries.
+    """
+
+    PROBE, REPLICATE, SNAPSHOT = range(3)
+
+    __slots__ = (
+        "mode",
+        "inflight",
+        "inflightBytes",
+        "pendingSnapshot",
+        "snapshotOffset",
+    )
+
+    def __init__(self):
+        self.mode = Progress.PROBE
+        # Last index, size and the heart beat round preceding every
+        #   message not acknowledged yet
+        self.inflight = deque()
+        self.inflightBytes = 0
+        self.pendingSnapshot = None  # index of the snapshot being sent
+        self.snapshotOffset = 0  # where its next chunk starts
+
+    @property
+    def paused(self):
+        """Whether nothing more may be sent until the follower answers."""
+        if self.mode == Progress.PROBE:
+            return bool(self.inflight)
+        if self.mode == Progress.SNAPSHOT:
+            return True
+        return (
+            len(self.inflight) >= MAX_INFLIGHT_APPENDS
+            or self.inflightBytes >= MAX_INFLIGHT_BYTES
+        )
+
+    @property
+    def chunks_paused(self):
+        """Whether no more snapshot chunks may be sent for now."""
+        return self.inflightBytes >= MAX_INFLIGHT_BYTES
+
+    def sent(self, lastIndex, size, seq=0):
+        self.inflight.append((lastIndex, size, seq))
+        self.inflightBytes += size
+
+    def sent_chunk(self, size):
+        self.snapshotOffset += size
+        self.inflightBytes += size
+
+    def acked_chunks(self, offset):
+        """Frees the window taken by the chunks up to offset."""
+        self.inflightBytes = max(0, self.snapshotOffset - offset)
+
+    def lost(self, seq, conflictIndex):
+        """Whether the oldest message in flight was lost: the heart beat
+        of round seq, sent a whole round after it, found the follower
+        without its entries still.
+
+        """
+        lastIndex, _, sentSeq = self.inflight[0]
+        return (
+            seq > sentSeq + 1
+            and conflictIndex is not None
+            and conflictIndex <= lastIndex
+        )
+
+    def acked(self, matchIndex):
+        """Frees the window taken by everything up to matchIndex."""
+        inflight = self.inflight
+        while inflight and inflight[0][0] <= matchIndex:
+            self.inflightBytes -= inflight.popleft()[1]
+
+    def become_probe(self):
+        self.mode = Progress.PROBE
+        self.inflight.clear()
+        self.inflightBytes = 0
+        self.pendingSnapshot = None
+        self.snapshotOffset = 0
+
+    def become_replicate(self):
+        if self.mode == Progress.SNAPSHOT:
+            # Only chunks were in flight
+            self.inflightBytes = 0
+            self.snapshotOffset = 0
+        self.mode = Progress.REPLICATE
+        self.pendingSnapshot = None
+
+    def become_snapshot(self, index):
+        self.become_probe()
+        self.mode = Progress.SNAPSHOT
+        self.pendingSnapshot = index
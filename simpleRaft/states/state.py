@@ -4,7 +4,7 @@ import time
 from typing import TYPE_CHECKING
 
 from ..messages.base import BaseMessage
-from ..messages.response import ResponseMessage
+from ..messages.response import ResponseData, ResponseMessage
 
 if TYPE_CHECKING:
     from ..servers.server import Server
@@ -20,6 +20,9 @@ class State:
     def set_server(self, server: "Server"):
         self._server = server
 
+    def stop(self):
+        """Cancels the timers of the state, its server stopped."""
+
     async def on_message(self, message):
         """This method is called when a message is received,
         and calls one of the other corrosponding methods
@@ -28,8 +31,15 @@ class State:
         """
         _type = message.type
 
+        # Pre-votes are about a term that hasn't started, and mustn't start
+        #   unless the election is won.
+        if _type == BaseMessage.MessageType.PreVote:
+            return await self.on_pre_vote_request(message)
+        elif _type == BaseMessage.MessageType.PreVoteResponse:
+            return await self.on_pre_vote_received(message)
+
         if message.term > self._server._currentTerm:
-            self._server._currentTerm = message.term
+            self._server._set_term(message.term)
         # Is the messages.term < ours? If so we need to tell
         #   them this so they don't get left behind.
         elif message.term < self._server._currentTerm:
@@ -37,13 +47,24 @@ class State:
             return self, None
 
         if _type == BaseMessage.MessageType.AppendEntries:
-            return await self.on_append_entries(message)
+            state, response = await self.on_append_entries(message)
         elif _type == BaseMessage.MessageType.RequestVote:
-            return await self.on_vote_request(message)
+            state, response = await self.on_vote_request(message)
         elif _type == BaseMessage.MessageType.RequestVoteResponse:
-            return await self.on_vote_received(message)
+            state, response = await self.on_vote_received(message)
         elif _type == BaseMessage.MessageType.Response:
-            return await self.on_response_received(message)
+            state, response = await self.on_response_received(message)
+        elif _type == BaseMessage.MessageType.InstallSnapshot:
+            state, response = await self.on_install_snapshot(message)
+        elif _type == BaseMessage.MessageType.TimeoutNow:
+            state, response = await self.on_timeout_now(message)
+        else:
+            return None
+
+        # A configuration entry the message brought may have replaced us
+        if state is self and self._server._state is not self:
+            state = self._server._state
+        return state, response
 
     async def on_leader_timeout(self, message):
         """This is called when the leader timeout is reached."""
@@ -57,6 +78,17 @@ class State:
         """This is called when this node recieves a vote."""
         return self, None
 
+    async def on_pre_vote_request(self, message):
+        """This is called when a server asks whether we would vote for
+        it in the next term.
+
+        """
+        return self, None
+
+    async def on_pre_vote_received(self, message):
+        """This is called when this node recieves a pre-vote."""
+        return self, None
+
     async def on_append_entries(self, message):
         """This is called when there is a request to
         append an entry to the log.
@@ -68,18 +100,96 @@ class State:
         """This is called when a response is sent back to the Leader"""
         return self, None
 
-    async def on_client_command(self, message):
-        """This is called when there is a client request."""
+    async def on_install_snapshot(self, message):
+        """This is called when the leader sends a chunk of its snapshot."""
+        return self, None
+
+    async def on_timeout_now(self, message):
+        """This is called when the leader hands its leadership over."""
+        return self, None
+
+    def on_heart_beat(self, leader, term, commitIndex):
+        """This is called when a host running many groups hears from the
+        leader of ours through a coalesced heart beat. Returns whether
+        it was accepted.
+
+        """
+        return False
+
+    def on_heart_beat_ack(self, peer, term, accepted):
+        """This is called when a peer answers a coalesced heart beat."""
+
+    def _coalesce_heart_beats(self, beats):
+        """The leader adds the [group, term, commitIndex] beats it needs
+        sent to beats, a list by peer.
+
+        """
+
+    async def on_client_command(self, command):
+        """This is called when there is a client request. The leader
+        returns a future resolved with the result of the command.
+
+        """
+        return self, None
+
+    async def on_client_read(self):
+        """This is called when a client wants to read. The leader returns
+        a future resolved with the index the state machine has to reach
+        before the read can be served.
+
+        """
+        return self, None
+
+    async def on_transfer_request(self, target):
+        """This is called when the leadership is to be handed over to
+        target. The leader returns a future resolved once it stepped down.
+
+        """
+        return self, None
+
+    async def on_membership_request(self, voters, learners=None):
+        """This is called when the voters of the cluster, or its
+        learners, are to change. The leader returns a future resolved
+        once they have.
+
+        """
         return self, None
 
+    def on_membership_change(self):
+        """This is called once a server became a learner or a voter, or
+        the configuration in the log changed. Returns the state to carry
+        on in.
+
+        """
+        return self
+
+    def caught_up(self, peer):
+        """Whether peer holds every committed entry, as far as we know."""
+        return True
+
+    def _first_index_of_term(self, term, hi):
+        """Returns the index of the first entry in log[:hi] whose term is
+        at least term, or hi if there is none. Terms never decrease along
+        the log, so this is a binary search. Compacted entries are not
+        searched.
+
+        """
+        log = self._server._log
+        lo = log.first_index
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if log.term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
     def _nextTimeout(self):
         return random.randrange(self._timeout, 2 * self._timeout)
 
-    async def _send_response_message(self, msg, yes=True):
-        response = ResponseMessage(
-            self._server._name,
-            msg.sender,
-            msg.term,
-            {"response": yes, "currentTerm": self._server._currentTerm},
-        )
+    async def _send_response_message(self, msg, yes=True, **extra):
+        # Let the leader know which heart beat round we answered
+        seq = getattr(msg.data, "seq", None)
+        data = ResponseData(yes, self._server._currentTerm, seq=seq, **extra)
+        response = ResponseMessage(self._server._name, msg.sender, msg.term, data)
         await self._server.send_message(response)
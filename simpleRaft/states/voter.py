@@ -1,7 +1,14 @@
 import asyncio
 import logging
 
-from ..messages.request_vote import RequestVoteResponseMessage
+from ..messages.base import BaseMessage
+from ..messages.request_vote import (
+    PreVoteResponseMessage,
+    RequestVoteResponseData,
+    RequestVoteResponseMessage,
+)
+from ..timer_wheel import get_wheel
+from .config import PRE_VOTE
 from .state import State
 
 logger = logging.getLogger("raft")
@@ -10,21 +17,43 @@ logger = logging.getLogger("raft")
 class Voter(State):
     def __init__(self, timeout):
         super().__init__(timeout)
-        self._last_vote = None
         self._timeout = timeout
+        self._leaderContact = None  # when we last heard from the leader
         self.timer = self.restart_timer()
 
+    def stop(self):
+        self.timer.cancel()
+
+    async def on_message(self, message):
+        # While the leader is around, a server standing for election is
+        #   ignored altogether, its term included, so that it can't
+        #   disrupt the cluster. Unless the leader handed over to it.
+        if (
+            message.type == BaseMessage.MessageType.RequestVote
+            and not message.data.transfer
+            and self._leader_alive()
+        ):
+            return self, None
+        return await super().on_message(message)
+
+    def _leader_alive(self):
+        """Whether we heard from the leader within our election timeout."""
+        return self._leaderContact is not None and (
+            asyncio.get_event_loop().time() < self._leaderContact + self._timeout
+        )
+
     def restart_timer(self):
-        loop = asyncio.get_event_loop()
         self._timeoutTime = self._nextTimeout()
-        return loop.call_later(self._timeoutTime, self.on_leader_timeout)
+        return get_wheel().call_later(self._timeoutTime, self.on_leader_timeout)
 
     async def on_vote_request(self, message):
+        server = self._server
         if (
-            self._last_vote is None
-            and message.data["lastLogIndex"] >= self._server._lastLogIndex
+            server._votedFor in (None, message.sender)
+            and message.data.lastLogIndex >= server._lastLogIndex
         ):
-            self._last_vote = message.sender
+            server._vote(message.sender)
+            await server._log.sync()
             await self._send_vote_response_message(message)
         else:
             await self._send_vote_response_message(message, yes=False)
@@ -33,40 +62,111 @@ class Voter(State):
 
     async def _send_vote_response_message(self, msg, yes=True):
         voteResponse = RequestVoteResponseMessage(
-            self._server._name, msg.sender, msg.term, {"response": yes}
+            self._server._name, msg.sender, msg.term, RequestVoteResponseData(yes)
         )
         await self._server.send_message(voteResponse)
 
+    async def on_pre_vote_request(self, message):
+        # Nobody needs to stand for election while the leader is around
+        server = self._server
+        yes = (
+            message.term > server._currentTerm
+            and self._up_to_date(message.data)
+            and not self._leader_alive()
+        )
+        response = PreVoteResponseMessage(
+            server._name, message.sender, message.term, RequestVoteResponseData(yes)
+        )
+        await server.send_message(response)
+        return self, None
+
+    def _up_to_date(self, data):
+        """Whether the log data describes is at least as up to date as
+        ours: the later last term wins, or the longer log if the last
+        terms are the same.
+
+        """
+        server = self._server
+        theirs = -1 if data.lastLogTerm is None else data.lastLogTerm
+        ours = -1 if server._lastLogTerm is None else server._lastLogTerm
+        return (theirs, data.lastLogIndex) >= (ours, server._lastLogIndex)
+
     def on_leader_timeout(self):
         """This is called when the leader timeout is reached."""
         from .candidate import Candidate  # TODO: Fix circular import
+        from .pre_candidate import PreCandidate
 
         logger.info(f"Lost Leader: {self.leader}")
+        return self._stand(PreCandidate() if PRE_VOTE else Candidate())
+
+    async def on_timeout_now(self, message):
+        from .candidate import Candidate  # TODO: Fix circular import
+
+        # The leader hands over to us, there is no need to wait it out
+        #   nor to ask the others first
+        logger.info(f"{self._server._name}: Taking over from {message.sender}")
+        return self._stand(Candidate(transfer=True))
 
+    def _stand(self, candidate):
         self.timer.cancel()
         self.leader = None
-        candidate = Candidate()
         candidate.set_server(self._server)
         self._server._state = candidate
 
         return candidate, None
 
-    async def on_append_entries(self, message):
-        self._timeoutTime = self._nextTimeout()
+    def on_membership_change(self):
+        """A server the configuration leaves out only learns the log."""
+        from .learner import Learner  # TODO: Fix circular import
+
+        if self._server._is_voter(self._server._name):
+            return self
+        logger.info(f"{self._server._name}: No longer a voter")
         self.timer.cancel()
-        self.timer = self.restart_timer()
+        learner = Learner()
+        learner.leader = getattr(self, "leader", None)
+        learner.set_server(self._server)
+        return learner
+
+    def on_heart_beat(self, leader, term, commitIndex):
+        # Only a leader already accepted through a full heart beat, it
+        #   goes back to sending those when told no.
+        server = self._server
+        if term != server._currentTerm or leader != self.leader:
+            return False
+        self._reset_leader_timeout()
+        # The leader only beats like this for entries we hold and match
+        commitIndex = min(commitIndex, len(server._log))
+        if commitIndex > server._commitIndex:
+            server._commitIndex = commitIndex
+            server._schedule_apply()
+        return True
+
+    def _reset_leader_timeout(self):
+        # Only moves the deadline, the timer wheel catches up with it
+        self._timeoutTime = self._nextTimeout()
+        self.timer.reset(self._timeoutTime)
+        # The deadline was just set from the loop's clock
+        self._leaderContact = self.timer.deadline - self._timeoutTime
+
+    async def on_append_entries(self, message):
+        self._reset_leader_timeout()
 
         if message.term < self._server._currentTerm:
             await self._send_response_message(message, yes=False)
             return self, None
 
-        if "leaderId" in message.data and self.leader != message.data["leaderId"]:
-            self.leader = message.data["leaderId"]
+        leaderId = message.data.leaderId
+        if leaderId is not None and self.leader != leaderId:
+            self.leader = leaderId
             logger.info(f"Accepted new leader: {self.leader}")
+            self._server._handed_over(leaderId)
 
             from simpleRaft.states.follower import Follower  # TODO: Fix circular import
 
             if not isinstance(self, Follower):
+                # Our election timer would go off in the follower's stead
+                self.timer.cancel()
                 follower = Follower()
                 follower.leader = self.leader
                 follower.set_server(self._server)
@@ -0,0 +1,211 @@
+import asyncio
+import math
+import weakref
+
+from .states.config import TIMER_TICK, TIMER_WHEEL_LEVELS, TIMER_WHEEL_SLOTS
+
+_wheels = weakref.WeakKeyDictionary()  # event loop -> TimerWheel
+
+
+def get_wheel(loop=None):
+    """Returns the timer wheel every state running on loop, the current
+    event loop by default, registers its deadlines with.
+
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    wheel = _wheels.get(loop)
+    if wheel is None:
+        wheel = _wheels[loop] = TimerWheel(loop)
+    return wheel
+
+
+class Timer:
+    """A deadline on a TimerWheel, in the loop's time. callback is called
+    once it passed, and again every interval seconds if there is one.
+
+    Moving the deadline later is a plain assignment: the wheel only
+    finds out when the old deadline comes up, and files the timer again.
+    """
+
+    __slots__ = ("deadline", "callback", "interval", "_wheel", "_bucket", "_expires")
+
+    def __init__(self, wheel, deadline, callback, interval=None):
+        self.deadline = deadline
+        self.callback = callback
+        self.interval = interval
+        self._wheel = wheel
+        self._bucket = None
+        self._expires = None
+
+    def reset(self, delay=None):
+        """Moves the deadline delay seconds, interval by default, from now."""
+        wheel = self._wheel
+        if delay is None:
+            delay = self.interval
+        self.deadline = wheel._loop.time() + delay
+        if self._bucket is None:
+            wheel._add(self)
+        elif wheel._tick_of(self.deadline) < self._expires:
+            # Only an earlier deadline needs a slot of its own
+            self._bucket.discard(self)
+            wheel._count -= 1
+            wheel._add(self)
+
+    def cancel(self):
+        if self._bucket is not None:
+            self._bucket.discard(self)
+            self._bucket = None
+            self._wheel._count -= 1
+
+    def cancelled(self):
+        return self._bucket is None
+
+
+class TimerWheel:
+    """Hierarchical timing wheels driven by a single loop callback,
+    scheduled for the next tick that has timers to fire or to file again.
+    The ticks in between are skipped over.
+
+    A timer due in less than slots ticks sits in the slot of the lowest
+    wheel it expires in, later ones in a slot of a higher wheel. Every
+    time a wheel comes round, the next slot of the one above it is
+    emptied into the lower wheels.
+    """
+
+    def __init__(
+        self,
+        loop,
+        tick=TIMER_TICK,
+        slots=TIMER_WHEEL_SLOTS,
+        levels=TIMER_WHEEL_LEVELS,
+    ):
+        self._loop = loop
+        self._tick = tick
+        self._slots = slots
+        self._wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._current = math.floor(loop.time() / tick)  # last tick handled
+        self._count = 0
+        self._handle = None
+        self._wake = None  # the tick _handle is scheduled for
+
+    def __len__(self):
+        return self._count
+
+    def _tick_of(self, when):
+        return math.ceil(when / self._tick)
+
+    def call_later(self, delay, callback, interval=None):
+        return self.call_at(self._loop.time() + delay, callback, interval)
+
+    def call_at(self, when, callback, interval=None):
+        timer = Timer(self, when, callback, interval)
+        self._add(timer)
+        return timer
+
+    def _add(self, timer):
+        if not self._count and self._handle is None:
+            # Nothing was waiting, the ticks that went by were empty
+            self._current = max(
+                self._current, math.floor(self._loop.time() / self._tick)
+            )
+        expires = max(self._tick_of(timer.deadline), self._current + 1)
+        delta = expires - self._current - 1
+        level, span = 0, 1
+        while delta >= span * self._slots and level < len(self._wheels) - 1:
+            level += 1
+            span *= self._slots
+        # Further out than the top wheel reaches, it is filed again later
+        expires = min(expires, self._current + span * self._slots)
+        timer._expires = expires
+        timer._bucket = self._wheels[level][expires // span % self._slots]
+        timer._bucket.add(timer)
+        self._count += 1
+        if self._handle is None:
+            self._schedule()
+        elif expires // span * span < self._wake:
+            # Due, or filed again, before the tick we wake up for
+            self._handle.cancel()
+            self._schedule()
+
+    def _schedule(self):
+        self._wake = self._next_tick()
+        self._handle = self._loop.call_at(self._wake * self._tick, self._on_tick)
+
+    def _next_tick(self):
+        """Returns the first tick after the current one with a slot to
+        fire, or to file again into the lower wheels, None if there are
+        no timers.
+
+        """
+        if not self._count:
+            return None
+        first = None
+        span = 1
+        for wheel in self._wheels:
+            base = self._current // span
+            for k in range(1, self._slots + 1):
+                tick = (base + k) * span
+                if first is not None and tick >= first:
+                    break
+                if wheel[(base + k) % self._slots]:
+                    first = tick
+                    break
+            span *= self._slots
+        return first
+
+    def _on_tick(self):
+        # The handle is only cleared afterwards, so that the timers filed
+        #   meanwhile don't schedule ticks of their own.
+        now = math.floor(self._loop.time() / self._tick)
+        tick = self._next_tick()
+        while tick is not None and tick <= now:
+            # Nothing happens in the ticks skipped over
+            self._current = tick - 1
+            self._advance(tick)
+            tick = self._next_tick()
+        self._current = max(self._current, now)
+        self._handle = None
+        if self._count:
+            self._schedule()
+
+    def _advance(self, tick):
+        span = 1
+        for level in range(1, len(self._wheels)):
+            span *= self._slots
+            if tick % span:
+                break
+            self._refile(level, tick // span % self._slots)
+
+        self._current = tick
+        slot = tick % self._slots
+        bucket = self._wheels[0][slot]
+        self._wheels[0][slot] = set()
+        while bucket:
+            # Callbacks may cancel the timers left in the slot
+            timer = bucket.pop()
+            timer._bucket = None
+            self._count -= 1
+            if self._tick_of(timer.deadline) > tick:
+                self._add(timer)  # the deadline was moved later
+                continue
+            if timer.interval is not None:
+                # Beats missed while the loop was busy are not made up for
+                timer.deadline = max(
+                    timer.deadline + timer.interval, self._loop.time()
+                )
+                self._add(timer)
+            try:
+                timer.callback()
+            except Exception as e:
+                self._loop.call_exception_handler(
+                    {"message": "Exception in timer callback", "exception": e}
+                )
+
+    def _refile(self, level, slot):
+        bucket = self._wheels[level][slot]
+        self._wheels[level][slot] = set()
+        while bucket:
+            timer = bucket.pop()
+            self._count -= 1
+            self._add(timer)
@@ -0,0 +1,76 @@
+"""Helpers shared by the tests."""
+
+import asyncio
+import unittest
+
+from simpleRaft.states.progress import Progress
+
+# The timers a state may hold
+TIMERS = ("timer", "_heartBeatTimer", "_checkQuorumTimer", "_transferTimer")
+
+
+def replicating(server):
+    """The followers server streams entries to."""
+    return sum(p.mode == Progress.REPLICATE for p in server._state._progress.values())
+
+
+async def wait_for(test, condition):
+    """Waits for condition() to hold, failing test after two seconds."""
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    test.fail("timed out")
+
+
+class ClusterTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs the servers of a cluster in memory, delivering messages only
+    when pumped. Subclasses set self.servers, and self.leader if there
+    is one.
+
+    """
+
+    servers = ()
+    leader = None
+
+    def tearDown(self):
+        servers = list(self.servers)
+        if self.leader is not None and all(s is not self.leader for s in servers):
+            servers.append(self.leader)
+        for s in servers:
+            for name in TIMERS:
+                timer = getattr(s._state, name, None)
+                if timer is not None:
+                    timer.cancel()
+
+    async def _pump(self, servers=None):
+        """Delivers the messages of the leader and servers, or of every
+        server, until there are none left.
+
+        """
+        servers = list(self.servers) if servers is None else [self.leader] + servers
+        for _ in range(5):
+            while any(not s._messageBoard.empty() for s in servers):
+                for s in servers:
+                    while not s._messageBoard.empty():
+                        await s.on_message(await s._messageBoard.get_message())
+            # Let the tasks started meanwhile run
+            await asyncio.sleep(0)
+
+    async def _propose(self, servers, command=("set", "a", 1)):
+        """Has the leader append command and pumps it to servers."""
+        proposal = asyncio.ensure_future(self.leader.propose(list(command)))
+        await asyncio.sleep(0)
+        await self.leader._state._proposalTask
+        await self._pump(servers)
+        return proposal
+
+    async def _change(self, change, servers=None):
+        """Pumps the messages of the leader and servers, or of every
+        server, until the membership change is committed.
+
+        """
+        change = asyncio.ensure_future(change)
+        await asyncio.sleep(0)
+        await self._pump(servers)
+        return await asyncio.wait_for(change, 1)
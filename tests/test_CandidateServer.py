@@ -25,21 +25,21 @@ class TestCandidateServer(unittest.IsolatedAsyncioTestCase):
 
     async def test_candidate_server_had_intiated_the_election(self):
 
-        self.assertEqual(1, len(self.oserver._messageBoard._board._queue))
+        self.assertEqual(1, len(self.oserver._messageBoard))
 
         await self.oserver.on_message(await self.oserver._messageBoard.get_message())
 
-        self.assertEqual(1, len(self.server._messageBoard._board._queue))
+        self.assertEqual(1, len(self.server._messageBoard))
         self.assertEqual(
-            True, (await self.server._messageBoard.get_message()).data["response"]
+            True, (await self.server._messageBoard.get_message()).data.response
         )
 
     async def test_candidate_server_had_gotten_the_vote(self):
         await self.oserver.on_message(await self.oserver._messageBoard.get_message())
 
-        self.assertEqual(1, len(self.server._messageBoard._board._queue))
+        self.assertEqual(1, len(self.server._messageBoard))
         self.assertEqual(
-            True, (await self.server._messageBoard.get_message()).data["response"]
+            True, (await self.server._messageBoard.get_message()).data.response
         )
 
     async def test_candidate_server_wins_election(self):
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import unittest
+import uuid
+from unittest import mock
+
+import zmq
+import zmq.asyncio
+
+from simpleRaft.messages import codec
+from simpleRaft.messages.append_entries import AppendEntriesMessage
+from simpleRaft.messages.install_snapshot import InstallSnapshotMessage
+from simpleRaft.messages.response import ResponseMessage
+
+
+class TestCodec(unittest.IsolatedAsyncioTestCase):
+    def _roundtrip(self, message):
+        decoded = codec.decode([memoryview(f) for f in codec.encode(message)])
+        self.assertIs(type(message), type(decoded))
+        self.assertEqual(
+            (message.sender, message.receiver, message.term, message.data),
+            (decoded.sender, decoded.receiver, decoded.term, decoded.data),
+        )
+        return decoded
+
+    async def test_codec_append_entries(self):
+        self._roundtrip(
+            AppendEntriesMessage(
+                0,
+                1,
+                3,
+                {
+                    "leaderId": 0,
+                    "prevLogIndex": -1,
+                    "prevLogTerm": None,
+                    "entries": [{"term": 3, "value": ["set", "a", 1]}],
+                    "leaderCommit": 0,
+                },
+            )
+        )
+
+    async def test_codec_uuid_names_and_bytes(self):
+        self._roundtrip(
+            ResponseMessage(
+                uuid.uuid4(),
+                None,
+                2,
+                {"response": True, "currentTerm": 2, "matchIndex": 7},
+            )
+        )
+        self._roundtrip(
+            InstallSnapshotMessage(
+                uuid.uuid4(),
+                uuid.uuid4(),
+                2,
+                {
+                    "leaderId": 0,
+                    "lastIncludedIndex": 9,
+                    "lastIncludedTerm": 2,
+                    "offset": 0,
+                    "data": b"\0state",
+                    "done": True,
+                },
+            )
+        )
+
+    async def test_codec_encodes_a_broadcast_once(self):
+        entries = codec.EntryBatch([{"term": 1, "value": i} for i in range(3)])
+        message = AppendEntriesMessage(
+            0,
+            None,
+            1,
+            {
+                "prevLogIndex": -1,
+                "prevLogTerm": None,
+                "entries": entries,
+                "leaderCommit": 0,
+            },
+        )
+        frames = codec.encode(message)
+        self.assertIs(entries.encoded, frames[2])
+
+        to_2 = codec.readdress(frames, message, 2)
+        self.assertIs(frames[2], to_2[2])
+        decoded = codec.decode(codec.split(b"".join(codec.prefix(to_2))))
+        self.assertEqual(2, decoded.receiver)
+        self.assertEqual(list(entries), decoded.data.entries)
+
+        with mock.patch.object(codec, "_pack", wraps=codec._pack) as pack:
+            codec.encode(message)
+        self.assertEqual(2, pack.call_count)  # header and payload
+
+    async def test_codec_over_zeromq_frames(self):
+        message = AppendEntriesMessage(
+            0,
+            None,
+            1,
+            {
+                "prevLogIndex": 0,
+                "prevLogTerm": 1,
+                "entries": [{"term": 1}],
+                "leaderCommit": 1,
+            },
+        )
+
+        context = zmq.asyncio.Context()
+        a, b = context.socket(zmq.PAIR), context.socket(zmq.PAIR)
+        a.bind("inproc://codec")
+        b.connect("inproc://codec")
+        await a.send_multipart(codec.encode(message), copy=False)
+        frames = await b.recv_multipart(copy=False)
+        decoded = codec.decode([f.buffer for f in frames])
+        self.assertEqual(message.data, decoded.data)
+
+        a.close()
+        b.close()
+        context.term()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ import asyncio
 import unittest
 
 from simpleRaft.boards.memory_board import MemoryBoard
+from simpleRaft.exceptions import NotLeaderError
 from simpleRaft.messages.append_entries import AppendEntriesMessage
 from simpleRaft.messages.request_vote import RequestVoteMessage
 from simpleRaft.servers.server import ZeroMQServer as Server
@@ -26,22 +27,30 @@ class TestFollowerServer(unittest.IsolatedAsyncioTestCase):
         self.oserver.stop()
         self.server.stop()
 
+    def _heart_beat(self):
+        return {
+            "prevLogIndex": -1,
+            "prevLogTerm": None,
+            "leaderCommit": 0,
+            "entries": [],
+        }
+
     async def test_follower_server_on_message(self):
-        msg = AppendEntriesMessage(0, 1, 2, {})
+        msg = AppendEntriesMessage(0, 1, 2, self._heart_beat())
         await self.server.on_message(msg)
 
     async def test_follower_server_on_receive_message_with_lesser_term(self):
 
-        msg = AppendEntriesMessage(0, 1, -1, {})
+        msg = AppendEntriesMessage(0, 1, -1, self._heart_beat())
 
         await self.server.on_message(msg)
 
         msg = await self.oserver._messageBoard.get_message()
-        self.assertEqual(False, msg.data["response"])
+        self.assertEqual(False, msg.data.response)
 
     async def test_follower_server_on_receive_message_with_greater_term(self):
 
-        msg = AppendEntriesMessage(0, 1, 2, {})
+        msg = AppendEntriesMessage(0, 1, 2, self._heart_beat())
 
         await self.server.on_message(msg)
 
@@ -66,7 +75,7 @@ class TestFollowerServer(unittest.IsolatedAsyncioTestCase):
         await self.server.on_message(msg)
 
         msg = await self.oserver._messageBoard.get_message()
-        self.assertEqual(False, msg.data["response"])
+        self.assertEqual(False, msg.data.response)
         self.assertEqual([], self.server._log)
 
     async def test_follower_server_on_receive_message_where_log_contains_conflicting_entry_at_new_index(
@@ -86,14 +95,14 @@ class TestFollowerServer(unittest.IsolatedAsyncioTestCase):
                 "prevLogIndex": 0,
                 "prevLogTerm": 1,
                 "leaderCommit": 1,
-                "entries": [{"term": 1, "value": 100}],
+                "entries": [{"term": 2, "value": 100}],
             },
         )
 
         await self.server.on_message(msg)
-        self.assertEqual({"term": 1, "value": 100}, self.server._log[1])
+        self.assertEqual({"term": 2, "value": 100}, self.server._log[1])
         self.assertEqual(
-            [{"term": 1, "value": 0}, {"term": 1, "value": 100}], self.server._log
+            [{"term": 1, "value": 0}, {"term": 2, "value": 100}], self.server._log
         )
 
     async def test_follower_server_on_receive_message_where_log_is_empty_and_receives_its_first_value(
@@ -115,28 +124,94 @@ class TestFollowerServer(unittest.IsolatedAsyncioTestCase):
         await self.server.on_message(msg)
         self.assertEqual({"term": 1, "value": 100}, self.server._log[0])
 
+    async def test_follower_server_rejects_a_short_log_with_its_length(self):
+        self.server._log.append({"term": 1, "value": 0})
+        msg = AppendEntriesMessage(
+            0,
+            1,
+            2,
+            {
+                "prevLogIndex": 5,
+                "prevLogTerm": 2,
+                "leaderCommit": 1,
+                "entries": [{"term": 2, "value": 100}],
+            },
+        )
+
+        await self.server.on_message(msg)
+
+        msg = await self.oserver._messageBoard.get_message()
+        self.assertEqual(False, msg.data.response)
+        self.assertEqual(None, msg.conflict_term)
+        self.assertEqual(1, msg.conflict_index)
+
+    async def test_follower_server_rejects_a_conflict_with_the_start_of_its_term(
+        self
+    ):
+        for term in [1, 1, 2, 2, 2]:
+            self.server._log.append({"term": term, "value": 0})
+        msg = AppendEntriesMessage(
+            0,
+            1,
+            3,
+            {
+                "prevLogIndex": 4,
+                "prevLogTerm": 3,
+                "leaderCommit": 1,
+                "entries": [{"term": 3, "value": 100}],
+            },
+        )
+
+        await self.server.on_message(msg)
+
+        msg = await self.oserver._messageBoard.get_message()
+        self.assertEqual(False, msg.data.response)
+        self.assertEqual(2, msg.conflict_term)
+        self.assertEqual(2, msg.conflict_index)
+
+    async def test_follower_server_refers_proposals_to_the_leader(self):
+        msg = AppendEntriesMessage(
+            0,
+            1,
+            2,
+            {
+                "leaderId": 0,
+                "prevLogIndex": -1,
+                "prevLogTerm": None,
+                "leaderCommit": 0,
+                "entries": [],
+            },
+        )
+        await self.server.on_message(msg)
+
+        with self.assertRaises(NotLeaderError) as e:
+            await self.server.propose(["set", "a", 1])
+        self.assertEqual(0, e.exception.leader)
+        with self.assertRaises(NotLeaderError):
+            await self.server.read_index()
+
     async def test_follower_server_on_receive_vote_request_message(self):
         msg = RequestVoteMessage(
-            0, 1, 2, {"lastLogIndex": 0, "lastLogTerm": 0, "entries": []}
+            0, 1, 2, {"lastLogIndex": 0, "lastLogTerm": 0}
         )
 
         await self.server.on_message(msg)
 
-        self.assertEqual(0, self.server._state._last_vote)
+        self.assertEqual(0, self.server._votedFor)
         msg = await self.oserver._messageBoard.get_message()
-        self.assertEqual(True, msg.data["response"])
+        self.assertEqual(True, msg.data.response)
 
     async def test_follower_server_on_receive_vote_request_after_sending_a_vote(self):
         msg = RequestVoteMessage(
-            0, 1, 2, {"lastLogIndex": 0, "lastLogTerm": 0, "entries": []}
+            0, 1, 2, {"lastLogIndex": 0, "lastLogTerm": 0}
         )
 
         await self.server.on_message(msg)
 
-        msg = RequestVoteMessage(2, 1, 2, {})
+        msg = RequestVoteMessage(2, 1, 2, {"lastLogIndex": 0, "lastLogTerm": 0})
         await self.server.on_message(msg)
 
-        self.assertEqual(0, self.server._state._last_vote)
+        self.assertEqual(0, self.server._votedFor)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
 
+import asyncio
 import unittest
+from unittest import mock
 
 from simpleRaft.boards.memory_board import MemoryBoard
+from simpleRaft.exceptions import NotLeaderError, OverloadedError
+from simpleRaft.logs.snapshot import Snapshot
+from simpleRaft.messages import codec
 from simpleRaft.messages.append_entries import AppendEntriesMessage
 from simpleRaft.messages.request_vote import RequestVoteMessage
+from simpleRaft.messages.response import ResponseMessage
 from simpleRaft.servers.server import ZeroMQServer as Server
 from simpleRaft.states.candidate import Candidate
+from simpleRaft.state_machines.dict_state_machine import DictStateMachine
+from simpleRaft.states.config import MAX_APPEND_ENTRIES, MAX_INFLIGHT_APPENDS
 from simpleRaft.states.follower import Follower
 from simpleRaft.states.leader import Leader
 
@@ -37,9 +45,19 @@ class TestLeaderServer(unittest.IsolatedAsyncioTestCase):
         for i in self.leader._neighbors:
             await i.on_message(await i._messageBoard.get_message())
 
-        for _, i in self.leader._messageBoard._board._queue:
+        for i in list(self.leader._messageBoard):
             await self.leader.on_message(i)
 
+    async def _pump(self):
+        servers = [self.leader] + self.leader._neighbors
+        delivered = 0
+        while any(not s._messageBoard.empty() for s in servers):
+            for s in servers:
+                while not s._messageBoard.empty():
+                    await s.on_message(await s._messageBoard.get_message())
+                    delivered += 1
+        return delivered
+
     async def test_leader_server_sends_heartbeat_to_all_neighbors(self):
 
         await self._perform_heart_beat()
@@ -102,6 +120,373 @@ class TestLeaderServer(unittest.IsolatedAsyncioTestCase):
         for i in self.leader._neighbors:
             self.assertEqual([{"term": 1, "value": 100}], i._log)
 
+    async def test_leader_server_pipelines_batches_to_a_lagging_follower(self):
+        for i in range(10 * MAX_APPEND_ENTRIES):
+            self.leader._log.append({"term": 0, "value": i})
+
+        # The heart beat responses are still waiting on the leader's board
+        for _ in self.leader._neighbors:
+            await self.leader.on_message(await self.leader._messageBoard.get_message())
+
+        for i in self.leader._neighbors:
+            self.assertEqual(MAX_INFLIGHT_APPENDS, i._messageBoard.qsize())
+            msg = await i._messageBoard.get_message()
+            self.assertEqual(MAX_APPEND_ENTRIES, len(msg.data.entries))
+            await i.on_message(msg)
+
+    async def test_leader_server_bounds_the_bytes_in_flight_to_a_follower(self):
+        for i in range(10 * MAX_APPEND_ENTRIES):
+            self.leader._log.append({"term": 0, "value": i})
+        _, size = self.leader._state._batch(0)
+
+        with mock.patch("simpleRaft.states.progress.MAX_INFLIGHT_BYTES", 2 * size):
+            for _ in self.leader._neighbors:
+                await self.leader.on_message(
+                    await self.leader._messageBoard.get_message()
+                )
+            for i in self.leader._neighbors:
+                self.assertEqual(2, i._messageBoard.qsize())
+
+            # Every answer lets one more batch out
+            follower = self.leader._neighbors[0]
+            progress = self.leader._state._progress[follower._name]
+            self.assertTrue(progress.paused)
+            await follower.on_message(await follower._messageBoard.get_message())
+            await self.leader.on_message(await self.leader._messageBoard.get_message())
+            self.assertEqual(2, follower._messageBoard.qsize())
+            self.assertEqual(2, len(progress.inflight))
+            self.assertTrue(progress.paused)
+
+    async def test_leader_server_sizes_batches_by_their_encoding(self):
+        for i in range(5):
+            self.leader._log.append({"term": 0, "value": "x" * 1000})
+        entrySize = len(codec.pack_entry(self.leader._log[0]))
+
+        with mock.patch("simpleRaft.states.leader.MAX_APPEND_BYTES", 3 * entrySize):
+            entries, size = self.leader._state._batch(0)
+        self.assertEqual(3, len(entries))
+        self.assertEqual(3 * entrySize, size)
+        self.assertEqual(codec._pack(self.leader._log[:3]), entries.encoded)
+
+    async def test_leader_server_catches_up_a_lagging_follower_in_batches(self):
+        for i in range(10 * MAX_APPEND_ENTRIES):
+            self.leader._log.append({"term": 0, "value": i})
+
+        delivered = await self._pump()
+
+        for i in self.leader._neighbors:
+            self.assertEqual(self.leader._log, i._log)
+            self.assertEqual(
+                len(self.leader._log) - 1, self.leader._state._matchIndex[i._name]
+            )
+        # One append and one response per batch and follower
+        self.assertEqual(3 + 3 * 2 * 10, delivered)
+
+    async def test_leader_server_skips_whole_terms_of_a_divergent_follower(self):
+        follower = self.leader._neighbors[0]
+        for i in range(100):
+            self.leader._log.append({"term": 1 if i < 10 else 3, "value": i})
+            follower._log.append({"term": 1 if i < 10 else 2, "value": i})
+        self.leader._lastLogIndex = 99
+        self.leader._lastLogTerm = 3
+        for i in self.leader._neighbors:
+            self.leader._state._nextIndexes[i._name] = 100
+        # Drop the stale heart beat responses
+        while not self.leader._messageBoard.empty():
+            await self.leader._messageBoard.get_message()
+
+        await self.leader._state._send_heart_beat()
+        await follower.on_message(await follower._messageBoard.get_message())
+        rejections = 0
+        while not self.leader._messageBoard.empty():
+            msg = await self.leader._messageBoard.get_message()
+            rejections += not msg.data.response
+            await self.leader.on_message(msg)
+            while not follower._messageBoard.empty():
+                await follower.on_message(await follower._messageBoard.get_message())
+
+        self.assertEqual(self.leader._log, follower._log)
+        self.assertEqual(1, rejections)
+
+    async def test_leader_server_sends_its_snapshot_to_a_follower_behind_it(self):
+        for i in range(100):
+            self.leader._log.append({"term": 0, "value": i})
+        self.leader._commitIndex = 80
+        self.leader.take_snapshot(79, b"0123456789")
+
+        with mock.patch("simpleRaft.states.leader.SNAPSHOT_CHUNK_SIZE", 4):
+            delivered = await self._pump()
+
+        for i in self.leader._neighbors:
+            self.assertEqual(Snapshot(79, 0, b"0123456789"), i._log.snapshot)
+            self.assertEqual(self.leader._log, i._log)
+            self.assertEqual(80, i._lastApplied)
+        # Three chunks, each answered, and one append per follower, each
+        #   append answered
+        self.assertEqual(3 + 3 * (3 + 3 + 1 + 1), delivered)
+
+    async def test_leader_server_streams_its_snapshot_within_the_window(self):
+        for i in range(100):
+            self.leader._log.append({"term": 0, "value": i})
+        self.leader._commitIndex = 80
+        self.leader.take_snapshot(79, b"0123456789")
+
+        with mock.patch("simpleRaft.states.leader.SNAPSHOT_CHUNK_SIZE", 4), mock.patch(
+            "simpleRaft.states.progress.MAX_INFLIGHT_BYTES", 8
+        ):
+            for _ in self.leader._neighbors:
+                await self.leader.on_message(
+                    await self.leader._messageBoard.get_message()
+                )
+            follower = self.leader._neighbors[0]
+            self.assertEqual(2, follower._messageBoard.qsize())
+
+            # Every chunk answered lets the next one out
+            await follower.on_message(await follower._messageBoard.get_message())
+            await self.leader.on_message(await self.leader._messageBoard.get_message())
+            self.assertEqual(2, follower._messageBoard.qsize())
+
+            await self._pump()
+        for i in self.leader._neighbors:
+            self.assertEqual(Snapshot(79, 0, b"0123456789"), i._log.snapshot)
+            self.assertEqual(self.leader._log, i._log)
+
+    async def test_leader_server_resends_appends_a_heart_beat_found_lost(self):
+        for _ in self.leader._neighbors:
+            await self.leader.on_message(await self.leader._messageBoard.get_message())
+        state = self.leader._state
+        state._proposals.extend([({"value": 1}, None), ({"value": 2}, None)])
+        await state._append_proposals()
+        for i in self.leader._neighbors:
+            await i._messageBoard.get_message()  # lost on the way
+
+        # The appends may still be on their way when the next round is
+        #   answered, not a whole round later
+        await self._perform_heart_beat()
+        for i in self.leader._neighbors:
+            self.assertTrue(i._messageBoard.empty())
+        await self._perform_heart_beat()
+        for i in self.leader._neighbors:
+            msg = await i._messageBoard.get_message()
+            self.assertEqual(2, len(msg.data.entries))
+
+    async def test_leader_server_batches_client_proposals(self):
+        self.leader._stateMachine = DictStateMachine()
+        for _ in self.leader._neighbors:
+            await self.leader.on_message(await self.leader._messageBoard.get_message())
+
+        proposals = [
+            asyncio.ensure_future(self.leader.propose(["set", "a", i]))
+            for i in range(10)
+        ]
+        await asyncio.sleep(0)
+        await self.leader._state._proposalTask
+
+        self.assertEqual(10, len(self.leader._log))
+        batches = []
+        for i in self.leader._neighbors:
+            self.assertEqual(1, i._messageBoard.qsize())
+            msg = await i._messageBoard.get_message()
+            self.assertEqual(10, len(msg.data.entries))
+            batches.append(msg.data.entries)
+        # Followers at the same nextIndex share the batch
+        self.assertIs(batches[0], batches[1])
+        self.assertIs(batches[0], batches[2])
+
+        self.leader._commitIndex = 10
+        self.leader._schedule_apply()
+        self.assertEqual([None] + list(range(9)), await asyncio.gather(*proposals))
+
+    async def test_leader_server_fails_queued_proposals_when_stepping_down(self):
+        proposal = asyncio.ensure_future(self.leader.propose(["set", "x", 1]))
+        await asyncio.sleep(0)
+        task = self.leader._state._proposalTask
+
+        await self.leader.on_message(
+            AppendEntriesMessage(
+                1,
+                0,
+                2,
+                {
+                    "leaderId": 1,
+                    "prevLogIndex": -1,
+                    "prevLogTerm": None,
+                    "entries": [],
+                    "leaderCommit": 0,
+                },
+            )
+        )
+        self.assertIs(Follower, type(self.leader._state))
+        self.leader._state.timer.cancel()
+        with self.assertRaises(NotLeaderError):
+            await proposal
+        self.assertTrue(task.cancelled())
+        self.assertEqual(0, len(self.leader._log))
+
+    async def test_leader_server_steps_down_when_rejected_from_a_later_term(self):
+        for _ in self.leader._neighbors:
+            await self.leader.on_message(await self.leader._messageBoard.get_message())
+        state = self.leader._state
+        state._active.clear()
+
+        await self.leader.on_message(
+            ResponseMessage(
+                1,
+                0,
+                0,
+                {
+                    "response": False,
+                    "currentTerm": 7,
+                    "conflictTerm": None,
+                    "conflictIndex": 0,
+                },
+            )
+        )
+        self.assertIs(Follower, type(self.leader._state))
+        self.assertEqual(7, self.leader._currentTerm)
+        # Nothing was sent back, and the answer didn't count as contact
+        self.assertEqual(0, sum(len(i._messageBoard) for i in self.leader._neighbors))
+        self.assertEqual(set(), state._active)
+        self.leader._state.timer.cancel()
+
+    async def test_leader_server_fails_proposals_whose_entry_was_replaced(self):
+        proposal = asyncio.ensure_future(self.leader.propose(["set", "x", 1]))
+        await asyncio.sleep(0)
+        await self.leader._state._proposalTask
+
+        # A later leader's entry is committed in place of ours
+        del self.leader._log[0:]
+        self.leader._log.append({"term": 1, "value": ["set", "y", 2]})
+        self.leader._commitIndex = 1
+        self.leader._schedule_apply()
+        with self.assertRaises(NotLeaderError):
+            await proposal
+
+    async def test_leader_server_rejects_proposals_while_overloaded(self):
+        self.leader._messageBoard.overloaded = True
+        with self.assertRaises(OverloadedError):
+            await self.leader.propose(["set", "a", 1])
+        self.assertEqual([], self.leader._state._proposals)
+
+    async def test_leader_server_commits_once_a_majority_has_the_entries(self):
+        for _ in self.leader._neighbors:
+            await self.leader.on_message(await self.leader._messageBoard.get_message())
+
+        proposals = [
+            asyncio.ensure_future(self.leader.propose(["set", "a", i]))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        await self.leader._state._proposalTask
+        await self._pump()
+
+        self.assertEqual(3, self.leader._commitIndex)
+        self.assertEqual([None, None, None], await asyncio.gather(*proposals))
+
+    async def test_leader_server_only_counts_replicas_of_current_term_entries(self):
+        state = self.leader._state
+        self.leader._currentTerm = 1
+        self.leader._log.extend([{"term": 0, "value": 1}, {"term": 1, "value": 2}])
+
+        for peer in (0, 1, 2):
+            state._update_match_index(peer, 0)
+        self.assertEqual(0, self.leader._commitIndex)
+
+        for peer in (0, 1):
+            state._update_match_index(peer, 1)
+        self.assertEqual(0, self.leader._commitIndex)
+
+        state._update_match_index(2, 1)
+        self.assertEqual(2, self.leader._commitIndex)
+
+    async def _settle(self, futures):
+        for _ in range(10):
+            await asyncio.sleep(0)
+            await self._pump()
+            if all(f.done() for f in futures):
+                break
+
+    async def test_leader_server_serves_reads_after_one_heartbeat_round(self):
+        for _ in self.leader._neighbors:
+            await self.leader.on_message(await self.leader._messageBoard.get_message())
+        state = self.leader._state
+        rounds = state._heartBeatSeq
+
+        reads = [asyncio.ensure_future(self.leader.read_index()) for _ in range(3)]
+        await self._settle(reads)
+
+        # An empty entry gets our term committed, then one round for all
+        self.assertEqual([1, 1, 1], [r.result() for r in reads])
+        self.assertEqual(rounds + 1, state._heartBeatSeq)
+        self.assertEqual(1, self.leader._lastApplied)
+
+        reads = [asyncio.ensure_future(self.leader.read_index()) for _ in range(2)]
+        await self._settle(reads)
+
+        self.assertEqual([1, 1], [r.result() for r in reads])
+        self.assertEqual(rounds + 2, state._heartBeatSeq)
+        self.assertEqual(1, len(self.leader._log))
+
+    async def test_leader_server_fails_pending_reads_when_stepping_down(self):
+        for _ in self.leader._neighbors:
+            await self.leader.on_message(await self.leader._messageBoard.get_message())
+        state = self.leader._state
+
+        # One read waits for its round to be answered, the other for a round
+        confirming = asyncio.ensure_future(self.leader.read_index())
+        for _ in range(10):
+            await asyncio.sleep(0)
+            if state._reads:
+                break
+        pending = asyncio.ensure_future(self.leader.read_index())
+        await asyncio.sleep(0)
+        self.assertEqual(1, len(state._pendingReads))
+
+        state._step_down(Follower())
+        self.leader._state.timer.cancel()
+        for read in (confirming, pending):
+            with self.assertRaises(NotLeaderError):
+                await read
+
+    async def test_leader_server_serves_reads_locally_while_it_holds_a_lease(self):
+        for _ in self.leader._neighbors:
+            await self.leader.on_message(await self.leader._messageBoard.get_message())
+        state = self.leader._state
+
+        with mock.patch("simpleRaft.states.leader.LEASE_READS", True):
+            reads = [asyncio.ensure_future(self.leader.read_index())]
+            await self._settle(reads)
+            self.assertEqual(1, reads[0].result())
+            self.assertGreater(state._leaseExpiry, asyncio.get_event_loop().time())
+
+            rounds = state._heartBeatSeq
+            self.assertEqual(1, await self.leader.read_index())
+            self.assertEqual(rounds, state._heartBeatSeq)
+
+            # No acks for a whole lease
+            state._leaseExpiry = asyncio.get_event_loop().time()
+            reads = [asyncio.ensure_future(self.leader.read_index())]
+            await self._settle(reads)
+            self.assertEqual(rounds + 1, state._heartBeatSeq)
+
+            # The follower we hand over to doesn't wait for the lease
+            state._leaseExpiry = asyncio.get_event_loop().time() + 10
+            state._transferee = 1
+            _, read = await state.on_client_read()
+            self.assertFalse(read.done())
+            state._transferee = None
+            await self._settle([read])
+            self.assertEqual(rounds + 2, state._heartBeatSeq)
+
+            await self.leader.on_message(
+                ResponseMessage(1, 0, 0, {"response": True, "currentTerm": 1})
+            )
+            # Someone else may be leading term 1
+            self.assertEqual(0, state._leaseExpiry)
+            self.assertIs(Follower, type(self.leader._state))
+            self.assertEqual(1, self.leader._currentTerm)
+            self.leader._state.timer.cancel()
+
     async def test_timeout(self):
         pass
         # await asyncio.sleep(2)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+from unittest import mock
+
+from simpleRaft.exceptions import LeadershipTransferError, NotLeaderError
+from simpleRaft.messages.append_entries import AppendEntriesMessage
+from simpleRaft.servers.server import ZeroMQServer as Server
+from simpleRaft.states.follower import Follower
+from simpleRaft.states.leader import Leader
+
+from .helpers import ClusterTestCase
+
+
+class TestLeadershipTransfer(ClusterTestCase):
+    async def asyncSetUp(self):
+        self.followers = [Server(i, Follower()) for i in (1, 2)]
+        self.leader = Server(0, Leader(), neighbors=list(self.followers))
+        self.servers = [self.leader] + self.followers
+        for s in self.followers:
+            s._neighbors.extend(n for n in self.servers if n is not s)
+            s._state.timer.cancel()
+        # Let the first heart beat out
+        await asyncio.sleep(0)
+        await self._pump(self.followers)
+
+    async def test_target_is_caught_up_and_takes_over(self):
+        # Server 1 falls behind
+        await self._propose(self.followers[1:])
+        self.assertEqual(0, len(self.followers[0]._log))
+
+        transfer = asyncio.ensure_future(self.leader.transfer_leadership(1))
+        await asyncio.sleep(0)
+        with self.assertRaises(NotLeaderError) as cm:
+            await self.leader.propose(["set", "b", 2])
+        self.assertEqual(1, cm.exception.leader)
+
+        await self._pump(self.followers)
+        await asyncio.wait_for(transfer, 1)
+        self.assertEqual(self.leader._log, self.followers[0]._log)
+        self.assertIs(Leader, type(self.followers[0]._state))
+        self.assertEqual(1, self.followers[0]._currentTerm)
+        for s in (self.leader, self.followers[1]):
+            self.assertIs(Follower, type(s._state))
+            self.assertEqual(1, s._currentTerm)
+
+    async def test_transfer_fails_when_someone_else_wins(self):
+        # Server 1 falls behind, so it isn't told to take over yet
+        await self._propose(self.followers[1:])
+        transfer = asyncio.ensure_future(self.leader.transfer_leadership(1))
+        await asyncio.sleep(0)
+
+        await self.leader.on_message(
+            AppendEntriesMessage(
+                2,
+                0,
+                1,
+                {
+                    "leaderId": 2,
+                    "prevLogIndex": 0,
+                    "prevLogTerm": 0,
+                    "leaderCommit": 1,
+                    "entries": [],
+                },
+            )
+        )
+        self.assertIs(Follower, type(self.leader._state))
+        with self.assertRaises(LeadershipTransferError):
+            await asyncio.wait_for(transfer, 1)
+
+    async def test_transfer_gives_up_after_an_election_timeout(self):
+        with mock.patch("simpleRaft.states.leader.FOLLOWER_TIMEOUT", 0.05):
+            transfer = asyncio.ensure_future(self.leader.transfer_leadership(1))
+            await asyncio.sleep(0)
+            with self.assertRaises(LeadershipTransferError):
+                await self.leader.transfer_leadership(2)
+            # Server 1 never hears of it
+            with self.assertRaises(LeadershipTransferError):
+                await asyncio.wait_for(transfer, 1)
+
+        self.assertIs(Leader, type(self.leader._state))
+        await self._propose(self.followers)
+        self.assertEqual(1, self.leader._commitIndex)
+
+
+if __name__ == "__main__":
+    unittest.main()
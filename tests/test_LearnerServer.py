@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+
+from simpleRaft.exceptions import NotLeaderError
+from simpleRaft.messages.request_vote import (
+    RequestVoteMessage,
+    RequestVoteResponseMessage,
+)
+from simpleRaft.servers.server import ZeroMQServer as Server
+from simpleRaft.states.candidate import Candidate
+from simpleRaft.states.follower import Follower
+from simpleRaft.states.leader import Leader
+from simpleRaft.states.learner import Learner
+
+from .helpers import ClusterTestCase
+
+
+class TestLearnerServer(ClusterTestCase):
+    async def asyncSetUp(self):
+        self.followers = [Server(i, Follower()) for i in (1, 2)]
+        self.learner = Server(3, Learner())
+        neighbors = self.followers + [self.learner]
+        self.leader = Server(0, Leader(), neighbors=list(neighbors))
+        self.servers = [self.leader] + neighbors
+        for n in neighbors:
+            n._neighbors.append(self.leader)
+        # Let the first heart beat out
+        await asyncio.sleep(0)
+        await self._pump()
+        await self._change(self.leader.add_learner(3))
+
+    async def test_learner_does_not_count_towards_the_commit_quorum(self):
+        self.assertEqual(2, self.leader._total_nodes)
+        committed = self.leader._commitIndex
+        # The leader and one follower are a majority of the voters
+        await self._propose(self.followers[:1])
+        self.assertEqual(committed + 1, self.leader._commitIndex)
+        self.assertEqual(committed, len(self.learner._log))
+
+        # The learner catches up, and can be promoted then
+        with self.assertRaises(ValueError):
+            await self.leader.promote(3)
+        await self._pump([self.learner])
+        self.assertEqual(self.leader._log, self.learner._log)
+        await self._change(self.leader.promote(3))
+        self.assertEqual(3, self.leader._total_nodes)
+
+        # Now it takes two followers
+        committed = self.leader._commitIndex
+        await self._propose(self.followers[:1])
+        self.assertEqual(committed, self.leader._commitIndex)
+        await self._pump([self.learner])
+        self.assertEqual(committed + 1, self.leader._commitIndex)
+
+    async def test_every_server_agrees_on_the_voters(self):
+        for s in self.servers:
+            self.assertEqual([{0, 1, 2}], s._voter_sets())
+            self.assertEqual({3}, s._learners)
+
+        await self._change(self.leader.promote(3))
+        for s in self.servers:
+            self.assertEqual([{0, 1, 2, 3}], s._voter_sets())
+            self.assertEqual(set(), s._learners)
+        self.assertIs(Follower, type(self.learner._state))
+
+        # Only the leader changes the membership
+        with self.assertRaises(NotLeaderError):
+            await self.followers[0].add_learner(2)
+
+    async def test_learner_neither_votes_nor_stands_for_election(self):
+        state = self.learner._state
+        self.assertTrue(state.timer.cancelled())
+        data = {"lastLogIndex": 5, "lastLogTerm": 0}
+        await self.learner.on_message(
+            RequestVoteMessage(0, 3, self.learner._currentTerm, data)
+        )
+        self.assertTrue(self.leader._messageBoard.empty())
+
+        await self._change(self.leader.promote(3))
+        self.assertIs(Follower, type(self.learner._state))
+        self.assertEqual(0, self.learner._state.leader)
+
+    async def test_candidate_only_counts_votes_granted_by_voters(self):
+        neighbors = [self.leader, self.followers[1], self.learner]
+        log = [{"term": 0, "config": {"voters": [0, 1, 2], "learners": [3]}}]
+        candidate = Server(1, Candidate(), log, neighbors=neighbors)
+        for sender, granted in ((3, True), (0, False)):
+            await candidate.on_message(
+                RequestVoteResponseMessage(sender, 1, 1, {"response": granted})
+            )
+            self.assertIs(Candidate, type(candidate._state))
+        candidate._state.timer.cancel()
+
+        await candidate.on_message(
+            RequestVoteResponseMessage(2, 1, 1, {"response": True})
+        )
+        self.assertIs(Leader, type(candidate._state))
+
+
+if __name__ == "__main__":
+    unittest.main()
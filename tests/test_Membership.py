@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+
+from simpleRaft.exceptions import MembershipChangeError, NotLeaderError
+from simpleRaft.servers.server import ZeroMQServer as Server
+from simpleRaft.states.follower import Follower
+from simpleRaft.states.leader import Leader
+from simpleRaft.states.learner import Learner
+
+from .helpers import ClusterTestCase
+
+
+class TestMembership(ClusterTestCase):
+    async def asyncSetUp(self):
+        self.followers = [Server(i, Follower()) for i in (1, 2)]
+        # Servers 3 and 4 only learn the log until they are made voters
+        self.newcomers = [Server(i, Learner()) for i in (3, 4)]
+        self.servers = self.followers + self.newcomers
+        self.leader = Server(0, Leader(), neighbors=list(self.servers))
+        for s in self.servers:
+            s._neighbors.append(self.leader)
+        for s in self.followers:
+            s._state.timer.cancel()
+        # Let the first heart beat out
+        await asyncio.sleep(0)
+        await self._pump(self.servers)
+        await self._change(self.leader.add_learner(3), self.servers)
+        await self._change(self.leader.add_learner(4), self.servers)
+        self.committed = self.leader._commitIndex
+
+    async def test_voters_are_added_through_the_joint_configuration(self):
+        change = asyncio.ensure_future(self.leader.change_membership([0, 1, 2, 3, 4]))
+        await self._pump(self.servers)
+        await asyncio.wait_for(change, 1)
+
+        joint, new = [e["config"] for e in self.leader._log][-2:]
+        self.assertEqual({0, 1, 2}, set(joint["old"]))
+        self.assertEqual({"voters": [0, 1, 2, 3, 4]}, new)
+        for s in [self.leader] + self.servers:
+            self.assertEqual(new, s._config)
+        for s in self.newcomers:
+            self.assertIs(Follower, type(s._state))
+
+        # The leader and the newcomers are a majority now
+        proposal = await self._propose(self.newcomers)
+        await asyncio.wait_for(proposal, 1)
+        self.assertEqual(self.committed + 3, self.leader._commitIndex)
+
+    async def test_joint_configuration_takes_both_majorities(self):
+        change = asyncio.ensure_future(self.leader.change_membership([0, 3, 4]))
+        await self._pump(self.newcomers)
+        # The new voters hold the joint configuration, but not the old
+        self.assertEqual(self.committed, self.leader._commitIndex)
+        self.assertTrue(self.leader._config["old"])
+        with self.assertRaises(MembershipChangeError):
+            await self.leader.change_membership([0, 1])
+
+        await self._pump(self.servers[:1] + self.newcomers)
+        await asyncio.wait_for(change, 1)
+        self.assertEqual(self.committed + 2, self.leader._commitIndex)
+        # Server 1 heard of the new configuration, and only learns now
+        self.assertIs(Learner, type(self.followers[0]._state))
+        with self.assertRaises(NotLeaderError):
+            await self.followers[0].change_membership([1])
+
+    async def test_leader_left_out_steps_down(self):
+        change = asyncio.ensure_future(self.leader.change_membership([1, 2]))
+        await self._pump(self.servers)
+        await asyncio.wait_for(change, 1)
+
+        self.assertIs(Learner, type(self.leader._state))
+        for s in self.followers:
+            self.assertEqual({"voters": [1, 2], "learners": [3, 4]}, s._config)
+            self.assertIs(Follower, type(s._state))
+
+
+if __name__ == "__main__":
+    unittest.main()
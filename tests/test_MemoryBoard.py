@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 
+import asyncio
 import unittest
+from unittest import mock
 
 from simpleRaft.boards.memory_board import MemoryBoard
+from simpleRaft.messages.append_entries import AppendEntriesMessage
 from simpleRaft.messages.base import BaseMessage
+from simpleRaft.messages.request_vote import RequestVoteMessage
 
 
 class TestMemoryBoard(unittest.IsolatedAsyncioTestCase):
@@ -23,7 +27,77 @@ class TestMemoryBoard(unittest.IsolatedAsyncioTestCase):
         await self.board.post_message(msg)
         await self.board.post_message(msg2)
 
-        self.assertEqual(msg2, await self.board.get_message())
+        self.assertIs(msg, await self.board.get_message())
+        self.assertIs(msg2, await self.board.get_message())
+
+    def _append(self, entries):
+        return AppendEntriesMessage(
+            0,
+            1,
+            1,
+            {
+                "prevLogIndex": -1,
+                "prevLogTerm": None,
+                "leaderCommit": 0,
+                "entries": [{"term": 1}] * entries,
+            },
+        )
+
+    async def test_memoryboard_votes_and_heartbeats_skip_replication(self):
+        appends = [self._append(1) for _ in range(3)]
+        heart_beat = self._append(0)
+        vote = RequestVoteMessage(1, 0, 2, {"lastLogIndex": 0, "lastLogTerm": 1})
+
+        for msg in appends[:2] + [heart_beat] + appends[2:] + [vote]:
+            await self.board.post_message(msg)
+
+        self.assertEqual([heart_beat, vote] + appends, list(self.board))
+        self.assertIs(heart_beat, await self.board.get_message())
+        self.assertIs(vote, await self.board.get_message())
+        self.assertIs(appends[0], await self.board.get_message())
+
+    async def test_memoryboard_get_messages_drains_a_batch(self):
+        appends = [self._append(1) for _ in range(5)]
+        for msg in appends:
+            await self.board.post_message(msg)
+
+        self.assertEqual(appends[:3], await self.board.get_messages(3))
+        self.assertEqual(appends[3:], await self.board.get_messages(10))
+        self.assertTrue(self.board.empty())
+
+        waiter = asyncio.ensure_future(self.board.get_messages(10))
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        await self.board.post_message(appends[0])
+        self.assertEqual([appends[0]], await waiter)
+
+    async def test_memoryboard_sheds_messages_while_overloaded(self):
+        board = MemoryBoard(high_watermark=4, low_watermark=2)
+        board.set_owner(mock.Mock(_currentTerm=1))
+
+        for _ in range(4):
+            await board.post_message(self._append(1))
+        self.assertFalse(board.overloaded)
+
+        heart_beat = self._append(0)
+        await board.post_message(heart_beat)
+        self.assertTrue(board.overloaded)
+        await board.post_message(self._append(0))
+        stale = RequestVoteMessage(1, 0, 0, {"lastLogIndex": 0, "lastLogTerm": 0})
+        await board.post_message(stale)
+
+        self.assertEqual(5, board.depth)
+        self.assertEqual({"heartbeat": 1, "stale": 1}, board.drops)
+
+        self.assertIs(heart_beat, await board.get_message())
+        await board.get_messages(1)
+        self.assertTrue(board.overloaded)
+        await board.get_messages(1)
+        self.assertFalse(board.overloaded)
+
+        await board.post_message(self._append(0))
+        await board.post_message(self._append(0))
+        self.assertEqual(4, board.depth)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from simpleRaft.logs.memory_log import MemoryLog
+from simpleRaft.logs.snapshot import Snapshot
+
+
+class TestMemoryLog(unittest.TestCase):
+    def setUp(self):
+        self.log = MemoryLog([{"term": i // 5, "value": i} for i in range(20)])
+
+    def test_memorylog_truncate(self):
+        del self.log[15:]
+        self.assertEqual(15, len(self.log))
+        with self.assertRaises(TypeError):
+            del self.log[5:10]
+
+    def test_memorylog_compaction_keeps_indexes(self):
+        self.log.compact(Snapshot(9, 1, b""))
+
+        self.assertEqual(10, self.log.first_index)
+        self.assertEqual(20, len(self.log))
+        self.assertEqual({"term": 2, "value": 10}, self.log[10])
+        self.assertEqual({"term": 3, "value": 19}, self.log[-1])
+        self.assertEqual(1, self.log.term(9))
+        with self.assertRaises(IndexError):
+            self.log[9]
+        with self.assertRaises(IndexError):
+            del self.log[5:]
+
+    def test_memorylog_compaction_past_a_divergent_log_discards_it(self):
+        self.log.compact(Snapshot(9, 7, b""))
+
+        self.assertEqual(10, len(self.log))
+        self.assertEqual([], self.log)
+        self.assertEqual(7, self.log.term(-1))
+
+
+if __name__ == "__main__":
+    unittest.main()
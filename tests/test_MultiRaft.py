@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+from unittest import mock
+
+from simpleRaft.messages import codec
+from simpleRaft.messages.base import BaseMessage
+from simpleRaft.messages.response import ResponseMessage
+from simpleRaft.servers.multi_raft import RaftHost
+from simpleRaft.states.follower import Follower
+from simpleRaft.states.leader import Leader
+
+from .helpers import replicating, wait_for
+
+GROUPS = ["a", 7, "c"]
+
+encode = codec.encode
+
+
+class TestMultiRaft(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.hosts = [RaftHost("h%d" % i) for i in range(3)]
+        for h in self.hosts:
+            await h.run()
+        # Every host leads one of the groups
+        for i, group in enumerate(GROUPS):
+            for j, h in enumerate(self.hosts):
+                state = Leader() if i == j else Follower()
+                h.add_group(group, state, [n for n in self.hosts if n is not h])
+
+    def tearDown(self):
+        for h in self.hosts:
+            h.stop()
+
+    async def test_codec_carries_the_group(self):
+        message = ResponseMessage(
+            "h0", "h1", 2, {"response": True, "currentTerm": 2}, group=7
+        )
+        decoded = codec.decode(codec.encode(message))
+        self.assertEqual(7, decoded.group)
+        decoded = codec.decode(codec.readdress(codec.encode(message), message, "h2"))
+        self.assertEqual(("h2", 7), (decoded.receiver, decoded.group))
+
+    async def test_groups_share_one_connection_per_peer(self):
+        leaders = [h.group(g) for h, g in zip(self.hosts, GROUPS)]
+        await wait_for(self, lambda: all(replicating(s) == 2 for s in leaders))
+
+        await asyncio.gather(
+            *(
+                s.propose(["set", g, i])
+                for s, g in zip(leaders, GROUPS)
+                for i in range(5 + GROUPS.index(g))
+            )
+        )
+        for i, group in enumerate(GROUPS):
+            await wait_for(
+                self, lambda: all(len(h.group(group)._log) == 5 + i for h in self.hosts)
+            )
+            for h in self.hosts:
+                self.assertEqual(
+                    [["set", group, n] for n in range(5 + i)],
+                    [e["value"] for e in h.group(group)._log],
+                )
+
+        for h in self.hosts:
+            self.assertEqual(2, len(h._connections))
+
+    async def test_a_failing_group_leaves_the_others_running(self):
+        leaders = [h.group(g) for h, g in zip(self.hosts, GROUPS)]
+        await wait_for(self, lambda: all(replicating(s) == 2 for s in leaders))
+
+        host = self.hosts[1]
+        with mock.patch.object(
+            host.group("a"), "on_message", side_effect=RuntimeError
+        ), self.assertLogs("raft", "ERROR"):
+            await leaders[0].propose(["set", "a", 1])
+            await leaders[2].propose(["set", "c", 1])
+            await wait_for(self, lambda: len(host.group("c")._log) == 1)
+
+    async def test_heart_beats_are_coalesced_per_peer(self):
+        # Let h0 lead every group
+        for group in GROUPS[1:]:
+            for h in self.hosts:
+                h.remove_group(group)
+        for group in GROUPS[1:]:
+            for i, h in enumerate(self.hosts):
+                state = Leader() if i == 0 else Follower()
+                h.add_group(group, state, [n for n in self.hosts if n is not h])
+        leaders = [self.hosts[0].group(g) for g in GROUPS]
+        await wait_for(self, lambda: all(replicating(s) == 2 for s in leaders))
+        await asyncio.gather(*(s.propose(["set", "x", 1]) for s in leaders))
+        followers = [h.group(g) for h in self.hosts[1:] for g in GROUPS]
+        await wait_for(self, lambda: all(len(s._log) == 1 for s in followers))
+
+        sent = []
+        with mock.patch.object(
+            codec, "encode", side_effect=lambda m: sent.append(m) or encode(m)
+        ), mock.patch.object(
+            Follower,
+            "_reset_leader_timeout",
+            autospec=True,
+            side_effect=Follower._reset_leader_timeout,
+        ) as reset:
+            self.hosts[0]._beat()
+            await wait_for(self, lambda: len(sent) == 4)
+
+        beats, acks = sent[:2], sent[2:]
+        self.assertEqual({"h1", "h2"}, {m.receiver for m in beats})
+        for m in beats:
+            self.assertEqual(BaseMessage.MessageType.HeartBeat, m.type)
+            self.assertEqual([[g, 0, 1] for g in GROUPS], m.data.beats)
+        for m in acks:
+            self.assertEqual([[g, 0, True] for g in GROUPS], m.data.acks)
+        # Every election timer was reset and the commit index learnt
+        self.assertEqual(len(followers), reset.call_count)
+        for s in followers:
+            self.assertEqual(1, s._commitIndex)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+
+from simpleRaft.messages.request_vote import (
+    PreVoteMessage,
+    PreVoteResponseMessage,
+    RequestVoteMessage,
+)
+from simpleRaft.servers.server import ZeroMQServer as Server
+from simpleRaft.states.follower import Follower
+from simpleRaft.states.leader import Leader
+from simpleRaft.states.pre_candidate import PreCandidate
+
+from .helpers import ClusterTestCase
+
+
+class TestPreVote(ClusterTestCase):
+    async def asyncSetUp(self):
+        self.followers = [Server(i, Follower()) for i in (1, 2)]
+        self.servers = list(self.followers)
+        for s in self.followers:
+            s._state.timer.cancel()
+            s._total_nodes = 2  # a cluster of three, with server 0
+
+    async def _start_leader(self):
+        self.leader = Server(0, Leader(), neighbors=list(self.followers))
+        self.servers.append(self.leader)
+        for s in self.followers:
+            s._neighbors.append(self.leader)
+        # Let the first heart beat out
+        await asyncio.sleep(0)
+        await self._pump()
+
+    def _connect_followers(self):
+        a, b = self.followers
+        a._neighbors.append(b)
+        b._neighbors.append(a)
+
+    async def test_rejoining_server_does_not_disrupt_the_leader(self):
+        await self._start_leader()
+        self._connect_followers()
+        # Server 2 missed the heart beats, and times out
+        rejoining = self.followers[1]
+        rejoining._state.on_leader_timeout()
+        preCandidate = rejoining._state
+        self.assertIs(PreCandidate, type(preCandidate))
+        await self._pump()
+
+        # Server 1 heard from the leader lately, so nobody moved on
+        self.assertIs(PreCandidate, type(rejoining._state))
+        self.assertIs(Leader, type(self.leader._state))
+        for s in self.servers:
+            self.assertEqual(0, s._currentTerm)
+
+        await self.leader._state._send_heart_beat()
+        await self._pump()
+        self.assertIs(Follower, type(rejoining._state))
+        self.assertTrue(preCandidate.timer.cancelled())
+
+    async def test_pre_vote_is_won_once_the_leader_is_gone(self):
+        self._connect_followers()
+        server = self.followers[0]
+        server._state.on_leader_timeout()
+        await self._pump()
+
+        self.assertIs(Leader, type(server._state))
+        self.assertEqual(1, server._currentTerm)
+        self.assertEqual(1, self.followers[1]._currentTerm)
+
+    async def test_follower_ignores_elections_while_the_leader_is_around(self):
+        await self._start_leader()
+        follower = self.followers[0]
+        data = {"lastLogIndex": 0, "lastLogTerm": None}
+        await follower.on_message(RequestVoteMessage(2, 1, 5, data))
+        self.assertEqual(0, follower._currentTerm)
+        self.assertIsNone(follower._votedFor)
+
+        # Unless the leader handed over to the candidate
+        await follower.on_message(
+            RequestVoteMessage(2, 1, 5, {**data, "transfer": True})
+        )
+        self.assertEqual(5, follower._currentTerm)
+        self.assertEqual(2, follower._votedFor)
+
+    async def test_pre_vote_goes_to_the_later_last_term(self):
+        self._connect_followers()
+        voter, preCandidate = self.followers
+        voter._lastLogIndex, voter._lastLogTerm = 1, 2
+        # A longer log, but from an earlier term
+        data = {"lastLogIndex": 3, "lastLogTerm": 1}
+        await voter.on_message(PreVoteMessage(2, 1, 1, data))
+        response = await preCandidate._messageBoard.get_message()
+        self.assertFalse(response.data.response)
+
+        await voter.on_message(PreVoteMessage(2, 1, 1, {**data, "lastLogTerm": 2}))
+        response = await preCandidate._messageBoard.get_message()
+        self.assertTrue(response.data.response)
+
+    async def test_pre_votes_of_another_round_do_not_count(self):
+        server = self.followers[0]
+        server._state.on_leader_timeout()
+        state = server._state
+        self.assertIs(PreCandidate, type(state))
+
+        await server.on_message(PreVoteResponseMessage(2, 1, 5, {"response": True}))
+        self.assertIs(state, server._state)
+        await server.on_message(PreVoteResponseMessage(2, 1, 1, {"response": True}))
+        self.assertIsNot(state, server._state)
+
+    async def test_leader_cut_off_from_the_majority_steps_down(self):
+        await self._start_leader()
+        state = self.leader._state
+        state._check_quorum()
+        self.assertIs(state, self.leader._state)
+
+        # Nobody answered since
+        state._check_quorum()
+        self.assertIs(Follower, type(self.leader._state))
+        self.assertTrue(state._heartBeatTimer.cancelled())
+        self.assertTrue(state._checkQuorumTimer.cancelled())
+
+
+if __name__ == "__main__":
+    unittest.main()
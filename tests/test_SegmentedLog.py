@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from simpleRaft.logs import segmented_log
+from simpleRaft.logs.segmented_log import SegmentedLog
+from simpleRaft.logs.snapshot import Snapshot
+from simpleRaft.servers.server import ZeroMQServer as Server
+from simpleRaft.states.follower import Follower
+
+
+class TestSegmentedLog(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _entries(self, n, term=1):
+        return [{"term": term, "value": i} for i in range(n)]
+
+    async def test_segmentedlog_append_and_read(self):
+        log = SegmentedLog(self.path)
+        log.extend(self._entries(10))
+
+        self.assertEqual(10, len(log))
+        self.assertEqual({"term": 1, "value": 3}, log[3])
+        self.assertEqual({"term": 1, "value": 9}, log[-1])
+        self.assertEqual(self._entries(10)[2:5], log[2:5])
+        self.assertEqual(1, log.term(4))
+        self.assertEqual(len(segmented_log._encode_json(log[4])), log.entry_size(4))
+        with self.assertRaises(IndexError):
+            log[10]
+        log.close()
+
+    async def test_segmentedlog_appends_in_one_tick_share_one_fsync(self):
+        log = SegmentedLog(self.path)
+        with mock.patch.object(segmented_log.os, "fsync", wraps=os.fsync) as fsync:
+            log.extend(self._entries(100))
+            await log.sync()
+            self.assertEqual(1, fsync.call_count)
+
+            await log.sync()
+            self.assertEqual(1, fsync.call_count)
+        log.close()
+
+    async def test_segmentedlog_fsyncs_off_the_event_loop(self):
+        log = SegmentedLog(self.path)
+        threads = []
+        with mock.patch.object(
+            segmented_log.os,
+            "fsync",
+            side_effect=lambda fd: threads.append(threading.get_ident()),
+        ):
+            log.append({"term": 1, "value": 0})
+            await log.sync()
+        self.assertEqual(1, len(threads))
+        self.assertNotEqual(threading.get_ident(), threads[0])
+        log.close()
+
+    async def test_segmentedlog_keeps_the_term_and_vote(self):
+        log = SegmentedLog(self.path)
+        self.assertEqual((0, None), log.hard_state)
+        log.save_hard_state(1, None)
+        log.save_hard_state(2, "S1")
+        await log.sync()
+        log.close()
+
+        # A torn record is cut off along with the older ones
+        state = os.path.join(self.path, segmented_log.STATE_NAME)
+        with open(state, "ab") as f:
+            f.write(b"\x07\x00")
+        log = SegmentedLog(self.path)
+        self.assertEqual((2, "S1"), log.hard_state)
+        self.assertEqual(
+            segmented_log.HEADER.size + len(b'"S1"'), os.path.getsize(state)
+        )
+        log.close()
+
+    async def test_segmentedlog_survives_a_restart(self):
+        log = SegmentedLog(self.path, segment_size=256)
+        log.extend(self._entries(50))
+        await log.sync()
+        log.close()
+
+        log = SegmentedLog(self.path, segment_size=256)
+        self.assertEqual(self._entries(50), log)
+        self.assertGreater(len(os.listdir(self.path)), 1)
+        log.close()
+
+    async def test_segmentedlog_truncates_across_segments(self):
+        log = SegmentedLog(self.path, segment_size=256)
+        log.extend(self._entries(50))
+        del log[5:]
+        log.extend(self._entries(3, term=2))
+        await log.sync()
+        log.close()
+
+        expected = self._entries(5) + self._entries(3, term=2)
+        log = SegmentedLog(self.path, segment_size=256)
+        self.assertEqual(expected, log)
+        self.assertEqual(1, len(os.listdir(self.path)))
+        log.close()
+
+    async def test_segmentedlog_cuts_off_a_torn_record(self):
+        log = SegmentedLog(self.path)
+        log.extend(self._entries(5))
+        log.close()
+
+        segment = os.path.join(self.path, os.listdir(self.path)[0])
+        with open(segment, "r+b") as f:
+            f.truncate(os.path.getsize(segment) - 3)
+
+        log = SegmentedLog(self.path)
+        self.assertEqual(self._entries(4), log)
+        log.append({"term": 1, "value": 4})
+        self.assertEqual(self._entries(5), log)
+        log.close()
+
+    async def test_segmentedlog_compaction_drops_whole_segments(self):
+        log = SegmentedLog(self.path, segment_size=256)
+        log.extend(self._entries(50))
+        segments = len(os.listdir(self.path))
+
+        log.compact(Snapshot(29, 1, b"state"))
+        self.assertEqual(30, log.first_index)
+        self.assertEqual(50, len(log))
+        self.assertEqual({"term": 1, "value": 30}, log[30])
+        self.assertEqual(1, log.term(29))
+        with self.assertRaises(IndexError):
+            log[29]
+        self.assertLess(len(os.listdir(self.path)), segments)
+        await log.sync()
+        log.close()
+
+        log = SegmentedLog(self.path, segment_size=256)
+        self.assertEqual(Snapshot(29, 1, b"state"), log.snapshot)
+        self.assertEqual(self._entries(50)[30:], log)
+        log.append({"term": 2, "value": 50})
+        self.assertEqual(2, log.term(50))
+        log.close()
+
+    async def test_segmentedlog_saves_snapshots_off_the_event_loop(self):
+        log = SegmentedLog(self.path, segment_size=256)
+        log.extend(self._entries(50))
+        await log.sync()
+
+        threads = []
+        with mock.patch.object(
+            segmented_log.os,
+            "fsync",
+            side_effect=lambda fd: threads.append(threading.get_ident()),
+        ):
+            compaction = asyncio.ensure_future(
+                log.compact_async(Snapshot(29, 1, b"state"))
+            )
+            await asyncio.sleep(0)
+            # Entries are only discarded once the snapshot is saved
+            self.assertEqual(0, log.first_index)
+            await compaction
+        self.assertEqual(30, log.first_index)
+        self.assertEqual(self._entries(50)[30:], log)
+        self.assertTrue(threads)
+        self.assertNotIn(threading.get_ident(), threads)
+        await log.sync()
+        log.close()
+
+        log = SegmentedLog(self.path, segment_size=256)
+        self.assertEqual(Snapshot(29, 1, b"state"), log.snapshot)
+        self.assertEqual(self._entries(50)[30:], log)
+        log.close()
+
+    async def test_segmentedlog_keeps_the_latest_of_overlapping_snapshots(self):
+        log = SegmentedLog(self.path, segment_size=256)
+        log.extend(self._entries(50))
+
+        older = asyncio.ensure_future(log.compact_async(Snapshot(19, 1, b"older")))
+        await asyncio.sleep(0)
+        log.compact(Snapshot(29, 1, b"newer"))
+        await older
+        self.assertEqual(30, log.first_index)
+        await log.sync()
+        log.close()
+
+        log = SegmentedLog(self.path, segment_size=256)
+        self.assertEqual(Snapshot(29, 1, b"newer"), log.snapshot)
+        log.close()
+
+    async def test_segmentedlog_discards_a_log_the_snapshot_does_not_follow(self):
+        log = SegmentedLog(self.path, segment_size=256)
+        log.extend(self._entries(10))
+
+        config = {"voters": [0, 1, 2]}
+        log.compact(Snapshot(99, 3, b"state", config))
+        self.assertEqual(100, len(log))
+        self.assertEqual([], log)
+        log.append({"term": 3, "value": 100})
+        await log.sync()
+        log.close()
+
+        log = SegmentedLog(self.path, segment_size=256)
+        self.assertEqual([{"term": 3, "value": 100}], log)
+        self.assertEqual(100, log.first_index)
+        self.assertEqual(Snapshot(99, 3, b"state", config), log.snapshot)
+        log.close()
+
+    async def test_segmentedlog_plugs_into_a_server(self):
+        log = SegmentedLog(self.path)
+        log.extend(self._entries(3))
+        server = Server(0, Follower(), log)
+
+        self.assertEqual(2, server._lastLogIndex)
+        self.assertEqual(1, server._lastLogTerm)
+        self.assertEqual(1, server._currentTerm)
+        log.close()
+
+    async def test_segmentedlog_restores_the_term_and_vote_of_a_server(self):
+        log = SegmentedLog(self.path)
+        server = Server(0, Follower(), log)
+        server._set_term(4)
+        server._vote(1)
+        server._state.timer.cancel()
+        await log.sync()
+        log.close()
+
+        log = SegmentedLog(self.path)
+        server = Server(0, Follower(), log)
+        self.assertEqual(4, server._currentTerm)
+        self.assertEqual(1, server._votedFor)
+        server._state.timer.cancel()
+        log.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
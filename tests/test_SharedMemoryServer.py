@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import asyncio
+import multiprocessing
+import os
+import unittest
+from unittest import mock
+
+from simpleRaft.messages.append_entries import AppendEntriesMessage
+from simpleRaft.servers import shm_server
+from simpleRaft.servers.shm_server import RingBuffer
+from simpleRaft.servers.shm_server import SharedMemoryServer as Server
+from simpleRaft.states.follower import Follower
+from simpleRaft.states.leader import Leader
+
+from .helpers import replicating
+
+
+def _produce(name, n):
+    ring = RingBuffer(name)
+    for i in range(n):
+        while not ring.put([b"record-", str(i).encode()]):
+            pass
+    ring.close()
+
+
+class TestSharedMemoryServer(unittest.IsolatedAsyncioTestCase):
+    def _namespace(self):
+        return f"test-{os.getpid()}-{self.id().rsplit('.', 1)[-1][-12:]}"
+
+    async def test_ringbuffer_wraps_around(self):
+        ring = RingBuffer(self._namespace(), create=True, size=128 + 64)
+        for i in range(20):
+            self.assertTrue(ring.put([b"x" * 10, bytes([i]) * 5]))
+            self.assertTrue(ring.put([bytes([i]) * 20]))
+            self.assertFalse(ring.put([b"y" * 60]))
+            records = [bytes(r) for r in ring.get()]
+            self.assertEqual([b"x" * 10 + bytes([i]) * 5, bytes([i]) * 20], records)
+            self.assertEqual(0, len(ring))
+        ring.close()
+
+    async def test_ringbuffer_across_processes(self):
+        name = self._namespace()
+        ring = RingBuffer(name, create=True, size=4096)
+        producer = multiprocessing.get_context("fork").Process(
+            target=_produce, args=(name, 1000)
+        )
+        producer.start()
+
+        records = []
+        while len(records) < 1000:
+            records.extend(bytes(r) for r in ring.get())
+            await asyncio.sleep(0)
+        producer.join()
+        self.assertEqual([b"record-%d" % i for i in range(1000)], records)
+        ring.close()
+
+    async def test_sharedmemoryserver_replicates_proposals(self):
+        namespace = self._namespace()
+        followers = [Server(i, Follower(), namespace=namespace) for i in (1, 2)]
+        leader = Server(0, Leader(), neighbors=list(followers), namespace=namespace)
+        for f in followers:
+            f._neighbors.append(leader)
+            await f.run()
+        await leader.run()
+
+        try:
+            for _ in range(200):
+                if replicating(leader) == 2:
+                    break
+                await asyncio.sleep(0.01)
+
+            results = await asyncio.gather(
+                *(leader.propose(["set", "a", i]) for i in range(20))
+            )
+            self.assertEqual([None] * 20, results)
+            for _ in range(200):
+                if all(len(f._log) == 20 for f in followers):
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(leader._log, followers[0]._log)
+            self.assertEqual(leader._log, followers[1]._log)
+        finally:
+            for s in [leader] + followers:
+                s.stop()
+
+    async def test_outbound_drops_what_the_ring_cannot_take(self):
+        name = self._namespace()
+        inbound = shm_server._Inbound(name, 256)
+        outbound = shm_server._Outbound(name, asyncio.get_event_loop())
+        try:
+            # Larger than the whole ring, it would never fit
+            outbound.write([b"x" * 256])
+            with mock.patch.object(shm_server, "MAX_PENDING_MESSAGES", 2):
+                for i in range(3):
+                    outbound.write([bytes([i])])
+            await asyncio.sleep(0)
+            self.assertEqual([b"\0", b"\1"], [bytes(r) for r in inbound.ring.get()])
+        finally:
+            outbound.close()
+            inbound.close()
+
+    async def test_sharedmemoryserver_maps_the_ring_of_a_restarted_peer(self):
+        namespace = self._namespace()
+        a = Server("a", Follower(), namespace=namespace)
+        b = Server("b", Follower(), neighbors=[a], namespace=namespace)
+        a._neighbors.append(b)
+        servers = [a, b]
+        message = AppendEntriesMessage(
+            "a",
+            "b",
+            0,
+            {
+                "leaderId": "a",
+                "prevLogIndex": -1,
+                "prevLogTerm": None,
+                "leaderCommit": 0,
+                "entries": [{"term": 0, "value": 1}],
+            },
+        )
+        try:
+            for s in servers:
+                s._state.timer.cancel()
+                await s.run()
+            await a.send_message(message)
+            for _ in range(200):
+                if len(b._log) == 1:
+                    break
+                await asyncio.sleep(0.01)
+
+            # b comes back with new rings, and without its log
+            b.stop()
+            b = Server("b", Follower(), neighbors=[a], namespace=namespace)
+            b._state.timer.cancel()
+            servers.append(b)
+            await b.run()
+            for _ in range(200):
+                await a.send_message(message)
+                await asyncio.sleep(0.01)
+                if len(b._log) == 1:
+                    break
+            self.assertEqual([{"term": 0, "value": 1}], b._log)
+        finally:
+            for s in servers:
+                s.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
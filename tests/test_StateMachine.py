@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+from unittest import mock
+
+from simpleRaft.logs.snapshot import Snapshot
+from simpleRaft.messages.append_entries import AppendEntriesMessage
+from simpleRaft.messages.install_snapshot import InstallSnapshotMessage
+from simpleRaft.servers.server import ZeroMQServer as Server
+from simpleRaft.state_machines.dict_state_machine import DictStateMachine
+from simpleRaft.states.follower import Follower
+
+
+class RecordingStateMachine(DictStateMachine):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def apply(self, entries):
+        self.batches.append(len(entries))
+        return super().apply(entries)
+
+
+class TestStateMachine(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.leader = Server(0, Follower())
+        self.machine = RecordingStateMachine()
+        self.server = Server(
+            1, Follower(), neighbors=[self.leader], stateMachine=self.machine
+        )
+
+    def _append(self, prevLogIndex, values, leaderCommit):
+        return AppendEntriesMessage(
+            0,
+            1,
+            1,
+            {
+                "leaderId": 0,
+                "prevLogIndex": prevLogIndex,
+                "prevLogTerm": 1 if prevLogIndex >= 0 else None,
+                "entries": [{"term": 1, "value": v} for v in values],
+                "leaderCommit": leaderCommit,
+            },
+        )
+
+    async def test_dict_state_machine_commands(self):
+        results = self.machine.apply(
+            [
+                {"term": 1, "value": ["set", "a", 1]},
+                {"term": 1, "value": ["set", "a", 2]},
+                {"term": 1},
+                {"term": 1, "value": ["delete", "a"]},
+            ]
+        )
+        self.assertEqual([None, 1, None, 2], results)
+
+        self.machine.apply([{"term": 1, "value": ["set", "b", 3]}])
+        other = DictStateMachine()
+        other.restore(self.machine.snapshot())
+        self.assertEqual({"b": 3}, other._data)
+
+    async def test_committed_entries_are_applied_in_one_batch(self):
+        await self.server.on_message(
+            self._append(-1, [["set", "a", i] for i in range(5)], 0)
+        )
+        await self.server.on_message(
+            self._append(4, [["set", "b", i] for i in range(5)], 8)
+        )
+        await self.server.on_message(self._append(9, [], 10))
+        self.assertEqual(0, self.server._lastApplied)
+
+        await asyncio.sleep(0)
+        self.assertEqual([10], self.machine.batches)
+        self.assertEqual(10, self.server._lastApplied)
+        self.assertEqual({"a": 4, "b": 4}, self.machine._data)
+
+    async def test_wait_applied_returns_the_entry_result(self):
+        await self.server.on_message(self._append(-1, [["set", "a", 1]], 1))
+        await self.server.on_message(self._append(0, [["set", "a", 2]], 1))
+
+        waiter = asyncio.ensure_future(self.server.wait_applied(1))
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+
+        await self.server.on_message(self._append(1, [], 2))
+        self.assertEqual(1, await waiter)
+
+    async def test_installed_snapshot_is_restored(self):
+        machine = DictStateMachine()
+        machine.apply([{"term": 1, "value": ["set", "a", 1]}])
+        await self.server.install_snapshot(Snapshot(9, 1, machine.snapshot()))
+
+        self.assertEqual({"a": 1}, self.machine._data)
+        self.assertEqual(10, self.server._lastApplied)
+        self.assertEqual(None, await self.server.wait_applied(9))
+
+    async def test_installed_snapshot_is_acknowledged_once_saved(self):
+        machine = DictStateMachine()
+        machine.apply([{"term": 1, "value": ["set", "a", 1]}])
+        message = InstallSnapshotMessage(
+            0,
+            1,
+            1,
+            {
+                "leaderId": 0,
+                "lastIncludedIndex": 9,
+                "lastIncludedTerm": 1,
+                "offset": 0,
+                "data": machine.snapshot(),
+                "done": True,
+            },
+        )
+        log = self.server._log
+        saved = asyncio.get_running_loop().create_future()
+
+        async def compact_async(snapshot):
+            await saved
+            log.compact(snapshot)
+
+        with mock.patch.object(log, "compact_async", compact_async):
+            handled = asyncio.ensure_future(self.server.on_message(message))
+            await asyncio.sleep(0)
+            self.assertTrue(self.leader._messageBoard.empty())
+            self.assertEqual({}, self.machine._data)
+
+            saved.set_result(None)
+            await handled
+        response = await self.leader._messageBoard.get_message()
+        self.assertEqual(9, response.data.matchIndex)
+        self.assertEqual({"a": 1}, self.machine._data)
+
+    async def test_log_is_compacted_once_enough_entries_are_applied(self):
+        with mock.patch("simpleRaft.servers.server.SNAPSHOT_THRESHOLD", 5):
+            await self.server.on_message(
+                self._append(-1, [["set", "a", i] for i in range(6)], 6)
+            )
+            await asyncio.sleep(0)
+            # The snapshot is saved in the background
+            await self.server._snapshotting
+
+        self.assertEqual(6, self.server._log.first_index)
+        self.assertEqual({"a": 5}, self.machine._data)
+
+        server = Server(2, Follower(), self.server._log, stateMachine=DictStateMachine())
+        self.assertEqual(6, server._lastApplied)
+        self.assertEqual({"a": 5}, server._stateMachine._data)
+
+    async def test_entries_are_applied_while_a_snapshot_is_saved(self):
+        log = self.server._log
+        saved = asyncio.get_running_loop().create_future()
+        compactions = []
+
+        async def compact_async(snapshot):
+            compactions.append(snapshot.index)
+            await saved
+            log.compact(snapshot)
+
+        with mock.patch(
+            "simpleRaft.servers.server.SNAPSHOT_THRESHOLD", 5
+        ), mock.patch.object(log, "compact_async", compact_async):
+            await self.server.on_message(
+                self._append(-1, [["set", "a", i] for i in range(6)], 6)
+            )
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            await self.server.on_message(self._append(5, [["set", "b", 1]], 7))
+            await asyncio.sleep(0)
+
+            # No other snapshot is taken while the first is being saved
+            self.assertEqual([5], compactions)
+            self.assertEqual(0, log.first_index)
+            self.assertEqual({"a": 5, "b": 1}, self.machine._data)
+
+            saved.set_result(None)
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+        self.assertEqual(6, log.first_index)
+        self.assertIsNone(self.server._snapshotting)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+from unittest import mock
+
+from simpleRaft.messages.append_entries import AppendEntriesMessage
+from simpleRaft.servers import tcp_server
+from simpleRaft.servers.tcp_server import TCPServer as Server
+from simpleRaft.states.follower import Follower
+from simpleRaft.states.leader import Leader
+
+from .helpers import replicating, wait_for
+
+
+class TestTCPServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.followers = [Server(i, Follower()) for i in range(1, 3)]
+        for f in self.followers:
+            await f.run()
+        self.leader = Server(0, Leader(), neighbors=list(self.followers))
+        await self.leader.run()
+        for f in self.followers:
+            f.add_neighbor(self.leader)
+
+    def tearDown(self):
+        for s in [self.leader] + self.followers:
+            s.stop()
+
+    async def test_tcpserver_replicates_proposals(self):
+        # Let the followers answer the first heart beat
+        await wait_for(self, lambda: replicating(self.leader) == 2)
+
+        results = await asyncio.gather(
+            *(self.leader.propose(["set", "a", i]) for i in range(20))
+        )
+        self.assertEqual([None] * 20, results)
+        await wait_for(self, lambda: all(len(f._log) == 20 for f in self.followers))
+
+    async def test_tcpserver_stopped_leader_stays_quiet(self):
+        await wait_for(self, lambda: replicating(self.leader) == 2)
+        state = self.leader._state
+        self.leader.stop()
+        self.assertTrue(state._heartBeatTimer.cancelled())
+
+        await state._send_heart_beat()
+        self.assertEqual({}, self.leader._connections)
+
+    async def test_tcpserver_coalesces_writes_of_one_tick(self):
+        follower = self.followers[0]
+        message = AppendEntriesMessage(
+            0,
+            1,
+            1,
+            {
+                "leaderId": 0,
+                "prevLogIndex": -1,
+                "prevLogTerm": None,
+                "leaderCommit": 0,
+                "entries": [{"term": 1, "value": "x" * 100000}],
+            },
+        )
+        connection = self.leader._connections.open(follower)
+        await wait_for(self, lambda: connection.transport is not None)
+
+        with mock.patch.object(
+            connection.transport, "writelines", wraps=connection.transport.writelines
+        ) as writelines:
+            for _ in range(3):
+                await self.leader.send_message(message)
+            await asyncio.sleep(0)
+            self.assertEqual(1, writelines.call_count)
+
+        # Larger than the read buffer, so it arrives in pieces
+        self.assertGreater(100000, tcp_server.READ_BUFFER_SIZE)
+        await wait_for(self, lambda: len(follower._log) == 1)
+
+    async def test_tcpserver_holds_writes_back_while_the_peer_lags(self):
+        connection = tcp_server._Connection(asyncio.get_event_loop())
+        connection.transport = mock.Mock()
+        protocol = tcp_server._Outbound(self.leader, 1, connection)
+
+        protocol.pause_writing()
+        with mock.patch.object(tcp_server, "MAX_PENDING_MESSAGES", 2):
+            for i in range(3):
+                connection.write([bytes([i]), b"", b""])
+        await asyncio.sleep(0)
+        connection.transport.writelines.assert_not_called()
+
+        protocol.resume_writing()
+        (written,), _ = connection.transport.writelines.call_args
+        self.assertEqual(b"\0", written[1])
+        self.assertEqual(b"\1", written[-3])
+        self.assertEqual(2 * 4, len(written))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+from unittest import mock
+
+from simpleRaft.boards.memory_board import MemoryBoard
+from simpleRaft.logs.memory_log import MemoryLog
+from simpleRaft.servers.server import Server
+from simpleRaft.states.follower import Follower
+from simpleRaft.timer_wheel import TimerWheel, get_wheel
+
+
+class TestTimerWheel(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.loop = asyncio.get_running_loop()
+        # Small wheels, so that the timers below are cascaded down
+        self.wheel = TimerWheel(self.loop, tick=0.001, slots=4, levels=3)
+
+    async def _fire(self, delays):
+        fired = []
+        done = self.loop.create_future()
+
+        def callback(i):
+            fired.append((i, self.loop.time()))
+            if len(fired) == len(delays):
+                done.set_result(None)
+
+        start = self.loop.time()
+        for i, delay in enumerate(delays):
+            self.wheel.call_later(delay, lambda i=i: callback(i))
+        await asyncio.wait_for(done, 5)
+        return start, fired
+
+    async def test_timers_fire_in_order_and_never_early(self):
+        delays = [0.05, 0.001, 0.02, 0.013, 0.1]  # the last one overflows
+        start, fired = await self._fire(delays)
+        self.assertEqual([1, 3, 2, 0, 4], [i for i, _ in fired])
+        for i, when in fired:
+            self.assertGreaterEqual(when, start + delays[i])
+        self.assertEqual(0, len(self.wheel))
+
+    async def test_moving_a_deadline(self):
+        fired = []
+        later = self.wheel.call_later(0.005, lambda: fired.append("later"))
+        earlier = self.wheel.call_later(0.05, lambda: fired.append("earlier"))
+        cancelled = self.wheel.call_later(0.005, lambda: fired.append("cancelled"))
+
+        later.reset(0.02)
+        earlier.reset(0.01)
+        cancelled.cancel()
+        self.assertTrue(cancelled.cancelled())
+
+        await asyncio.sleep(0.04)
+        self.assertEqual(["earlier", "later"], fired)
+        self.assertEqual(0, len(self.wheel))
+
+    async def test_repeating_timer(self):
+        beats = []
+        timer = self.wheel.call_later(0.005, lambda: beats.append(1), 0.005)
+        await asyncio.sleep(0.05)
+        timer.cancel()
+        self.assertGreaterEqual(len(beats), 3)
+        self.assertEqual(0, len(self.wheel))
+
+    async def test_election_timeout_reset_stays_off_the_loop(self):
+        server = Server(0, Follower(), MemoryLog(), MemoryBoard(), [])
+        state = server._state
+        self.assertIs(get_wheel(), state.timer._wheel)
+
+        # Resets only move the deadline later, an earlier one would have
+        #   the wheel wake up earlier
+        with mock.patch.object(
+            state, "_nextTimeout", return_value=2 * state._timeout
+        ), mock.patch.object(
+            self.loop, "call_later", wraps=self.loop.call_later
+        ) as call_later, mock.patch.object(
+            self.loop, "call_at", wraps=self.loop.call_at
+        ) as call_at:
+            for _ in range(100):
+                state._reset_leader_timeout()
+        self.assertEqual(0, call_later.call_count)
+        self.assertEqual(0, call_at.call_count)
+        self.assertAlmostEqual(
+            state._timeoutTime, state.timer.deadline - self.loop.time(), places=2
+        )
+        state.timer.cancel()
+
+    async def test_wheel_sleeps_until_the_next_deadline(self):
+        wheel = TimerWheel(self.loop, tick=0.001)
+        fired = []
+        with mock.patch.object(
+            self.loop, "call_at", wraps=self.loop.call_at
+        ) as call_at:
+            timer = wheel.call_later(0.03, lambda: fired.append(1))
+            await asyncio.sleep(0.05)
+        self.assertEqual([1], fired)
+        # Not once per tick
+        wakes = [
+            c.args[0] for c in call_at.call_args_list if c.args[1] == wheel._on_tick
+        ]
+        self.assertEqual(1, len(wakes))
+        self.assertGreaterEqual(wakes[0], timer.deadline)
+
+        # An earlier timer wakes the wheel up earlier
+        later = wheel.call_later(0.05, lambda: fired.append(3))
+        earlier = wheel.call_later(0.01, lambda: fired.append(2))
+        self.assertLess(wheel._handle.when(), later.deadline)
+        self.assertGreaterEqual(wheel._handle.when(), earlier.deadline)
+        await asyncio.sleep(0.07)
+        self.assertEqual([1, 2, 3], fired)
+
+
+if __name__ == "__main__":
+    unittest.main()
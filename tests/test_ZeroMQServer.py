@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import asyncio
+import socket
+import unittest
+from unittest import mock
+
+from simpleRaft.messages.append_entries import AppendEntriesMessage
+from simpleRaft.messages.response import ResponseMessage
+from simpleRaft.servers.server import ZeroMQServer as Server
+from simpleRaft.states.follower import Follower
+
+from .helpers import wait_for
+
+
+class RecordingServer(Server):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = []
+
+    async def on_message(self, message):
+        self.received.append(message)
+        await super().on_message(message)
+
+
+class TestZeroMQServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.servers = [
+            RecordingServer(name, Follower(), directed=True, host="127.0.0.1")
+            for name in ("a", "b", "c")
+        ]
+        for s in self.servers:
+            await s.run()
+        for s in self.servers:
+            for n in self.servers:
+                if n is not s:
+                    s.add_neighbor(n)
+
+    def tearDown(self):
+        for s in self.servers:
+            s.stop()
+
+    async def test_zeromqserver_directed_messages_only_reach_the_receiver(self):
+        a, b, c = self.servers
+        await a.send_message(
+            AppendEntriesMessage(
+                "a",
+                "b",
+                1,
+                {
+                    "leaderId": "a",
+                    "prevLogIndex": -1,
+                    "prevLogTerm": None,
+                    "leaderCommit": 0,
+                    "entries": [{"term": 1, "value": 1}],
+                },
+            )
+        )
+
+        await wait_for(self, lambda: a.received)
+        self.assertEqual([{"term": 1, "value": 1}], b._log)
+        self.assertIsInstance(a.received[0], ResponseMessage)
+        self.assertEqual(0, a.received[0].data.matchIndex)
+        self.assertEqual([], c.received)
+
+    async def test_zeromqserver_drops_messages_a_peer_cannot_take(self):
+        a = self.servers[0]
+        # Nobody listens there, so the messages pile up in the dealer
+        ghost = Server("d", Follower(), host="127.0.0.1", port=1)
+        ghost._state.timer.cancel()
+        a.add_neighbor(ghost)
+        message = AppendEntriesMessage(
+            "a",
+            "d",
+            1,
+            {
+                "leaderId": "a",
+                "prevLogIndex": -1,
+                "prevLogTerm": None,
+                "leaderCommit": 0,
+                "entries": [],
+            },
+        )
+        with mock.patch("simpleRaft.servers.server.BOARD_HIGH_WATERMARK", 1):
+            for _ in range(10):
+                await asyncio.wait_for(a.send_message(message), 1)
+
+    async def test_zeromqserver_subscribers_only_take_messages_for_them(self):
+        ports = []
+        for _ in range(3):
+            with socket.socket() as s:
+                s.bind(("127.0.0.1", 0))
+                ports.append(s.getsockname()[1])
+        a, b, c = servers = [
+            RecordingServer(name, Follower(), host="127.0.0.1", port=port)
+            for name, port in zip("abc", ports)
+        ]
+        self.servers += servers
+        for s in servers:
+            s._state.timer.cancel()
+            for n in servers:
+                if n is not s:
+                    s.add_neighbor(n)
+        for s in servers:
+            await s.run()
+
+        message = AppendEntriesMessage(
+            "a",
+            "b",
+            1,
+            {
+                "leaderId": "a",
+                "prevLogIndex": -1,
+                "prevLogTerm": None,
+                "leaderCommit": 0,
+                "entries": [],
+            },
+        )
+        # Until the subscriptions are through, what is published is lost
+        for _ in range(200):
+            await a._messageBoard.post_message(message)
+            await asyncio.sleep(0.01)
+            if b.received:
+                break
+        self.assertIsInstance(b.received[0], AppendEntriesMessage)
+        self.assertEqual([], c.received)
+
+
+if __name__ == "__main__":
+    unittest.main()